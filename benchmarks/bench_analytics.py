@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Playback analytics at scale: fills a throwaway analytics.db with a year of
+# synthetic events through the player's batched writer, then times the web
+# UI's aggregate queries over a day, a week and the whole year.
+#
+#   record   EventRecorder.record() per call, what the playback loop pays
+#   insert   batch writes (events + both rollups) per event and per batch
+#   queries  AnalyticsQueries per range; recent() pages through raw events
+#
+#   python3 benchmarks/bench_analytics.py --events 2000000 --out analytics.json
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bench_hot_paths import REPO_PI, git_commit, time_calls, video_name
+
+# Share of each kind among generated events, roughly a busy triggered portrait
+KIND_WEIGHTS = {"trigger": 30, "play_start": 32, "play_end": 32, "pause": 2, "resume": 2, "rotation": 2}
+
+def synthetic_events(count, days, videos, channels, seed=1):
+    rng = random.Random(seed)
+    kinds = list(KIND_WEIGHTS)
+    weights = list(KIND_WEIGHTS.values())
+    start = time.time() - days * 86400
+    step = days * 86400 / count
+    for i in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        video = video_name(rng.randrange(videos)) if kind not in ("pause", "resume") else None
+        value = None
+        detail = None
+        if kind == "trigger":
+            value = rng.uniform(0.02, 0.2)
+        elif kind == "play_end":
+            value = rng.uniform(5, 60)
+            detail = "completed" if rng.random() < 0.9 else "interrupted"
+        elif kind == "play_start":
+            detail = "triggered"
+        yield (start + i * step, kind, f"ch{rng.randrange(channels)}" if channels > 1 else "main", video, value, detail)
+
+def bench_insert(analytics, path, args):
+    recorder = analytics.EventRecorder(path, batch_size=args.batch_size)
+    batch = []
+    batches = 0
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for event in synthetic_events(args.events, args.days, args.videos, args.channels):
+        batch.append(event)
+        if len(batch) >= args.batch_size:
+            recorder._write_batch(batch)
+            batches += 1
+            batch = []
+    if batch:
+        recorder._write_batch(batch)
+        batches += 1
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    conn = recorder._connect()
+    hourly_rows = conn.execute("SELECT COUNT(*) FROM hourly").fetchone()[0]
+    daily_video_rows = conn.execute("SELECT COUNT(*) FROM daily_videos").fetchone()[0]
+    conn.close()
+    return {
+        "events": args.events,
+        "batch_size": args.batch_size,
+        "events_per_second": round(args.events / elapsed),
+        "ms_per_batch": round(elapsed / batches * 1000, 2),
+        "cpu_us_per_event": round(cpu / args.events * 1e6, 2),
+        "hourly_rows": hourly_rows,
+        "daily_video_rows": daily_video_rows,
+        "db_mb": round(sum(p.stat().st_size for p in path.parent.glob(path.name + "*")) / 1e6, 1)
+    }
+
+def bench_queries(analytics, path, args):
+    queries = analytics.AnalyticsQueries(path)
+    now = time.time()
+    results = {}
+    for label, days in (("day", 1), ("week", 7), ("year", args.days)):
+        since = now - days * 86400
+        results[label] = {
+            "summary": time_calls(lambda: queries.totals(since, now), args.min_seconds),
+            "triggers_per_hour": time_calls(lambda: queries.per_hour("trigger", since, now), args.min_seconds),
+            "triggers_by_hour_of_day": time_calls(lambda: queries.by_hour_of_day("trigger", since, now), args.min_seconds),
+            "videos": time_calls(lambda: queries.videos(since, now, limit=20), args.min_seconds),
+            "videos_one_channel": time_calls(lambda: queries.videos(since, now, "ch0", limit=20), args.min_seconds)
+        }
+    oldest = queries.recent(1)[0]["id"] - args.events // 2
+    results["recent"] = {
+        "latest_page": time_calls(lambda: queries.recent(100), args.min_seconds),
+        "deep_page": time_calls(lambda: queries.recent(100, before=oldest), args.min_seconds),
+        "rare_kind": time_calls(lambda: queries.recent(100, kind="pause"), args.min_seconds)
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="LivingPortrait analytics store benchmark")
+    parser.add_argument("--events", type=int, default=2000000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="minimum time per query benchmark")
+    parser.add_argument("--workdir", help="parent folder of the temporary HOME (e.g. on the SD card)")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {}
+    }
+    with tempfile.TemporaryDirectory(dir=args.workdir) as home:
+        home = Path(home)
+        os.environ["HOME"] = str(home)
+        sys.path.insert(0, str(REPO_PI))
+        from shared import analytics
+
+        # The recorder's own queue, never flushed: only the call itself is timed
+        recorder = analytics.EventRecorder(home / "record.db", queue_size=10 ** 7)
+        recorder._thread = True
+        results["results"]["record"] = time_calls(
+            lambda: recorder.record("trigger", "/home/pi/videos/portrait.mp4", 0.05), args.min_seconds)
+
+        path = home / "analytics.db"
+        results["results"]["insert"] = bench_insert(analytics, path, args)
+        results["results"]["queries"] = bench_queries(analytics, path, args)
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# CPU cost per channel when one player process drives several portraits. Each
+# channel count runs motion_vlc.main() in a fresh process against the stand-in
+# vlc/gpiozero modules from fake_hardware.py and a throwaway HOME:
+#
+#   idle       every channel armed in triggered mode, waiting for motion
+#   triggered  every channel re-triggered as soon as it is armed again, with
+#              the fake video ending right after it starts playing
+#
+# Channel thread CPU comes from the player's own channel_cpu_seconds gauge; the
+# driver threads that play visitor count towards process CPU only.
+#
+# --check instead runs behaviour checks against two channels, main and display1,
+# on the same fake displays and sensors, and exits non-zero if one fails:
+#
+#   motion_isolated    motion on display1 plays display1 and never wakes main
+#   pause_isolated     display1's pause_flag pauses display1 only
+#   schedule_isolated  display1's days switch display1 only
+#   selection_isolated display1's selected_video re-arms display1 only
+#   crash_stops        a crash in display1 sets channel_stopped
+#
+#   python3 benchmarks/bench_channels.py --channels 1,2,4 --out channels.json
+#   python3 benchmarks/bench_channels.py --check
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from bench_hot_paths import REPO_PI, build_settings, git_commit, load_player, video_name
+
+DEFAULT_CHANNEL_COUNTS = "1,2,4"
+VIDEOS_PER_CHANNEL = 3
+
+def channel_settings(count):
+    settings = build_settings(VIDEOS_PER_CHANNEL, mode="single", interval=0, days={})
+    settings["playlist"]["triggered_flag"] = True
+    # Re-triggers come faster than any visitor; keep them all
+    settings["motion"] = {"debounce_seconds": 0}
+    settings["channels"] = []
+    for i in range(1, count):
+        channel = build_settings(VIDEOS_PER_CHANNEL, mode="single", interval=0, days={})
+        channel["playlist"]["triggered_flag"] = True
+        channel.update(name=f"display{i}", pin=5 + i, vlc_args=[f"--fake-display={i}"],
+                       selected_video=video_name(i % VIDEOS_PER_CHANNEL))
+        settings["channels"].append(channel)
+    return settings
+
+def wait_until(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+def drive(channel, stop):
+    # One visitor after another: trigger once armed, end the video once it plays
+    controller = channel.controller
+    while not stop.is_set():
+        if not wait_until(lambda: controller.waiting_for_motion or stop.is_set(), 5):
+            continue
+        if stop.is_set():
+            return
+        played = len(controller.trigger_playing_ms)
+        channel.sensor.trigger()
+        channel.sensor.release()
+        if wait_until(lambda: len(controller.trigger_playing_ms) > played or stop.is_set(), 5):
+            channel.player.player.end()
+
+def sample(module):
+    module.sample_channel_cpu()
+    return {channel.name: channel.cpu.value for channel in module.channels}, time.process_time()
+
+def measure(module, seconds, driven):
+    stop = threading.Event()
+    drivers = [threading.Thread(target=drive, args=(channel, stop), daemon=True)
+               for channel in module.channels] if driven else []
+    triggers_before = {channel.name: len(channel.controller.trigger_playing_ms) for channel in module.channels}
+    cpu_before, process_before = sample(module)
+    for thread in drivers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in drivers:
+        thread.join()
+    cpu_after, process_after = sample(module)
+
+    per_channel = {}
+    for channel in module.channels:
+        cpu = cpu_after[channel.name] - cpu_before[channel.name]
+        triggers = len(channel.controller.trigger_playing_ms) - triggers_before[channel.name]
+        per_channel[channel.name] = {
+            "cpu_seconds": round(cpu, 4),
+            "cpu_seconds_per_hour": round(cpu / seconds * 3600, 3),
+            "triggers": triggers,
+            "cpu_ms_per_trigger": round(cpu / triggers * 1000, 3) if triggers else None
+        }
+    channel_cpu = sum(entry["cpu_seconds"] for entry in per_channel.values())
+    return {
+        "seconds": seconds,
+        "channels": per_channel,
+        "channel_cpu_seconds_per_hour": round(channel_cpu / seconds * 3600, 3),
+        "process_cpu_seconds_per_hour": round((process_after - process_before) / seconds * 3600, 3)
+    }
+
+def run_channels(count, args):
+    # Child process: one player with `count` channels
+    with tempfile.TemporaryDirectory(dir=args.workdir) as home:
+        home = Path(home)
+        os.environ["HOME"] = str(home)
+        for folder in ("videos", "logs", "images", "pause_video"):
+            (home / folder).mkdir()
+        for i in range(VIDEOS_PER_CHANNEL):
+            (home / "videos" / video_name(i)).write_bytes(b"\0" * 1024)
+        sys.path.insert(0, str(REPO_PI))
+        from shared import vlc_helper as vh
+        vh.save_settings(channel_settings(count))
+
+        module = load_player(home)
+        threading.Thread(target=module.main, daemon=True).start()
+        armed = wait_until(lambda: len(module.channels) == count and
+                           all(channel.controller.waiting_for_motion for channel in module.channels), 30)
+        assert armed, f"{count} channel(s) did not arm"
+
+        results = {
+            "idle": measure(module, args.idle_seconds, driven=False),
+            "triggered": measure(module, args.triggered_seconds, driven=True)
+        }
+        module.on_exit()
+        vh.LOGGER.flush()
+    return results
+
+# --- Behaviour checks ---
+CHECK_TIMEOUT = 5
+# How long a channel that should not react gets to show it did
+CHECK_SETTLE_SECONDS = 0.5
+# Enabled with an empty window: closed all week (a disabled day has no limits)
+CLOSED_DAYS = {day: {"enabled": True, "start": "00:00", "end": "00:00"}
+               for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]}
+
+def count_waits(channel):
+    # Counts the channel's control waits: every wake-up of its playback thread starts a new one
+    counter = {"waits": 0}
+    wait = channel.control.wait
+    def counted(timeout=None):
+        counter["waits"] += 1
+        return wait(timeout)
+    channel.control.wait = counted
+    return counter
+
+def edit_channel(vh, name, **changes):
+    with vh.settings_transaction() as settings:
+        for entry in settings["channels"]:
+            if entry["name"] == name:
+                entry.update(changes)
+
+def check_motion_isolated(module, vh, main, other):
+    waits = count_waits(main)
+    main_played = len(main.controller.trigger_playing_ms)
+    played = len(other.controller.trigger_playing_ms)
+    other.sensor.trigger()
+    other.sensor.release()
+    if not wait_until(lambda: len(other.controller.trigger_playing_ms) > played, CHECK_TIMEOUT):
+        return False, "display1 did not play on its own motion"
+    other.player.player.end()
+    time.sleep(CHECK_SETTLE_SECONDS)
+    if len(main.controller.trigger_playing_ms) != main_played:
+        return False, "main played on display1's motion"
+    if waits["waits"]:
+        return False, f"main woke {waits['waits']} time(s) on display1's motion"
+    return True, "main stayed asleep"
+
+def check_isolated(module, vh, main, other, changes, reacted, restore, what):
+    main_path = main.controller.armed_path
+    edit_channel(vh, other.name, **changes)
+    if not wait_until(lambda: reacted(other), CHECK_TIMEOUT):
+        return False, f"display1 did not follow its own {what}"
+    time.sleep(CHECK_SETTLE_SECONDS)
+    main_state = (main.controller.paused_mode, main.controller.armed_path, main.controller.waiting_for_motion)
+    edit_channel(vh, other.name, **restore)
+    wait_until(lambda: other.controller.waiting_for_motion and not other.controller.paused_mode, CHECK_TIMEOUT)
+    if main_state != (False, main_path, True):
+        return False, f"main changed on display1's {what}: paused={main_state[0]}, armed={main_state[1]}"
+    return True, "main unchanged"
+
+def check_crash_stops(module, vh, main, other):
+    def broken(paused):
+        raise RuntimeError("fake display lost")
+    other.player.set_pause = broken
+    other.sensor.trigger()
+    other.sensor.release()
+    if not wait_until(module.channel_stopped.is_set, CHECK_TIMEOUT):
+        return False, "channel_stopped not set after display1 crashed"
+    return True, "channel_stopped set"
+
+def run_checks(args):
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.workdir) as home:
+        home = Path(home)
+        os.environ["HOME"] = str(home)
+        for folder in ("videos", "logs", "images", "pause_video"):
+            (home / folder).mkdir()
+        for i in range(VIDEOS_PER_CHANNEL):
+            (home / "videos" / video_name(i)).write_bytes(b"\0" * 1024)
+        sys.path.insert(0, str(REPO_PI))
+        from shared import analytics, vlc_helper as vh
+        vh.save_settings(channel_settings(2))
+
+        module = load_player(home)
+        threading.Thread(target=module.main, daemon=True).start()
+        armed = lambda: len(module.channels) == 2 and all(c.controller.waiting_for_motion for c in module.channels)
+        assert wait_until(armed, 30), "channels did not arm"
+        main, other = module.channels
+
+        checks = [
+            ("motion_isolated", lambda: check_motion_isolated(module, vh, main, other)),
+            ("pause_isolated", lambda: check_isolated(
+                module, vh, main, other, {"pause_flag": True}, lambda c: c.controller.paused_mode,
+                {"pause_flag": False}, "pause_flag")),
+            ("schedule_isolated", lambda: check_isolated(
+                module, vh, main, other, {"days": CLOSED_DAYS}, lambda c: c.controller.paused_mode,
+                {"days": {}}, "days")),
+            ("selection_isolated", lambda: check_isolated(
+                module, vh, main, other, {"selected_video": video_name(2)},
+                lambda c: str(c.controller.armed_path).endswith(video_name(2)),
+                {"selected_video": video_name(1)}, "selected_video")),
+            # Last: the player is done once a channel stops
+            ("crash_stops", lambda: check_crash_stops(module, vh, main, other))
+        ]
+        for name, check in checks:
+            passed, detail = check()
+            results[name] = {"passed": passed, "detail": detail}
+        module.on_exit()
+        vh.LOGGER.flush()
+        analytics.RECORDER.flush()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="LivingPortrait per-channel CPU benchmark")
+    parser.add_argument("--channels", default=DEFAULT_CHANNEL_COUNTS, help="comma-separated channel counts")
+    parser.add_argument("--idle-seconds", type=float, default=5)
+    parser.add_argument("--triggered-seconds", type=float, default=10)
+    parser.add_argument("--workdir", help="parent folder of the temporary HOME (e.g. on the SD card)")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--check", action="store_true", help="run the channel isolation checks instead")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # The player logs to stdout, from channel threads that may outlive the run: keep stdout for the JSON
+    stdout = sys.stdout
+    if args.run or args.check:
+        sys.stdout = sys.stderr
+    if args.run:
+        print(json.dumps(run_channels(args.run, args)), file=stdout)
+        return
+    if args.check:
+        checks = run_checks(args)
+        print(json.dumps({"measured_at": datetime.now().isoformat(timespec="seconds"), "checks": checks}, indent=2),
+              file=stdout)
+        if not all(check["passed"] for check in checks.values()):
+            sys.exit(1)
+        return
+
+    results = {
+        "commit": git_commit(),
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {}
+    }
+    for count in [int(count) for count in args.channels.split(",")]:
+        # A fresh process per count: the player keeps its channels in module globals
+        command = [sys.executable, __file__, "--run", str(count),
+                   "--idle-seconds", str(args.idle_seconds), "--triggered-seconds", str(args.triggered_seconds)]
+        if args.workdir:
+            command += ["--workdir", args.workdir]
+        output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True).stdout
+        results["results"][str(count)] = json.loads(output)
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# Fleet sync between two local portraits. Starts the web UI twice on loopback
+# ports, each with its own throwaway HOME, fills the source with videos and
+# has the target pull from it:
+#
+#   initial     empty target, every video transferred
+#   unchanged   nothing to do: the manifest alone
+#   delta       one video replaced and the schedule edited on the source
+#   limited     one new video under --bandwidth-kbps
+#   resume      the target is killed halfway through a limited pull and restarted;
+#               the second pull only transfers the rest
+#
+#   python3 benchmarks/bench_fleet_sync.py --videos 20 --video-mb 5 --out fleet.json
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+REPO_PI = REPO / "pi"
+
+def serve(home, port):
+    # Child process: one web UI on 127.0.0.1:port
+    os.environ["HOME"] = str(home)
+    sys.path.insert(0, str(REPO_PI))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from bench_serving_load import load_app
+    from shared.web_server import serve as serve_app, get_server_settings
+    app = load_app(home)
+    config = get_server_settings()
+    config.update(host="127.0.0.1", port=port)
+    serve_app(app, config)
+
+def write_video(path, seed, size_mb):
+    # Renamed into place like an upload, so the library sees the folder change
+    block = seed.to_bytes(4, "big") * (256 * 1024)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    os.replace(tmp_path, path)
+
+def request_json(url, body=None, timeout=30):
+    data = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"} if data else {}
+    with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers), timeout=timeout) as response:
+        return json.load(response)
+
+def wait_until(predicate, timeout, interval=0.1):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if predicate():
+                return True
+        except OSError:
+            pass
+        time.sleep(interval)
+    return False
+
+class Portrait:
+    def __init__(self, name, workdir, port):
+        self.home = Path(tempfile.mkdtemp(prefix=f"fleet_{name}_", dir=workdir))
+        for folder in ("videos", "logs", "images"):
+            (self.home / folder).mkdir()
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, __file__, "--serve", str(self.home), str(self.port)],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        assert wait_until(lambda: request_json(f"{self.url}/api/fleet/sync") is not None, 30), f"{self.url} did not start"
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+    def settings(self):
+        with open(self.home / "settings.json") as f:
+            return json.load(f)
+
+    def save_settings(self, settings):
+        # Written directly, the way a UI on that portrait would leave it
+        with open(self.home / "settings.json", "w") as f:
+            json.dump(settings, f, indent=2)
+
+    def wait_indexed(self, timeout=300):
+        return wait_until(lambda: not request_json(f"{self.url}/api/fleet/manifest")["pending"], timeout)
+
+    def pull(self, source, **options):
+        started = time.perf_counter()
+        request_json(f"{self.url}/api/fleet/sync", dict(source=source.url, **options))
+        assert wait_until(lambda: request_json(f"{self.url}/api/fleet/sync")["state"] != "running", 600, 0.05)
+        status = request_json(f"{self.url}/api/fleet/sync")
+        seconds = time.perf_counter() - started
+        return {
+            "state": status["state"],
+            "error": status.get("error"),
+            "seconds": round(seconds, 3),
+            "files": len(status.get("downloaded", [])),
+            "bytes": status.get("bytes_done", 0),
+            "mb_per_second": round(status.get("bytes_done", 0) / seconds / 1e6, 2),
+            "settings_updated": status.get("settings_updated")
+        }
+
+def run(args):
+    source = Portrait("source", args.workdir, args.port)
+    target = Portrait("target", args.workdir, args.port + 1)
+    results = {}
+    try:
+        for i in range(args.videos):
+            write_video(source.home / "videos" / f"portrait_{i:03d}.mp4", i, args.video_mb)
+        source.save_settings({
+            "selected_video": "portrait_000.mp4",
+            "pause_flag": False,
+            "playlist": {"mode": "single", "interval": 0, "last_updated": "", "triggered_flag": True, "delay": 0,
+                         "order": [{"filename": f"portrait_{i:03d}.mp4", "active": True} for i in range(args.videos)]}
+        })
+        source.start()
+        target.start()
+        assert source.wait_indexed(), "source did not finish hashing"
+
+        results["initial"] = target.pull(source)
+        results["unchanged"] = target.pull(source)
+
+        write_video(source.home / "videos" / "portrait_000.mp4", 1000, args.video_mb)
+        settings = source.settings()
+        settings["days"] = {"Monday": {"enabled": True, "start": "09:00", "end": "17:00"}}
+        source.save_settings(settings)
+        source.wait_indexed()
+        results["delta"] = target.pull(source)
+        assert target.settings().get("days") == settings["days"], "schedule was not synced"
+
+        write_video(source.home / "videos" / "limited.mp4", 2000, args.video_mb)
+        source.wait_indexed()
+        results["limited"] = dict(target.pull(source, bandwidth_kbps=args.bandwidth_kbps),
+                                  limit_mb_per_second=round(args.bandwidth_kbps * 1024 / 1e6, 2))
+
+        # Kill the target halfway through a limited pull, then pull again at full speed
+        write_video(source.home / "videos" / "resumed.mp4", 3000, args.video_mb)
+        source.wait_indexed()
+        request_json(f"{target.url}/api/fleet/sync", {"source": source.url, "bandwidth_kbps": args.bandwidth_kbps})
+        time.sleep(args.video_mb * 1024 * 1024 / 2 / (args.bandwidth_kbps * 1024))
+        target.kill()
+        part_bytes = sum(path.stat().st_size for path in (target.home / "videos" / ".fleet").glob("*.part"))
+        target.start()
+        results["resume"] = dict(target.pull(source), bytes_before_restart=part_bytes,
+                                 video_bytes=args.video_mb * 1024 * 1024)
+        results["in_sync"] = request_json(f"{source.url}/api/fleet/manifest")["videos"] == \
+            request_json(f"{target.url}/api/fleet/manifest")["videos"]
+    finally:
+        for portrait in (source, target):
+            if portrait.process:
+                portrait.kill()
+            shutil.rmtree(portrait.home, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="LivingPortrait fleet sync between two local instances")
+    parser.add_argument("--videos", type=int, default=20)
+    parser.add_argument("--video-mb", type=int, default=5)
+    parser.add_argument("--bandwidth-kbps", type=int, default=2048, help="limit for the limited and resume runs")
+    parser.add_argument("--port", type=int, default=5150, help="source port; the target uses the next one")
+    parser.add_argument("--workdir", help="parent folder of the temporary HOMEs (e.g. on the SD card)")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--serve", nargs=2, metavar=("HOME", "PORT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(Path(args.serve[0]), int(args.serve[1]))
+        return
+
+    results = {"measured_at": datetime.now().isoformat(timespec="seconds"), "results": run(args)}
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# Hot paths of the player and the web UI, measured on any Linux box: the
+# player is imported with the stand-in vlc/gpiozero modules from
+# fake_hardware.py and everything runs against a throwaway HOME.
+#
+#   settings  load_settings / snapshot / reload / save_settings per playlist size
+#   schedule  is_schedule_enabled_now (cached) and a schedule recompile
+#   player    the per-iteration flag checks of the playback loop, and
+#             playlist_updater CPU per hour while rotating
+#   index     GET / render time for growing video and log folders
+#
+# Results go to JSON with the commit they were measured on; --compare prints
+# the change against an earlier run. stdout carries only the JSON; the log
+# lines of the player and the UI, and the comparison, go to stderr.
+#
+#   python3 benchmarks/bench_hot_paths.py --out before.json
+#   python3 benchmarks/bench_hot_paths.py --out after.json --compare before.json
+import argparse
+import atexit
+import contextlib
+import gzip
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import fake_hardware
+
+REPO = Path(__file__).resolve().parent.parent
+REPO_PI = REPO / "pi"
+DEFAULT_ORDER_SIZES = "10,100,1000,5000"
+DEFAULT_INDEX_SIZES = "10,100,1000,5000"
+# Schedule used by the settings, schedule and index runs
+SCHEDULE_DAYS = {day: {"enabled": True, "start": "08:00", "end": "22:30"}
+                 for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]}
+
+def video_name(i):
+    return f"portrait_{i:05d}.mp4"
+
+def build_settings(order_size, mode="random", interval=5, days=SCHEDULE_DAYS):
+    order = [{"filename": video_name(i), "active": i % 7 != 0} for i in range(order_size)]
+    return {
+        "selected_video": video_name(0),
+        "pause_flag": False,
+        "playlist": {
+            "mode": mode,
+            "interval": interval,
+            "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "order": order,
+            "triggered_flag": False,
+            "delay": 0
+        },
+        "days": days
+    }
+
+def time_calls(fn, min_seconds, min_calls=5):
+    # Repeats fn until both limits are met; per-call figures in microseconds
+    calls = 0
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if calls >= min_calls and elapsed >= min_seconds:
+            break
+    cpu = time.process_time() - cpu_started
+    return {
+        "calls": calls,
+        "us_per_call": round(elapsed / calls * 1e6, 2),
+        "cpu_us_per_call": round(cpu / calls * 1e6, 2),
+        "per_second": round(calls / elapsed, 1)
+    }
+
+def bench_settings(vh, sizes, min_seconds):
+    results = {}
+    for size in sizes:
+        vh.save_settings(build_settings(size))
+        flip = [False]
+
+        def reload():
+            vh.SETTINGS.invalidate()
+            vh.get_settings_snapshot()
+
+        def save():
+            # A real change each time, otherwise the transaction skips the write
+            flip[0] = not flip[0]
+            with vh.settings_transaction() as settings:
+                settings["pause_flag"] = flip[0]
+
+        def save_full():
+            settings = vh.load_settings()
+            flip[0] = not flip[0]
+            settings["pause_flag"] = flip[0]
+            vh.save_settings(settings)
+
+        results[str(size)] = {
+            "file_bytes": os.path.getsize(vh.SETTINGS_FILE),
+            "snapshot_hit": time_calls(vh.get_settings_snapshot, min_seconds),
+            "load_settings": time_calls(vh.load_settings, min_seconds),
+            "reload": time_calls(reload, min_seconds),
+            "transaction_write": time_calls(save, min_seconds),
+            "load_modify_save": time_calls(save_full, min_seconds)
+        }
+    return results
+
+def bench_schedule(vh, min_seconds):
+    vh.save_settings(build_settings(100))
+    vh.get_settings_snapshot()
+    now = datetime.now()
+    return {
+        "is_schedule_enabled_now": time_calls(vh.is_schedule_enabled_now, min_seconds),
+        "compile": time_calls(lambda: vh.CompiledSchedule(SCHEDULE_DAYS), min_seconds),
+        "next_transition": time_calls(lambda: vh.get_compiled_schedule().next_transition(now), min_seconds)
+    }
+
+def load_player(home):
+    fake_hardware.install()
+    spec = importlib.util.spec_from_file_location("motion_vlc", REPO_PI / "motion_vlc.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["motion_vlc"] = module
+    spec.loader.exec_module(module)
+    # Keep a benchmark run from overwriting a real player's metrics snapshot
+    atexit.unregister(module.on_exit)
+    module.exporter.path = home / "player_metrics.json"
+    return module
+
+def bench_player(vh, player, args):
+    vh.save_settings(build_settings(100))
+
+    from shared.playback import SettingsInputs
+    inputs = SettingsInputs()
+
+    def loop_checks():
+        # What the playback loop reads on every pass
+        inputs.paused()
+        inputs.triggered()
+        inputs.trigger_delay()
+        inputs.schedule_active()
+
+    results = {"main_loop_checks": time_calls(loop_checks, args.min_seconds)}
+
+    # Rotate every --rotation-seconds with the schedule always active
+    interval_minutes = args.rotation_seconds / 60
+    vh.save_settings(build_settings(args.updater_order, interval=interval_minutes, days={}))
+    rotations_before = vh.PLAYLIST_ROTATIONS.labels(channel="main", mode="random").value
+    cpu = {}
+
+    def run():
+        player.playlist_updater()
+        cpu["seconds"] = time.thread_time()
+
+    vh.stop_playlist_thread.clear()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    time.sleep(args.updater_seconds)
+    vh.stop_playlist_thread.set()
+    player.wake_playlist_updater()
+    thread.join()
+    vh.stop_playlist_thread.clear()
+
+    rotations = vh.PLAYLIST_ROTATIONS.labels(channel="main", mode="random").value - rotations_before
+    results["playlist_updater"] = {
+        "seconds": args.updater_seconds,
+        "rotation_interval_seconds": args.rotation_seconds,
+        "order_size": args.updater_order,
+        "rotations": rotations,
+        "cpu_seconds": round(cpu["seconds"], 4),
+        "cpu_ms_per_rotation": round(cpu["seconds"] / rotations * 1000, 3) if rotations else None,
+        # Scaled from the test interval; at the usual 5+ minute intervals it is proportionally less
+        "cpu_seconds_per_hour": round(cpu["seconds"] / args.updater_seconds * 3600, 3)
+    }
+    return results
+
+def write_logs(log_folder, days):
+    # The last week as plain text, older days gzipped, as BufferedLogger leaves them
+    today = datetime.now().date()
+    line = "[2026-01-01T12:00:00.000000] [Trigger] PIR -> resume 12 ms, PIR -> Playing 48 ms\n"
+    body = (line * 200).encode()
+    for i in range(days):
+        day = (today - timedelta(days=i)).strftime("%Y-%m-%d")
+        if i < 7:
+            path = log_folder / f"{day}.txt"
+            if not path.exists():
+                path.write_bytes(body)
+        elif not (log_folder / f"{day}.txt.gz").exists():
+            with gzip.open(log_folder / f"{day}.txt.gz", "wb") as f:
+                f.write(body)
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("flask_ui_app", REPO_PI / "flask_ui" / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    # Flask locates templates through the module registered under its import name
+    sys.modules["flask_ui_app"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def wait_for_library(app_module, timeout=300):
+    # Hashing runs in the background; render numbers should not include it
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(entry["sha256"] for entry in app_module.LIBRARY.entries().values()):
+            return True
+        time.sleep(0.1)
+    return False
+
+def bench_index(vh, home, sizes, args):
+    write_logs(home / "logs", args.log_days)
+    app_module = load_app()
+    client = app_module.app.test_client()
+    app_module.LOG_SEARCH.update()
+    results = {"log_days": args.log_days}
+    for size in sizes:
+        for i in range(size):
+            path = home / "videos" / video_name(i)
+            if not path.exists():
+                path.write_bytes(i.to_bytes(4, "big") * 256)
+        vh.save_settings(build_settings(size))
+        app_module.LIBRARY.refresh()
+        indexed = wait_for_library(app_module)
+
+        # First request after a change pays for rescans (and the template compile)
+        started = time.perf_counter()
+        first = client.get("/")
+        first_ms = (time.perf_counter() - started) * 1000
+        assert first.status_code == 200, f"GET / returned {first.status_code}"
+        samples = []
+        for _ in range(args.index_requests):
+            started = time.perf_counter()
+            response = client.get("/")
+            samples.append((time.perf_counter() - started) * 1000)
+        cpu = time_calls(lambda: client.get("/"), 0, min_calls=args.index_requests)
+        results[str(size)] = {
+            "status": response.status_code,
+            "html_bytes": len(response.data),
+            "library_indexed": indexed,
+            "first_ms": round(first_ms, 2),
+            "render_ms": vh.summarize_latencies(samples),
+            "cpu_ms_per_render": round(cpu["cpu_us_per_call"] / 1000, 2)
+        }
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "-C", str(REPO), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(data, prefix=""):
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+def compare(baseline, results, threshold):
+    # Only timings; sizes and counts are context
+    timing_keys = ("us_per_call", "cpu_us_per_call", "p50", "p99", "first_ms", "cpu_ms_per_render",
+                   "cpu_seconds_per_hour", "cpu_ms_per_rotation")
+    old = dict(flatten(baseline.get("results", {})))
+    lines = []
+    for name, value in flatten(results["results"]):
+        if not name.endswith(timing_keys) or not old.get(name):
+            continue
+        change = (value - old[name]) / old[name] * 100
+        if abs(change) >= threshold:
+            lines.append(f"{name}: {old[name]} -> {value} ({change:+.0f}%)")
+    print(f"Compared with {baseline.get('commit')} ({len(lines)} change(s) of {threshold}% or more):", file=sys.stderr)
+    for line in lines:
+        print("  " + line, file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="LivingPortrait hot path benchmarks")
+    parser.add_argument("--only", default="settings,schedule,player,index",
+                        help="comma-separated groups to run")
+    parser.add_argument("--order-sizes", default=DEFAULT_ORDER_SIZES)
+    parser.add_argument("--index-sizes", default=DEFAULT_INDEX_SIZES, help="video counts for the index() run")
+    parser.add_argument("--log-days", type=int, default=365, help="days of logs in the index() run")
+    parser.add_argument("--index-requests", type=int, default=20)
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="minimum time per micro-benchmark")
+    parser.add_argument("--updater-seconds", type=float, default=10)
+    parser.add_argument("--rotation-seconds", type=float, default=1.0, help="rotation interval for the updater run")
+    parser.add_argument("--updater-order", type=int, default=100)
+    parser.add_argument("--workdir", help="parent folder of the temporary HOME (e.g. on the SD card)")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=10, help="smallest change in %% that --compare reports")
+    args = parser.parse_args()
+
+    groups = set(args.only.split(","))
+    order_sizes = [int(size) for size in args.order_sizes.split(",")]
+    index_sizes = [int(size) for size in args.index_sizes.split(",")]
+
+    results = {
+        "commit": git_commit(),
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {}
+    }
+    with tempfile.TemporaryDirectory(dir=args.workdir) as home, contextlib.redirect_stdout(sys.stderr):
+        home = Path(home)
+        # Every module derives its paths from HOME at import time
+        os.environ["HOME"] = str(home)
+        for folder in ("videos", "logs", "images"):
+            (home / folder).mkdir()
+        sys.path.insert(0, str(REPO_PI))
+        from shared import analytics, vlc_helper as vh
+
+        if "settings" in groups:
+            results["results"]["settings"] = bench_settings(vh, order_sizes, args.min_seconds)
+        if "schedule" in groups:
+            results["results"]["schedule"] = bench_schedule(vh, args.min_seconds)
+        if "player" in groups:
+            results["results"]["player"] = bench_player(vh, load_player(home), args)
+        if "index" in groups:
+            results["results"]["index"] = bench_index(vh, home, index_sizes, args)
+        # Write pending log lines and playback events while the temporary home still exists
+        vh.LOGGER.flush()
+        analytics.RECORDER.flush()
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results, args.threshold)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# Measures /videos serving: full downloads, byte-range previews and ETag
+# revalidation. Reports MB/s and CPU seconds per MB served.
+#
+#   in_process  the Flask app through its test client (handler cost only)
+#   http        real loopback HTTP against a server in its own process, whose
+#               CPU is read from /proc: waitress with the production settings
+#               (send_media; waitress copies the file through read() into the
+#               socket), and a minimal server sending the same ranges with
+#               socket.sendfile(). The gap between the two is what a zero-copy
+#               front end in front of waitress would save per MB.
+#
+#   python3 benchmarks/bench_media_serving.py --size-mb 200 --out media.json
+import argparse
+import contextlib
+import http.client
+import http.server
+import importlib.util
+import json
+import os
+import socketserver
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_PI = Path(__file__).resolve().parent.parent / "pi"
+CLIENT_READ_SIZE = 1024 * 1024
+
+def load_app(home):
+    os.environ["HOME"] = str(home)
+    sys.path.insert(0, str(REPO_PI))
+    spec = importlib.util.spec_from_file_location("flask_ui_app", REPO_PI / "flask_ui" / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    # Flask locates templates through the module registered under its import name
+    sys.modules["flask_ui_app"] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+def measure(client, url, headers, repeat):
+    served = 0
+    statuses = set()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    for _ in range(repeat):
+        response = client.get(url, headers=headers)
+        for chunk in response.response:
+            served += len(chunk)
+        response.close()
+        statuses.add(response.status_code)
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    mb = served / (1024 * 1024)
+    return {
+        "requests": repeat,
+        "status": sorted(statuses),
+        "mb_served": round(mb, 2),
+        "seconds": round(wall, 4),
+        "mb_per_s": round(mb / wall, 1) if wall and mb else None,
+        "cpu_s_per_mb": round(cpu / mb, 5) if mb else None,
+        "ms_per_request": round(wall * 1000 / repeat, 3)
+    }
+
+# --- Over HTTP, server in a child process ---
+class SendfileHandler(http.server.BaseHTTPRequestHandler):
+    # The zero-copy reference: same headers and ranges as send_media, body via sendfile(2)
+    protocol_version = "HTTP/1.1"
+    path_to_file = None
+
+    def do_GET(self):
+        from shared.media_server import parse_range
+        with open(self.path_to_file, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            start, end, status = 0, size - 1, 200
+            byte_range = parse_range(self.headers.get("Range"), size)
+            if byte_range and byte_range != "invalid":
+                start, end = byte_range
+                status = 206
+            self.send_response(status)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(end - start + 1))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            self.wfile.flush()
+            self.connection.sendfile(f, start, end - start + 1)
+
+    def log_message(self, *args):
+        pass
+
+def serve(kind, home):
+    # Child process: print the port, then serve until killed; the app's log lines go to stderr
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    home = Path(home)
+    if kind == "waitress":
+        app = load_app(home)
+        from waitress.server import create_server
+        from shared.web_server import get_server_settings
+        config = get_server_settings()
+        server = create_server(app, host="127.0.0.1", port=0, threads=config["threads"],
+                               connection_limit=config["connection_limit"],
+                               channel_timeout=config["channel_timeout"])
+        print(server.effective_port, file=stdout, flush=True)
+        server.run()
+        return
+    sys.path.insert(0, str(REPO_PI))
+    SendfileHandler.path_to_file = home / "videos" / "bench.mp4"
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SendfileHandler)
+    print(server.server_address[1], file=stdout, flush=True)
+    server.serve_forever()
+
+def process_cpu_seconds(pid):
+    # utime + stime of the whole server process
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def measure_http(port, pid, headers, repeat):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    served = 0
+    statuses = set()
+    wall_start, cpu_start = time.perf_counter(), process_cpu_seconds(pid)
+    for _ in range(repeat):
+        conn.request("GET", "/videos/bench.mp4", headers=headers)
+        response = conn.getresponse()
+        while True:
+            data = response.read(CLIENT_READ_SIZE)
+            if not data:
+                break
+            served += len(data)
+        statuses.add(response.status)
+    wall, cpu = time.perf_counter() - wall_start, process_cpu_seconds(pid) - cpu_start
+    conn.close()
+    mb = served / (1024 * 1024)
+    return {
+        "requests": repeat,
+        "status": sorted(statuses),
+        "mb_served": round(mb, 2),
+        "mb_per_s": round(mb / wall, 1) if wall and mb else None,
+        "server_cpu_s_per_mb": round(cpu / mb, 5) if mb else None
+    }
+
+def bench_http(home, args):
+    results = {}
+    for kind in ("waitress", "sendfile"):
+        process = subprocess.Popen([sys.executable, __file__, "--serve", kind, str(home)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            port = int(process.stdout.readline())
+            # Warm the page cache and the server before measuring
+            measure_http(port, process.pid, {}, 1)
+            results[kind] = {
+                "full_get": measure_http(port, process.pid, {}, args.repeat),
+                "range_1mb": measure_http(port, process.pid, {"Range": "bytes=0-1048575"}, args.repeat * 20)
+            }
+        finally:
+            process.kill()
+            process.wait()
+    for name in ("full_get", "range_1mb"):
+        copied = results["waitress"][name]["server_cpu_s_per_mb"]
+        zero_copy = results["sendfile"][name]["server_cpu_s_per_mb"]
+        results.setdefault("sendfile_cpu_saving_percent", {})[name] = \
+            round((copied - zero_copy) / copied * 100) if copied else None
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="LivingPortrait media serving benchmark")
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--serve", nargs=2, metavar=("KIND", "HOME"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(*args.serve)
+        return
+
+    # stdout carries only the JSON; the app's log lines go to stderr
+    with tempfile.TemporaryDirectory() as home, contextlib.redirect_stdout(sys.stderr):
+        home = Path(home)
+        (home / "videos").mkdir()
+        video = home / "videos" / "bench.mp4"
+        with open(video, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+
+        app = load_app(home)
+        client = app.test_client()
+        etag = client.head("/videos/bench.mp4").headers["ETag"]
+
+        results = {
+            "file_mb": args.size_mb,
+            "in_process": {
+                "full_get": measure(client, "/videos/bench.mp4", {}, args.repeat),
+                "range_1mb": measure(client, "/videos/bench.mp4", {"Range": "bytes=0-1048575"}, args.repeat * 20),
+                "range_tail": measure(client, "/videos/bench.mp4", {"Range": "bytes=-1048576"}, args.repeat * 20),
+                "revalidate_304": measure(client, "/videos/bench.mp4", {"If-None-Match": etag}, args.repeat * 100)
+            },
+            "http": bench_http(home, args)
+        }
+        # Write pending log lines while the temporary home still exists
+        sys.modules["shared.vlc_helper"].LOGGER.flush()
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
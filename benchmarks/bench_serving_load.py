@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Dashboard latency while a large upload is in flight. Starts the Flask UI on
+# a loopback port (waitress with the production settings, and/or the
+# threaded development server), measures GET / on its own, then again while a
+# 500 MB multipart upload streams to /upload. Reports p50/p99 per server.
+#
+#   python3 benchmarks/bench_serving_load.py --upload-mb 500 --clients 4 --out load.json
+import argparse
+import http.client
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+REPO_PI = Path(__file__).resolve().parent.parent / "pi"
+BOUNDARY = "benchboundary7d2f"
+
+def load_app(home):
+    os.environ["HOME"] = str(home)
+    sys.path.insert(0, str(REPO_PI))
+    spec = importlib.util.spec_from_file_location("flask_ui_app", REPO_PI / "flask_ui" / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    # Flask locates templates through the module registered under its import name
+    sys.modules["flask_ui_app"] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+def start_server(app, kind):
+    # Returns (port, stop); both servers run in a background thread
+    if kind == "waitress":
+        from waitress.server import create_server
+        from shared.web_server import get_server_settings
+        config = get_server_settings()
+        server = create_server(app, host="127.0.0.1", port=0, threads=config["threads"],
+                               connection_limit=config["connection_limit"],
+                               channel_timeout=config["channel_timeout"],
+                               inbuf_overflow=config["inbuf_overflow"],
+                               max_request_body_size=config["max_request_body_size"])
+        threading.Thread(target=server.run, daemon=True).start()
+        return server.effective_port, server.close
+
+    from werkzeug.serving import make_server
+    # One access log line per request would dominate the output
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown
+
+def upload(port, size_mb, rate_mb_s, result):
+    # Streams a generated multipart body, optionally throttled like a Wi-Fi client
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"load.mp4\"\r\n"
+            "Content-Type: video/mp4\r\n\r\n").encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+    block = b"\0" * (1024 * 1024)
+
+    def body():
+        yield head
+        started = time.perf_counter()
+        for i in range(size_mb):
+            yield block
+            if rate_mb_s:
+                ahead = (i + 1) / rate_mb_s - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        yield tail
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    started = time.perf_counter()
+    conn.request("POST", "/upload", body=body(), headers={
+        "Content-Type": f"multipart/form-data; boundary={BOUNDARY}",
+        "Content-Length": str(len(head) + size_mb * len(block) + len(tail))
+    })
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    result.update(status=response.status, seconds=round(time.perf_counter() - started, 2))
+
+def page_client(port, until, samples, max_requests=None):
+    # One keep-alive connection, like a browser tab reloading the dashboard
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    count = 0
+    while not until() and (max_requests is None or count < max_requests):
+        started = time.perf_counter()
+        conn.request("GET", "/")
+        response = conn.getresponse()
+        response.read()
+        samples.append((time.perf_counter() - started) * 1000)
+        count += 1
+    conn.close()
+
+def run_clients(port, clients, until, max_requests=None):
+    samples = []
+    threads = [threading.Thread(target=page_client, args=(port, until, samples, max_requests))
+               for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+def bench(app, kind, args):
+    from shared.vlc_helper import summarize_latencies
+    port, stop = start_server(app, kind)
+    try:
+        # First render compiles the template; keep it out of the numbers
+        run_clients(port, 1, lambda: False, max_requests=3)
+        idle = run_clients(port, args.clients, lambda: False, max_requests=args.baseline_requests)
+
+        upload_result = {}
+        uploader = threading.Thread(target=upload, args=(port, args.upload_mb, args.upload_rate, upload_result))
+        uploader.start()
+        loaded = run_clients(port, args.clients, lambda: not uploader.is_alive())
+        uploader.join()
+    finally:
+        stop()
+    return {
+        "idle_ms": summarize_latencies(idle),
+        "during_upload_ms": summarize_latencies(loaded),
+        "upload": upload_result
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--upload-mb", type=int, default=500)
+    parser.add_argument("--upload-rate", type=float, default=0, help="MB/s cap for the upload, 0 = unthrottled")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent dashboard connections")
+    parser.add_argument("--baseline-requests", type=int, default=50, help="GET / per client without load")
+    parser.add_argument("--server", choices=["waitress", "dev", "both"], default="both")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    kinds = ["waitress", "dev"] if args.server == "both" else [args.server]
+    results = {"upload_mb": args.upload_mb, "clients": args.clients}
+    with tempfile.TemporaryDirectory() as home:
+        app = load_app(Path(home))
+        for kind in kinds:
+            if kind == "waitress" and importlib.util.find_spec("waitress") is None:
+                results[kind] = {"skipped": "waitress not installed"}
+                continue
+            results[kind] = bench(app, kind, args)
+            # Start the next run without the previous upload on disk
+            (Path(home) / "videos" / "load.mp4").unlink(missing_ok=True)
+        # Write pending log lines while the temporary home still exists
+        sys.modules["shared.vlc_helper"].LOGGER.flush()
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
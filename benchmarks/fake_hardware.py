@@ -0,0 +1,174 @@
+# Stand-ins for python-vlc and gpiozero so motion_vlc.py can be imported and
+# driven on a machine without libVLC or GPIO pins. Only the calls the player
+# makes are implemented; media "plays" instantly and events fire synchronously.
+#
+#   import fake_hardware; fake_hardware.install()   # before importing motion_vlc
+import sys
+import threading
+import types
+
+class State:
+    NothingSpecial, Opening, Buffering, Playing, Paused, Stopped, Ended, Error = range(8)
+
+class EventType:
+    MediaPlayerPlaying = "MediaPlayerPlaying"
+    MediaPlayerPaused = "MediaPlayerPaused"
+    MediaPlayerStopped = "MediaPlayerStopped"
+    MediaPlayerEndReached = "MediaPlayerEndReached"
+    MediaPlayerEncounteredError = "MediaPlayerEncounteredError"
+
+class EventManager:
+    def __init__(self):
+        self.callbacks = {}
+
+    def event_attach(self, event_type, callback, *args):
+        self.callbacks.setdefault(event_type, []).append((callback, args))
+
+    def fire(self, event_type):
+        event = types.SimpleNamespace(type=event_type)
+        for callback, args in self.callbacks.get(event_type, []):
+            callback(event, *args)
+
+class Media:
+    def __init__(self, path):
+        self.path = str(path)
+
+    def get_mrl(self):
+        return "file://" + self.path
+
+class MediaList:
+    def __init__(self):
+        self.items = []
+
+    def add_media(self, media):
+        self.items.append(media if isinstance(media, Media) else Media(media))
+
+    def count(self):
+        return len(self.items)
+
+class MediaPlayer:
+    def __init__(self):
+        self.events = EventManager()
+        self.media = None
+        self.state = State.NothingSpecial
+        self.position_ms = 0
+
+    def event_manager(self):
+        return self.events
+
+    def set_media(self, media):
+        self.media = media
+        self.state = State.NothingSpecial
+
+    def get_media(self):
+        return self.media
+
+    def _set_state(self, state, event_type):
+        self.state = state
+        self.events.fire(event_type)
+
+    def play(self):
+        self._set_state(State.Playing, EventType.MediaPlayerPlaying)
+        return 0
+
+    def set_pause(self, paused):
+        if paused:
+            self._set_state(State.Paused, EventType.MediaPlayerPaused)
+        else:
+            self._set_state(State.Playing, EventType.MediaPlayerPlaying)
+
+    def stop(self):
+        self._set_state(State.Stopped, EventType.MediaPlayerStopped)
+
+    def end(self):
+        # Test hook: the current media reached its end
+        self._set_state(State.Ended, EventType.MediaPlayerEndReached)
+
+    def get_state(self):
+        return self.state
+
+    def is_playing(self):
+        return self.state == State.Playing
+
+    def set_time(self, ms):
+        self.position_ms = ms
+
+    def get_time(self):
+        return self.position_ms
+
+    def get_length(self):
+        return 0
+
+class MediaListPlayer:
+    def __init__(self):
+        self.player = None
+        self.media_list = None
+
+    def set_media_player(self, player):
+        self.player = player
+
+    def set_media_list(self, media_list):
+        self.media_list = media_list
+
+    def play(self):
+        if self.media_list and self.media_list.items:
+            self.player.set_media(self.media_list.items[0])
+        self.player.play()
+
+    def stop(self):
+        self.player.stop()
+
+class Instance:
+    def __init__(self, *args):
+        pass
+
+    def media_player_new(self):
+        return MediaPlayer()
+
+    def media_list_player_new(self):
+        return MediaListPlayer()
+
+    def media_list_new(self):
+        return MediaList()
+
+    def media_new(self, path):
+        return Media(path)
+
+class MotionSensor:
+    def __init__(self, pin, **kwargs):
+        self.pin = pin
+        self.when_motion = None
+        self.when_no_motion = None
+        self._motion = threading.Event()
+
+    @property
+    def motion_detected(self):
+        return self._motion.is_set()
+
+    def trigger(self):
+        # Test hook: a rising edge on the PIR pin
+        self._motion.set()
+        if self.when_motion:
+            self.when_motion()
+
+    def release(self):
+        self._motion.clear()
+        if self.when_no_motion:
+            self.when_no_motion()
+
+    def wait_for_motion(self, timeout=None):
+        return self._motion.wait(timeout)
+
+    def close(self):
+        pass
+
+def install():
+    # Always the fakes, even where libVLC is installed, so runs are comparable
+    vlc = types.ModuleType("vlc")
+    vlc.State, vlc.EventType = State, EventType
+    vlc.Instance, vlc.Media, vlc.MediaPlayer = Instance, Media, MediaPlayer
+    vlc.MediaList, vlc.MediaListPlayer = MediaList, MediaListPlayer
+    gpiozero = types.ModuleType("gpiozero")
+    gpiozero.MotionSensor = MotionSensor
+    sys.modules["vlc"] = vlc
+    sys.modules["gpiozero"] = gpiozero
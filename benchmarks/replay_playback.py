@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+# Replays a trace of PIR edges, pause toggles, mode changes and schedule edges
+# against the player's own state machine (pi/shared/playback.py) in virtual
+# time. A discrete-event clock stands in for sleep() and ControlChannel.wait(),
+# and the simulated player and sensor fire their callbacks at scheduled virtual
+# times, so a day of visitor traffic replays in seconds, identically every run.
+#
+# Trace: one JSON object per line, {"t": seconds, "event": ..., ...}
+#   motion     {"hold": 3}            PIR output high for `hold` seconds
+#   pause / unpause                   pause_flag toggled in the UI
+#   triggered  {"on": false}          triggered mode on/off
+#   delay      {"seconds": 10}        delay after a triggered video
+#   select     {"video": "b.mp4"}     selected video
+#   schedule   {"active": false}      schedule window edge
+#   end                               stop the replay here
+#
+# Reports idle wake-ups, time to first frame after a PIR edge, missed triggers
+# (edges while armed-or-rearming that never started the video) and how long each
+# settings change took to reach the player.
+#
+#   python3 benchmarks/replay_playback.py --synthetic-day --visitors-per-hour 40 --out day.json
+#   python3 benchmarks/replay_playback.py --trace visitors.jsonl
+#   python3 benchmarks/replay_playback.py --from-log ~/logs/2026-10-16.txt
+import argparse
+import heapq
+import json
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_PI = Path(__file__).resolve().parent.parent / "pi"
+sys.path.insert(0, str(REPO_PI))
+
+from shared.playback import PlaybackController, IDLE, OPENING, PLAYING, PAUSED, STOPPED, ENDED
+from shared.vlc_helper import CONTROL_FALLBACK_POLL_SECONDS, summarize_latencies
+
+PAUSE_VIDEO = "pause_video/paused_rotated.mp4"
+DEFAULT_HOLD_SECONDS = 3.0
+LOG_LINE = re.compile(r"^\[(\d{4}-\d\d-\d\dT[\d:.]+)\] (.*)$")
+
+class SimulationEnd(Exception):
+    pass
+
+class Simulation:
+    # Virtual time plus a queue of scheduled callbacks; time only moves inside advance()
+    def __init__(self, end_time):
+        self.now = 0.0
+        self.end_time = end_time
+        self._queue = []
+        self._seq = 0
+        self.pending = []
+        # Called with (seconds) before time moves, to account time per context
+        self.on_elapse = None
+
+    def schedule(self, delay, callback):
+        self._seq += 1
+        heapq.heappush(self._queue, (self.now + max(0.0, delay), self._seq, callback))
+
+    def _move_to(self, at):
+        if at > self.now:
+            if self.on_elapse:
+                self.on_elapse(at - self.now)
+            self.now = at
+
+    def advance(self, deadline, until=None):
+        # Runs due callbacks until `until()` holds or the deadline passes
+        while True:
+            if until is not None and until():
+                return True
+            if self._queue and self._queue[0][0] <= deadline:
+                at, _, callback = heapq.heappop(self._queue)
+                if at > self.end_time:
+                    self._move_to(self.end_time)
+                    raise SimulationEnd()
+                self._move_to(at)
+                callback()
+                continue
+            if deadline > self.end_time:
+                self._move_to(self.end_time)
+                raise SimulationEnd()
+            self._move_to(deadline)
+            return until() if until is not None else False
+
+class SimClock:
+    def __init__(self, sim, settings, stats):
+        self.sim = sim
+        self.settings = settings
+        self.stats = stats
+
+    def now(self):
+        return self.sim.now
+
+    def sleep(self, seconds):
+        self.sim.advance(self.sim.now + seconds)
+        self.stats.wakeup()
+
+    def wait(self, timeout=None):
+        if timeout is None:
+            timeout = self.settings.next_timeout()
+        if not self.sim.pending:
+            self.sim.advance(self.sim.now + timeout, until=lambda: bool(self.sim.pending))
+        events, self.sim.pending = self.sim.pending, []
+        self.stats.wakeup()
+        return events
+
+    def wait_event(self, event, timeout):
+        result = self.sim.advance(self.sim.now + timeout, until=event.is_set)
+        self.stats.wakeup()
+        return result
+
+    def notify(self, event):
+        self.sim.pending.append(event)
+
+class SimSettings:
+    def __init__(self, sim, video, triggered, delay, schedule_edges, debounce):
+        self.sim = sim
+        self.debounce = debounce
+        self.is_paused = False
+        self.is_triggered = triggered
+        self.delay = delay
+        self.video = video
+        self.is_active = True
+        self.schedule_edges = sorted(schedule_edges)
+
+    def paused(self):
+        return self.is_paused
+
+    def triggered(self):
+        return self.is_triggered
+
+    def trigger_delay(self):
+        return self.delay
+
+    def selected_video(self):
+        return f"videos/{self.video}"
+
+    def schedule_active(self):
+        return self.is_active
+
+    def motion_debounce(self):
+        return self.debounce
+
+    def effective_paused(self):
+        return self.is_paused or not self.is_active
+
+    def next_timeout(self):
+        # Like next_control_timeout(): the next schedule edge or the fallback poll
+        timeout = CONTROL_FALLBACK_POLL_SECONDS
+        for edge in self.schedule_edges:
+            if edge > self.sim.now:
+                timeout = min(timeout, edge - self.sim.now + 0.05)
+                break
+        return max(0.05, timeout)
+
+class SimSensor:
+    def __init__(self, sim, stats):
+        self.sim = sim
+        self.stats = stats
+        self.when_motion = None
+        self.high = False
+        self._release_at = 0.0
+
+    def motion(self, hold):
+        self._release_at = max(self._release_at, self.sim.now + hold)
+        self.sim.schedule(hold, self._maybe_release)
+        if self.high:
+            # A PIR retriggers while high: the output just stays on longer
+            self.stats.motion_extended(self._release_at)
+            return
+        self.high = True
+        self.stats.motion_edge(self._release_at)
+        if self.when_motion:
+            self.when_motion()
+
+    def _maybe_release(self):
+        if self.sim.now >= self._release_at:
+            self.high = False
+
+    @property
+    def motion_detected(self):
+        return self.high
+
+class SimPlayer:
+    # Opening a file, resuming and the in-engine list switch each take a fixed virtual time
+    def __init__(self, sim, stats, video_seconds, open_latency, resume_latency, switch_latency):
+        self.sim = sim
+        self.stats = stats
+        self.video_seconds = video_seconds
+        self.open_latency = open_latency
+        self.resume_latency = resume_latency
+        self.switch_latency = switch_latency
+        self.callbacks = {}
+        self.state = IDLE
+        self.media = None
+        self.position = 0.0
+        self.playing_since = 0.0
+        self.length_known = False
+        self.items = None
+        self.item_index = 0
+        self._generation = 0
+
+    def attach(self, event_name, callback):
+        self.callbacks.setdefault(event_name, []).append(callback)
+
+    def _fire(self, event_name):
+        self.stats.player_event(event_name, self.media)
+        for callback in self.callbacks.get(event_name, []):
+            callback()
+
+    def _later(self, delay, callback):
+        # Any state change cancels what was scheduled before it
+        generation = self._generation
+        self.sim.schedule(delay, lambda: generation == self._generation and callback())
+
+    def _duration(self):
+        return 3600.0 if self.media == PAUSE_VIDEO else self.video_seconds
+
+    def _start_playing(self):
+        self._generation += 1
+        self.state = PLAYING
+        self.playing_since = self.sim.now
+        self.length_known = True
+        self._fire("playing")
+        self._later(self._duration() - self.position, self._end)
+
+    def _end(self):
+        self._generation += 1
+        self.position = self._duration()
+        self.state = ENDED
+        self._fire("end_reached")
+        if self.items and self.item_index + 1 < len(self.items):
+            self.item_index += 1
+            self._later(self.switch_latency, self._next_item)
+
+    def _next_item(self):
+        self.media = self.items[self.item_index]
+        self.position = 0.0
+        self._start_playing()
+
+    def load(self, path):
+        self._generation += 1
+        self.state = IDLE
+        self.media = str(path)
+        self.position = 0.0
+        self.length_known = False
+        self.items = None
+        self.stats.player_command("load", self.media)
+
+    def play(self):
+        if self.media is None or self.state in (OPENING, PLAYING):
+            return
+        self._generation += 1
+        self.state = OPENING
+        self._later(self.open_latency, self._start_playing)
+
+    def set_pause(self, paused):
+        if paused and self.state in (OPENING, PLAYING):
+            if self.state == PLAYING:
+                self.position += self.sim.now - self.playing_since
+            self._generation += 1
+            self.state = PAUSED
+            self._fire("paused")
+        elif not paused and self.state == PAUSED:
+            self.stats.player_command("resume", self.media)
+            self._generation += 1
+            self._later(self.resume_latency, self._start_playing)
+
+    def set_time(self, ms):
+        self.position = ms / 1000.0
+        if self.state == PLAYING:
+            self.playing_since = self.sim.now
+            self._generation += 1
+            self._later(self._duration() - self.position, self._end)
+
+    def stop(self):
+        self._generation += 1
+        if self.state != STOPPED:
+            self.state = STOPPED
+            self._fire("stopped")
+
+    def get_state(self):
+        return self.state
+
+    def is_playing(self):
+        return self.state == PLAYING
+
+    def get_length(self):
+        return int(self._duration() * 1000) if self.length_known else 0
+
+    def get_time(self):
+        position = self.position
+        if self.state == PLAYING:
+            position += self.sim.now - self.playing_since
+        return int(position * 1000)
+
+    def start_list(self, path):
+        self.load(path)
+        self.items = [str(path)]
+        self.item_index = 0
+        self.stats.player_command("start_list", self.media)
+        self.play()
+
+    def queue(self, path):
+        self.items.append(str(path))
+        self.stats.player_command("queue", str(path))
+
+    def list_count(self):
+        return len(self.items) if self.items else 0
+
+    def stop_list(self):
+        self.stop()
+
+class ReplayStats:
+    def __init__(self, sim):
+        self.sim = sim
+        self.controller = None
+        self.sensor = None
+        self.settings = None
+        self.seconds_by_context = {}
+        self.wakeups_by_context = {}
+        self.edges = []
+        self.ttff_ms = []
+        self.videos_started = 0
+        self._resumed_edge = None
+        # Between a triggered resume and that video ending or being stopped
+        self.triggered_video_running = False
+        # (started_at, kind, predicate) for settings changes the player has not reacted to yet
+        self.pending_reactions = []
+        self.reaction_ms = {}
+        self.superseded = 0
+
+    def context(self):
+        if self.controller is None:
+            return "starting"
+        if self.controller.paused_mode:
+            return "paused"
+        if self.controller.waiting_for_motion:
+            return "waiting_for_motion"
+        return "playing"
+
+    def elapse(self, seconds):
+        key = self.context()
+        self.seconds_by_context[key] = self.seconds_by_context.get(key, 0.0) + seconds
+
+    def wakeup(self):
+        key = self.context()
+        self.wakeups_by_context[key] = self.wakeups_by_context.get(key, 0) + 1
+
+    def motion_edge(self, release_at):
+        settings = self.settings
+        eligible = settings.triggered() and not settings.effective_paused()
+        # A visitor walking in on a triggered video that is already running is served by it
+        watching = eligible and self.triggered_video_running
+        self.edges.append({"t": self.sim.now, "until": release_at, "eligible": eligible, "served": watching})
+
+    def motion_extended(self, release_at):
+        if self.edges:
+            self.edges[-1]["until"] = release_at
+
+    def player_command(self, command, path):
+        self.triggered_video_running = command == "resume" and path != PAUSE_VIDEO
+        if command == "resume" and path != PAUSE_VIDEO:
+            for edge in reversed(self.edges):
+                if edge["t"] <= self.sim.now <= edge["until"] + 1e-9 and not edge["served"]:
+                    edge["served"] = True
+                    self._resumed_edge = edge
+                    break
+        for pending in list(self.pending_reactions):
+            started_at, kind, predicate = pending
+            if predicate(command, path):
+                self.pending_reactions.remove(pending)
+                self.reaction_ms.setdefault(kind, []).append((self.sim.now - started_at) * 1000)
+
+    def player_event(self, event_name, path):
+        if event_name in ("end_reached", "stopped"):
+            self.triggered_video_running = False
+        if event_name != "playing" or path == PAUSE_VIDEO:
+            return
+        self.videos_started += 1
+        if self._resumed_edge is not None:
+            self.ttff_ms.append((self.sim.now - self._resumed_edge["t"]) * 1000)
+            self._resumed_edge = None
+
+    def expect(self, kind, group, predicate):
+        # A newer change of the same kind replaces an unanswered older one
+        for pending in list(self.pending_reactions):
+            if pending[1].split(":")[0] == group:
+                self.pending_reactions.remove(pending)
+                self.superseded += 1
+        self.pending_reactions.append((self.sim.now, f"{group}:{kind}", predicate))
+
+def apply_event(event, settings, sensor, sim, stats):
+    kind = event["event"]
+    if kind == "motion":
+        sensor.motion(float(event.get("hold", DEFAULT_HOLD_SECONDS)))
+        return
+
+    was_paused = settings.effective_paused()
+    notify = True
+    if kind in ("pause", "unpause"):
+        settings.is_paused = kind == "pause"
+    elif kind == "schedule":
+        settings.is_active = bool(event.get("active", True))
+        # Schedule edges are not announced; the player wakes at them by itself
+        notify = False
+    elif kind == "triggered":
+        on = bool(event.get("on", True))
+        if on != settings.is_triggered and not settings.effective_paused():
+            if on:
+                stats.expect("on", "triggered", lambda command, path: command == "load" and path != PAUSE_VIDEO)
+            else:
+                stats.expect("off", "triggered", lambda command, path: command == "start_list")
+        settings.is_triggered = on
+    elif kind == "delay":
+        settings.delay = int(event.get("seconds", 0))
+    elif kind == "select":
+        video = event["video"]
+        if video != settings.video and not settings.effective_paused():
+            stats.expect("select", "select", lambda command, path: command in ("load", "start_list", "queue")
+                         and path.endswith("/" + video))
+        settings.video = video
+    else:
+        raise ValueError(f"Unknown trace event: {kind}")
+
+    if settings.effective_paused() != was_paused:
+        if settings.effective_paused():
+            stats.expect(kind, "pause", lambda command, path: command == "load" and path == PAUSE_VIDEO)
+        else:
+            stats.expect(kind, "pause", lambda command, path: command in ("load", "start_list") and path != PAUSE_VIDEO)
+    if notify:
+        sim.pending.append("settings")
+
+def replay(trace, args):
+    end_time = max([e["t"] for e in trace] + [0.0]) + args.tail_seconds
+    for event in trace:
+        if event["event"] == "end":
+            end_time = event["t"]
+    sim = Simulation(end_time)
+    stats = ReplayStats(sim)
+    sim.on_elapse = stats.elapse
+    schedule_edges = [e["t"] for e in trace if e["event"] == "schedule"]
+    settings = SimSettings(sim, args.video, args.initial_mode == "triggered", args.delay, schedule_edges,
+                           args.debounce)
+    sensor = SimSensor(sim, stats)
+    player = SimPlayer(sim, stats, args.video_seconds, args.open_latency, args.resume_latency, args.switch_latency)
+    clock = SimClock(sim, settings, stats)
+    stats.settings, stats.sensor = settings, sensor
+
+    # Events at t=0 set the starting state before the player comes up
+    for event in trace:
+        if event["event"] != "end" and event["t"] <= 0:
+            apply_event(event, settings, sensor, sim, stats)
+        elif event["event"] != "end":
+            sim.schedule(event["t"], lambda event=event: apply_event(event, settings, sensor, sim, stats))
+    stats.pending_reactions.clear()
+    sim.pending.clear()
+
+    def log(message):
+        if args.verbose:
+            print(f"[{sim.now:10.3f}] {message}")
+
+    controller = PlaybackController(clock, player, sensor, settings=settings, pause_video=PAUSE_VIDEO,
+                                    on_trigger_stats=None, log=log, on_event=None)
+    stats.controller = controller
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        controller.run(settings.selected_video())
+    except SimulationEnd:
+        pass
+    return report(stats, controller, sim, time.perf_counter() - wall_started, time.process_time() - cpu_started)
+
+def per_hour(count, seconds):
+    return round(count / seconds * 3600, 1) if seconds else None
+
+def report(stats, controller, sim, wall, cpu):
+    hours = sim.now / 3600
+    idle_seconds = stats.seconds_by_context.get("paused", 0) + stats.seconds_by_context.get("waiting_for_motion", 0)
+    idle_wakeups = stats.wakeups_by_context.get("paused", 0) + stats.wakeups_by_context.get("waiting_for_motion", 0)
+    eligible = [edge for edge in stats.edges if edge["eligible"]]
+    missed = [round(edge["t"], 3) for edge in eligible if not edge["served"]]
+    return {
+        "simulated_seconds": round(sim.now, 1),
+        "wall_seconds": round(wall, 3),
+        "speedup": round(sim.now / wall) if wall else None,
+        "idle": {
+            "seconds_by_context": {key: round(value, 1) for key, value in stats.seconds_by_context.items()},
+            "wakeups_by_context": stats.wakeups_by_context,
+            "idle_wakeups_per_hour": per_hour(idle_wakeups, idle_seconds),
+            "wakeups_per_hour": per_hour(sum(stats.wakeups_by_context.values()), sim.now),
+            # State machine plus simulator; an upper bound for the player's own share
+            "cpu_ms_per_simulated_hour": round(cpu * 1000 / hours, 2) if hours else None
+        },
+        "triggers": {
+            "motion_edges": len(stats.edges),
+            "eligible": len(eligible),
+            "served": sum(1 for edge in eligible if edge["served"]),
+            "missed": len(missed),
+            "missed_at": missed[:50],
+            "time_to_first_frame_ms": summarize_latencies(stats.ttff_ms)
+        },
+        "mode_switch_ms": {kind: summarize_latencies(samples) for kind, samples in sorted(stats.reaction_ms.items())},
+        "mode_switch_unanswered": [kind for _, kind, _ in stats.pending_reactions],
+        "mode_switch_superseded": stats.superseded,
+        "playback": {
+            "videos_started": stats.videos_started,
+            "preroll_switches": controller.switch_count,
+            "preroll_switch_ms": summarize_latencies([s * 1000 for s in controller.switch_latencies])
+        }
+    }
+
+def load_trace(path):
+    trace = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                trace.append(json.loads(line))
+    return sorted(trace, key=lambda event: event["t"])
+
+def trace_from_log(path):
+    # Player logs only show edges that were acted on, so this under-counts visitors
+    trace, first = [], None
+    with open(path, errors="replace") as f:
+        for line in f:
+            match = LOG_LINE.match(line.rstrip("\n"))
+            if not match or "Motion detected!" not in match.group(2):
+                continue
+            at = datetime.fromisoformat(match.group(1))
+            first = first or at
+            trace.append({"t": (at - first).total_seconds(), "event": "motion", "hold": DEFAULT_HOLD_SECONDS})
+    return trace
+
+def synthetic_day(seed, visitors_per_hour, open_hours=(8, 22)):
+    # Closed at night, a lunchtime pause, an hour of endless mode in the evening,
+    # and visitors arriving at random (Poisson) while open
+    rng = random.Random(seed)
+    opens, closes = open_hours[0] * 3600, open_hours[1] * 3600
+    trace = [
+        {"t": 0, "event": "schedule", "active": False},
+        {"t": opens, "event": "schedule", "active": True},
+        {"t": 13 * 3600, "event": "pause"},
+        {"t": 13.5 * 3600, "event": "unpause"},
+        {"t": 15 * 3600, "event": "select", "video": "second.mp4"},
+        {"t": 18 * 3600, "event": "triggered", "on": False},
+        {"t": 19 * 3600, "event": "triggered", "on": True},
+        {"t": closes, "event": "schedule", "active": False},
+        {"t": 24 * 3600, "event": "end"}
+    ]
+    t = opens
+    while True:
+        t += rng.expovariate(visitors_per_hour / 3600)
+        if t >= closes:
+            break
+        trace.append({"t": round(t, 3), "event": "motion", "hold": round(rng.uniform(2, 8), 1)})
+    return sorted(trace, key=lambda event: event["t"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay PIR/settings traces against the playback state machine")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--trace", help="JSON lines trace file")
+    source.add_argument("--from-log", help="player log file; its 'Motion detected!' lines become PIR edges")
+    source.add_argument("--synthetic-day", action="store_true", help="generated day of traffic (default)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--visitors-per-hour", type=float, default=30)
+    parser.add_argument("--initial-mode", choices=["triggered", "endless"], default="triggered")
+    parser.add_argument("--delay", type=int, default=0, help="seconds to wait after a triggered video")
+    parser.add_argument("--debounce", type=float, default=0.3, help="PIR debounce window in seconds")
+    parser.add_argument("--video", default="portrait.mp4")
+    parser.add_argument("--video-seconds", type=float, default=45)
+    parser.add_argument("--open-latency", type=float, default=0.15, help="load+play until Playing")
+    parser.add_argument("--resume-latency", type=float, default=0.03, help="resume from pause until Playing")
+    parser.add_argument("--switch-latency", type=float, default=0.02, help="in-engine media list switch")
+    parser.add_argument("--tail-seconds", type=float, default=120, help="run on after the last event")
+    parser.add_argument("--verbose", action="store_true", help="print the player log in virtual time")
+    parser.add_argument("--out", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    elif args.from_log:
+        trace = trace_from_log(args.from_log)
+    else:
+        trace = synthetic_day(args.seed, args.visitors_per_hour)
+
+    results = replay(trace, args)
+    results["trace"] = {"events": len(trace), "source": args.trace or args.from_log or f"synthetic seed {args.seed}"}
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash
 from pathlib import Path
+import hmac
 import os
 from datetime import datetime, timedelta
 import random
-from flask import jsonify
+import threading
+import time
+from flask import jsonify, Response, g
+from werkzeug.wsgi import ClosingIterator
 import sys
 
 HOME = Path(os.path.expanduser("~"))
@@ -14,7 +18,8 @@ sys.path.append(str(HOME))
 from shared.vlc_helper import (
     log,
     load_settings,
-    save_settings,
+    settings_transaction,
+    apply_playlist_settings,
     get_playlist_settings,
     update_playlist_settings,
     read_pause_flag,
@@ -22,8 +27,27 @@ from shared.vlc_helper import (
     get_days_schedule,
     update_days_schedule,
     is_schedule_enabled_now,
-    get_next_start_time
+    get_next_start_time,
+    read_trigger_stats,
+    channel_names,
+    channel_view
 )
+from shared.video_library import VideoLibrary, format_duration
+from shared.video_store import VideoStore, IntegrityVerifier
+from shared.uploads import ChunkedUploads, UploadError, free_disk_bytes, UPLOAD_FREE_SPACE_MARGIN
+from shared.transcoder import Transcoder
+from shared.thumbnails import ThumbnailCache, THUMBS_FOLDER
+from shared.log_reader import tail_lines, follow_lines, LOG_TAIL_DEFAULT_LINES
+from shared.log_index import LogCatalog, LogSearchIndex, LOG_SEARCH_LIMIT, LOG_SUFFIXES, log_day
+from shared.status_feed import StatusFeed
+from shared.web_server import serve, get_server_settings
+from shared.media_server import send_media, VIDEO_CACHE_CONTROL, IMAGE_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL
+from shared.fleet_sync import (
+    FleetSync, FleetSyncError, build_manifest, manifest_etag, fleet_settings_subset,
+    get_fleet_settings, FLEET_TOKEN_HEADER
+)
+from shared.analytics import AnalyticsQueries, EVENT_KINDS, ANALYTICS_PAGE_LIMIT
+from shared import metrics
 
 app = Flask(__name__)
 app.secret_key = 'replace-this-with-a-secure-random-key'  # Change to a secure key in production
@@ -32,12 +56,122 @@ VIDEO_FOLDER = HOME / "videos"
 IMAGES_FOLDER = HOME / "images"
 LOG_FOLDER = HOME / "logs"
 SETTINGS_FILE = HOME / "settings.json"
+# An open event stream holds a server thread; the browser reconnects (with
+# Last-Event-ID) after this long, which also frees threads of closed tabs
+EVENT_STREAM_MAX_SECONDS = 300
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+# Streams hold a worker thread each; the server keeps the rest for page loads
+STREAM_SLOTS = threading.BoundedSemaphore(get_server_settings()["max_streams"])
+EVENT_STREAM_BUSY_RETRY_MS = 10000
 
 # Ensure directories exist
 LOG_FOLDER.mkdir(parents=True, exist_ok=True)
 VIDEO_FOLDER.mkdir(parents=True, exist_ok=True)
 IMAGES_FOLDER.mkdir(parents=True, exist_ok=True)
 
+THUMBS = ThumbnailCache(THUMBS_FOLDER)
+STORE = VideoStore()
+LIBRARY = VideoLibrary(VIDEO_FOLDER, on_indexed=THUMBS.request, store=STORE)
+LIBRARY.refresh()
+# Videos indexed before the thumbnail cache existed, or whose thumbnails were evicted
+for name, entry in LIBRARY.entries().items():
+    THUMBS.request(VIDEO_FOLDER / name, entry)
+
+LOG_CATALOG = LogCatalog(LOG_FOLDER)
+LOG_SEARCH = LogSearchIndex(LOG_CATALOG)
+LOG_SEARCH.start_background_update()
+
+UPLOADS = ChunkedUploads(VIDEO_FOLDER)
+UPLOADS.cleanup_stale()
+
+def add_video_to_playlist(filename):
+    # Update playlist order by appending new video with active = True
+    with settings_transaction() as settings:
+        order = settings.get("playlist", {}).get("order", [])
+
+        # Check if filename already present
+        if not any(item["filename"] == filename for item in order):
+            order.append({"filename": filename, "active": True})
+            settings["playlist"]["order"] = order
+
+def on_video_ready(filename):
+    # A new video is complete in ~/videos (directly or after transcoding)
+    LIBRARY.refresh(force=True)
+    add_video_to_playlist(filename)
+
+TRANSCODER = Transcoder(VIDEO_FOLDER, on_ready=on_video_ready)
+
+# Pulled videos are already content-checked and in ~/videos; they only need indexing
+FLEET = FleetSync(VIDEO_FOLDER, on_changed=lambda: LIBRARY.refresh(force=True), store=STORE)
+FLEET.cleanup_parts()
+
+def drop_videos_from_channels(names, reason):
+    # The files are gone from ~/videos; point every channel at a video that is still there
+    with settings_transaction() as settings:
+        for channel in channel_names(settings):
+            view = channel_view(settings, channel)
+            playlist = view.get("playlist", {})
+            if "order" in playlist:
+                playlist["order"] = [item for item in playlist["order"] if item["filename"] not in names]
+            if view.get("selected_video") not in names:
+                continue
+            remaining = [item["filename"] for item in playlist.get("order", [])
+                         if item.get("active", True) and LIBRARY.contains(item["filename"])]
+            if remaining:
+                view["selected_video"] = remaining[0]
+                log(f"[Playlist] Selected video of {channel} {reason}, switched to {remaining[0]}")
+            else:
+                # Nothing left to play: hold the pause screen until a video is selected again
+                view["selected_video"] = ""
+                view["pause_flag"] = True
+                log(f"[Playlist] Selected video of {channel} {reason} and no other video is active, paused")
+
+def on_videos_quarantined(names):
+    drop_videos_from_channels(names, "quarantined")
+
+VERIFIER = IntegrityVerifier(LIBRARY, STORE, on_quarantine=on_videos_quarantined)
+VERIFIER.start()
+
+STATUS_FEED = StatusFeed()
+
+ANALYTICS = AnalyticsQueries()
+ANALYTICS_DEFAULT_DAYS = 7
+
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests handled by the web UI", ["method", "route", "status"])
+HTTP_REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "Time until the response is returned (streams excluded)", ["method", "route"])
+PLAYER_UP = metrics.gauge("player_up", "1 when the player published metrics recently")
+PLAYER_SNAPSHOT_AGE = metrics.gauge("player_metrics_age_seconds", "Age of the player's last metrics snapshot")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Label by route pattern, not path, so /videos/<filename> stays one series
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUESTS.labels(method=request.method, route=route, status=response.status_code).inc()
+        HTTP_REQUEST_SECONDS.labels(method=request.method, route=route).observe(time.perf_counter() - started)
+    return response
+
+def wants_json():
+    return request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json"
+
+def respond(message, category="success", status_code=None):
+    # Forms get flash + redirect; fetch() callers sending Accept: application/json get
+    # the message plus the new status, so the page can update without a reload
+    STATUS_FEED.poke()
+    if wants_json():
+        version, status, _ = STATUS_FEED.current()
+        if status_code is None:
+            status_code = 400 if category == "danger" else 200
+        return jsonify(ok=category != "danger", message=message, category=category,
+                       version=version, status=status), status_code
+    flash(message, category)
+    return redirect(url_for("index"))
+
 def format_ampm(time_str):
     return datetime.strptime(time_str, "%H:%M").strftime("%I:%M %p")
 
@@ -45,7 +179,7 @@ def format_ampm(time_str):
 def index():
     current_time = datetime.now().strftime("%A %I:%M:%S %p") 
     theme = request.cookies.get("themeMode", "light")
-    videos = sorted([f.name for f in VIDEO_FOLDER.glob("*.mp4")])
+    library = LIBRARY.entries()
     settings = load_settings()
     selected_video = settings.get("selected_video", "")
     pause_flag = settings.get("pause_flag", False)
@@ -72,14 +206,23 @@ def index():
 
     fixed_order = [
          entry for entry in order
-         if isinstance(entry, dict) and entry.get("filename") in videos and entry.get("active")
+         if isinstance(entry, dict) and entry.get("filename") in library and entry.get("active")
     ]
 
     manage_videos = [
         entry for entry in order
-        if isinstance(entry, dict) and entry.get("filename") in videos
+        if isinstance(entry, dict) and entry.get("filename") in library
     ]
 
+    thumbs = {}
+    for name, entry in library.items():
+        cached = THUMBS.lookup(entry)
+        if cached:
+            thumbs[name] = {
+                "poster": url_for('thumb_file', filename=cached["poster"]),
+                "preview": url_for('thumb_file', filename=cached["preview"]) if cached["preview"] else None
+            }
+
     # Calculate time remaining until next video switch
     time_remaining = None
     if mode in ["random", "fixed"] and last_updated and interval > 0:
@@ -92,15 +235,10 @@ def index():
         except Exception as e:
             log(f"Error calculating time remaining: {e}")
 
-    logs = []
-    if LOG_FOLDER.exists():
-        for f in LOG_FOLDER.glob("*.txt"):
-            logs.append({
-                "name": f.name,
-                "mtime": datetime.fromtimestamp(f.stat().st_mtime).strftime('%Y-%m-%d %I:%M %p'),
-                "size": f.stat().st_size
-            })
-        logs.sort(key=lambda x: x["mtime"], reverse=True)
+    # Already sorted newest first by the catalog; compressed days included
+    logs = LOG_CATALOG.days()
+    for entry in logs:
+        entry["mtime"] = datetime.fromtimestamp(entry["mtime"]).strftime('%Y-%m-%d %I:%M %p')
 
     return render_template(
         "index.html",
@@ -113,6 +251,7 @@ def index():
         fixed_order=fixed_order,
         manage_videos=manage_videos, 
         time_remaining=time_remaining,
+        now_epoch=int(time.time()),
         pause=pause_flag,
         video_count=len(fixed_order),
         theme=theme,
@@ -123,7 +262,12 @@ def index():
         is_schedule_enabled_now=schedule_enabled,
         next_start_time=next_start_time,
         triggered_flag=triggered_flag,
-        delay=delay
+        delay=delay,
+        library=library,
+        thumbs=thumbs,
+        transcode_jobs=TRANSCODER.jobs(),
+        format_duration=format_duration,
+        trigger_stats=read_trigger_stats()
     )
 
 @app.route("/select", methods=["POST"])
@@ -140,174 +284,354 @@ def select():
         if interval < 0:
             raise ValueError()
     except (ValueError, TypeError):
-        flash("Invalid interval value", "danger")
-        return redirect(url_for("index"))    
+        return respond("Invalid interval value", "danger")
     
     if action == "shuffle":
-        settings = load_settings()
-        order = settings.get("playlist", {}).get("order", [])
-        
-        # Separate active and inactive videos
-        active_videos = [v for v in order if v.get("active", True)]
-        inactive_videos = [v for v in order if not v.get("active", True)]
-        
-        random.shuffle(active_videos)
-        
-        # Combine shuffled active with inactive
-        new_order = active_videos + inactive_videos
+        with settings_transaction() as settings:
+            order = settings.get("playlist", {}).get("order", [])
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        update_playlist_settings(mode="fixed",interval=interval,last_updated=timestamp,order=new_order,triggered_flag=triggered_flag,delay=delay)
-
-        # Now load settings again to update selected_video
-        settings = load_settings()
-        if new_order:
-            settings["selected_video"] = new_order[0]["filename"]
-            save_settings(settings)
-        
-        flash("Playlist order shuffled!", "success")
-        return redirect(url_for("index"))
+            # Separate active and inactive videos
+            active_videos = [v for v in order if v.get("active", True)]
+            inactive_videos = [v for v in order if not v.get("active", True)]
+
+            random.shuffle(active_videos)
+
+            # Combine shuffled active with inactive
+            new_order = active_videos + inactive_videos
+
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            apply_playlist_settings(settings, mode="fixed", interval=interval, last_updated=timestamp, order=new_order,
+                                    triggered_flag=triggered_flag, delay=delay,
+                                    selected_video=new_order[0]["filename"] if new_order else None)
+
+        return respond("Playlist order shuffled!", "success")
     
 
 
-    videos = sorted([f.name for f in VIDEO_FOLDER.glob("*.mp4")])
+    videos = LIBRARY.names()
     if not videos:
-        flash("No videos found in the Videos folder", "danger")
-        return redirect(url_for("index"))
+        return respond("No videos found in the Videos folder", "danger")
 
     if playlist_mode == "random":
         if interval == 0:
-            flash("Interval must be greater than zero for random mode", "danger")
-            return redirect(url_for("index"))
+            return respond("Interval must be greater than zero for random mode", "danger")
 
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        update_playlist_settings(mode="random",interval=interval,last_updated=timestamp,triggered_flag=triggered_flag,delay=delay)
-
-        settings = load_settings()
-        current_video = settings.get("selected_video", "")
-        order = settings.get("playlist", {}).get("order", [])
-        active_files = [item["filename"] for item in order if item.get("active", True)]
+        with settings_transaction() as settings:
+            apply_playlist_settings(settings, mode="random", interval=interval, last_updated=timestamp,
+                                    triggered_flag=triggered_flag, delay=delay)
 
-        if not active_files:
-            flash("No active videos available for random playback", "danger")
-            return redirect(url_for("index"))
+            current_video = settings.get("selected_video", "")
+            order = settings.get("playlist", {}).get("order", [])
+            active_files = [item["filename"] for item in order if item.get("active", True)]
 
-        other_choices = [f for f in active_files if f != current_video]
-        new_video = random.choice(other_choices) if other_choices else current_video
+            if active_files:
+                other_choices = [f for f in active_files if f != current_video]
+                settings["selected_video"] = random.choice(other_choices) if other_choices else current_video
 
-        settings["selected_video"] = new_video
-        save_settings(settings)
+        if not active_files:
+            return respond("No active videos available for random playback", "danger")
 
-        flash(f"Random mode enabled with interval {interval} seconds", "success")
+        return respond(f"Random mode enabled with interval {interval} seconds", "success")
 
     elif playlist_mode == "fixed":
         if interval == 0:
-            flash("Interval must be greater than zero for fixed mode", "danger")
-            return redirect(url_for("index"))
+            return respond("Interval must be greater than zero for fixed mode", "danger")
 
         order_str = request.form.get("fixed_order", "")
-        filenames = [v.strip() for v in order_str.split(",") if v.strip() in videos]
+        video_set = set(videos)
+        filenames = [v.strip() for v in order_str.split(",") if v.strip() in video_set]
 
         if not filenames:
-            flash("Please provide a valid fixed order with existing videos", "danger")
-            return redirect(url_for("index"))
+            return respond("Please provide a valid fixed order with existing videos", "danger")
 
-        existing_order = load_settings().get("playlist", {}).get("order", [])
-        existing_dict = {entry['filename']: entry for entry in existing_order if 'filename' in entry}
+        with settings_transaction() as settings:
+            existing_order = settings.get("playlist", {}).get("order", [])
+            existing_dict = {entry['filename']: entry for entry in existing_order if 'filename' in entry}
 
-        new_order = []
-        for fn in filenames:
-            new_order.append({"filename": fn, "active": True})
+            new_order = []
+            for fn in filenames:
+                new_order.append({"filename": fn, "active": True})
 
-        for fn, entry in existing_dict.items():
-            if fn not in filenames:
-                new_order.append({"filename": fn, "active": False})
+            for fn, entry in existing_dict.items():
+                if fn not in filenames:
+                    new_order.append({"filename": fn, "active": False})
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        update_playlist_settings(mode="fixed", interval=interval, last_updated=timestamp, order=new_order,triggered_flag=triggered_flag,delay=delay)
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            apply_playlist_settings(settings, mode="fixed", interval=interval, last_updated=timestamp, order=new_order,
+                                    triggered_flag=triggered_flag, delay=delay, selected_video=new_order[0]["filename"])
 
-        # Now load settings again to update selected_video
-        settings = load_settings()
-        if new_order:
-            settings["selected_video"] = new_order[0]["filename"]
-            save_settings(settings)
+        return respond(f"Fixed playlist mode enabled with interval {interval} seconds", "success")
 
-        flash(f"Fixed playlist mode enabled with interval {interval} seconds", "success")
-
-    else:
-        selected_video = request.form.get("video")
-        if selected_video and (VIDEO_FOLDER / selected_video).exists():
-            update_playlist_settings(mode="single", interval=0, last_updated="",triggered_flag=triggered_flag,delay=delay)
-            settings = load_settings()
-            settings["selected_video"] = selected_video
-            save_settings(settings)
-            flash(f"Selected single video: {selected_video}", "success")
-        else:
-            flash("Invalid video selection", "danger")
-
-    return redirect(url_for("index"))
+    selected_video = request.form.get("video")
+    if selected_video and LIBRARY.contains(selected_video):
+        update_playlist_settings(mode="single", interval=0, last_updated="", triggered_flag=triggered_flag,
+                                 delay=delay, selected_video=selected_video)
+        return respond(f"Selected single video: {selected_video}", "success")
+    return respond("Invalid video selection", "danger")
 
 @app.route('/pause_toggle', methods=['POST'])
 def pause_toggle():
     pause = request.form.get('pause')  # 'on' if checked, else None
     is_paused = pause == 'on'
     write_pause_flag(is_paused)
-    return redirect(url_for('index'))
+    return respond("System paused" if is_paused else "System resumed", "success")
 
-@app.route('/videos/<filename>')
+@app.route('/videos/<filename>', methods=['GET', 'HEAD'])
 def video_file(filename):
-    full_path = VIDEO_FOLDER / filename
-    log(f"Serving video file: {full_path}")
-    if not full_path.exists():
-        log("File does not exist!")
-        return "File not found", 404
-    return send_from_directory(VIDEO_FOLDER, filename)
+    # Videos can be replaced under the same name, so always revalidate (cheap 304 via ETag)
+    return send_media(VIDEO_FOLDER, filename, VIDEO_CACHE_CONTROL)
 
 
-@app.route('/images/<filename>')
+@app.route('/images/<filename>', methods=['GET', 'HEAD'])
 def image_file(filename):
-    full_path = IMAGES_FOLDER / filename
-    log(f"Serving video file: {full_path}")
-    if not full_path.exists():
-        log("File does not exist!")
-        return "File not found", 404
-    return send_from_directory(IMAGES_FOLDER, filename)
+    # URLs built with image_url() carry the file's mtime and never change content
+    cache_control = IMMUTABLE_CACHE_CONTROL if request.args.get("v") else IMAGE_CACHE_CONTROL
+    return send_media(IMAGES_FOLDER, filename, cache_control)
+
+@app.route('/thumbs/<filename>', methods=['GET', 'HEAD'])
+def thumb_file(filename):
+    # Named after the video's content hash, so a URL always means the same bytes
+    THUMBS.touch(os.path.basename(filename))
+    return send_media(THUMBS_FOLDER, filename, IMMUTABLE_CACHE_CONTROL)
+
+@app.context_processor
+def inject_media_helpers():
+    def image_url(filename):
+        try:
+            version = (IMAGES_FOLDER / filename).stat().st_mtime_ns
+        except OSError:
+            return url_for('image_file', filename=filename)
+        return url_for('image_file', filename=filename, v=f"{version:x}")
+    return {"image_url": image_url}
 
 
 @app.route('/upload', methods=['POST'])
 def upload():
     if 'file' not in request.files:
-        flash('No file part', 'danger')
-        return redirect(url_for('index'))
+        return respond('No file part', "danger")
     file = request.files['file']
     if file.filename == '':
-        flash('No selected file', 'danger')
-        return redirect(url_for('index'))
+        return respond('No selected file', "danger")
     if file and file.filename.lower().endswith('.mp4'):
-        save_path = VIDEO_FOLDER / file.filename
-        file.save(save_path)
+        if request.content_length and free_disk_bytes(VIDEO_FOLDER) < request.content_length + UPLOAD_FREE_SPACE_MARGIN:
+            return respond('Not enough disk space for this upload', "danger")
+        filename = os.path.basename(file.filename)
+        staged_path = TRANSCODER.incoming_path(filename)
+        file.save(staged_path)
+        if TRANSCODER.submit(staged_path, filename) == "queued":
+            return respond(f'Uploaded: {file.filename}, optimizing it for playback in the background', 'info')
+        return respond(f'Uploaded: {file.filename}', 'success')
+    return respond('Only .mp4 files are allowed', "danger")
+
+
+
+# --- Status API ---
+# GET /api/status  -> {"version": N, "status": {...}}, ETag per version (304 when unchanged)
+# GET /api/events  -> server-sent "status" events carrying the same body on every change
+@app.route('/api/status')
+def api_status():
+    version, _, body = STATUS_FEED.current()
+    etag = STATUS_FEED.etag(version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype="application/json", headers=headers)
+
+@app.route('/api/events')
+def api_events():
+    last_seen = request.headers.get("Last-Event-ID")
+
+    def events():
+        yield "retry: 2000\n\n"
+        deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+        version, _, body = STATUS_FEED.current()
+        # A reconnecting client that is already up to date gets nothing until the next change
+        if f"{STATUS_FEED.boot_id}-{version}" != last_seen:
+            yield f"event: status\nid: {STATUS_FEED.boot_id}-{version}\ndata: {body}\n\n"
+        while time.monotonic() < deadline:
+            new_version, _, body = STATUS_FEED.wait_for_change(version, EVENT_STREAM_KEEPALIVE_SECONDS)
+            if new_version == version:
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            yield f"event: status\nid: {STATUS_FEED.boot_id}-{version}\ndata: {body}\n\n"
+
+    return event_stream(events())
+
+# --- Metrics ---
+# GET /metrics -> Prometheus text format; web UI series plus the player's last
+# snapshot from /dev/shm, told apart by the "process" label
+@app.route('/metrics')
+def metrics_endpoint():
+    age, player_metrics = metrics.read_snapshot()
+    PLAYER_UP.set(1 if player_metrics else 0)
+    PLAYER_SNAPSHOT_AGE.set(round(age, 1) if age is not None else -1)
+    body = metrics.render([
+        ({"process": "web"}, metrics.REGISTRY.snapshot()),
+        ({"process": "player"}, player_metrics)
+    ])
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- Analytics ---
+# Playback history recorded by the player (see shared/analytics.py). All take
+# ?days=N (default 7) or ?since=/&until= unix times, and ?channel=<name>.
+# GET /api/analytics/summary           -> count (and average value) per event kind
+# GET /api/analytics/triggers          -> triggers per hour; ?by=hour_of_day for 24 local-hour totals
+# GET /api/analytics/videos?limit=20   -> most played videos with average watch time
+# GET /api/analytics/events?limit=100  -> raw events, newest first; ?before=<id>, ?kind=
+def analytics_range():
+    until = request.args.get("until", type=float) or time.time()
+    since = request.args.get("since", type=float)
+    if since is None:
+        since = until - request.args.get("days", ANALYTICS_DEFAULT_DAYS, type=float) * 86400
+    return since, until, request.args.get("channel") or None
+
+@app.route('/api/analytics/summary')
+def analytics_summary():
+    since, until, channel = analytics_range()
+    return jsonify(since=since, until=until, totals=ANALYTICS.totals(since, until, channel))
+
+@app.route('/api/analytics/triggers')
+def analytics_triggers():
+    since, until, channel = analytics_range()
+    if request.args.get("by") == "hour_of_day":
+        return jsonify(since=since, until=until, hour_of_day=ANALYTICS.by_hour_of_day("trigger", since, until, channel))
+    return jsonify(since=since, until=until, hours=ANALYTICS.per_hour("trigger", since, until, channel))
+
+@app.route('/api/analytics/videos')
+def analytics_videos():
+    since, until, channel = analytics_range()
+    limit = max(1, min(request.args.get("limit", 20, type=int), 200))
+    return jsonify(since=since, until=until, videos=ANALYTICS.videos(since, until, channel, limit))
+
+@app.route('/api/analytics/events')
+def analytics_events():
+    kind = request.args.get("kind")
+    if kind and kind not in EVENT_KINDS:
+        return jsonify(error=f"Unknown event kind, expected one of {', '.join(EVENT_KINDS)}"), 400
+    limit = max(1, min(request.args.get("limit", 100, type=int), ANALYTICS_PAGE_LIMIT))
+    events = ANALYTICS.recent(limit, request.args.get("before", type=int), kind)
+    return jsonify(events=events)
+
+def event_stream(events):
+    # Past the stream limit the client gets an empty stream that tells EventSource
+    # to reconnect later, instead of an error that would stop it for good
+    if STREAM_SLOTS.acquire(blocking=False):
+        # The server calls close() even when the client left before the first event
+        body = ClosingIterator(events, STREAM_SLOTS.release)
+    else:
+        events.close()
+        body = [f"retry: {EVENT_STREAM_BUSY_RETRY_MS}\n\n"]
+    return Response(body, mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Chunked uploads ---
+# POST /api/uploads {filename, size, fingerprint} -> start or resume, returns the current offset
+# PUT  /api/uploads/<id>?offset=N                  -> raw chunk body, streamed to disk
+# GET  /api/uploads/<id>                           -> current offset after a dropped connection
+# POST /api/uploads/<id>/complete                  -> atomic rename into ~/videos + playlist entry
+def upload_error_response(e):
+    body = {"error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    return jsonify(body), e.status
+
+@app.route('/api/uploads', methods=['POST'])
+def upload_start():
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(UPLOADS.start(data.get("filename"), data.get("size"), data.get("fingerprint"))), 201
+    except UploadError as e:
+        return upload_error_response(e)
 
-        # Update playlist order by appending new video with active = True
-        settings = load_settings()
-        order = settings.get("playlist", {}).get("order", [])
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    try:
+        return jsonify(UPLOADS.status(upload_id))
+    except UploadError as e:
+        return upload_error_response(e)
 
-        # Check if filename already present
-        if not any(item["filename"] == file.filename for item in order):
-            order.append({"filename": file.filename, "active": True})
-            settings["playlist"]["order"] = order
-            save_settings(settings)
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    try:
+        offset = int(request.args.get("offset", "-1"))
+        new_offset = UPLOADS.write_chunk(upload_id, offset, request.stream, request.content_length)
+        return jsonify({"upload_id": upload_id, "offset": new_offset})
+    except ValueError:
+        return jsonify({"error": "Invalid offset"}), 400
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    try:
+        filename, staged_path = UPLOADS.finish(upload_id, TRANSCODER.incoming_path)
+    except UploadError as e:
+        return upload_error_response(e)
 
-        flash(f'Uploaded: {file.filename}', 'success')
+    status = TRANSCODER.submit(staged_path, filename)
+    if status == "queued":
+        flash(f'Uploaded: {filename}, optimizing it for playback in the background', 'info')
     else:
-        flash('Only .mp4 files are allowed', 'danger')
-    return redirect(url_for('index'))
-
+        flash(f'Uploaded: {filename}', 'success')
+    return jsonify({"filename": filename, "status": status})
+
+# --- Fleet sync ---
+# GET  /api/fleet/manifest  -> {"videos": {name: {size, sha256}}, "pending": [...], "settings": digest}
+# GET  /api/fleet/settings  -> the playback settings a peer copies
+# POST /api/fleet/sync {source, bandwidth_kbps?, delete_missing?} -> pull from another portrait
+# GET  /api/fleet/sync      -> progress of the current or last pull
+# With "token" set under "fleet" in settings.json every route needs it in X-Fleet-Token;
+# videos themselves come through /videos/<filename> with Range requests.
+def fleet_forbidden():
+    token = get_fleet_settings()["token"]
+    # Constant-time comparison, so response timing does not leak the token
+    if token and not hmac.compare_digest(request.headers.get(FLEET_TOKEN_HEADER, "").encode(), token.encode()):
+        return jsonify({"error": "Invalid fleet token"}), 403
+    return None
+
+@app.route('/api/fleet/manifest')
+def fleet_manifest():
+    forbidden = fleet_forbidden()
+    if forbidden:
+        return forbidden
+    manifest = build_manifest(LIBRARY.entries(), load_settings())
+    etag = manifest_etag(manifest)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        return Response(status=304, headers=headers)
+    return jsonify(manifest), 200, headers
+
+@app.route('/api/fleet/settings')
+def fleet_settings():
+    forbidden = fleet_forbidden()
+    if forbidden:
+        return forbidden
+    return jsonify(fleet_settings_subset(load_settings()))
+
+@app.route('/api/fleet/sync', methods=['GET', 'POST'])
+def fleet_sync():
+    forbidden = fleet_forbidden()
+    if forbidden:
+        return forbidden
+    if request.method == 'GET':
+        return jsonify(FLEET.status())
+    data = request.get_json(silent=True) or {}
+    try:
+        status = FLEET.start(data.get("source"), LIBRARY.entries(),
+                             data.get("bandwidth_kbps"), data.get("delete_missing"))
+    except FleetSyncError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify(status), 202
 
+@app.route('/api/transcode_jobs')
+def transcode_jobs():
+    return jsonify(TRANSCODER.jobs())
 
 @app.route('/save_schedule', methods=['POST'])
 def save_schedule():
-    settings = load_settings()
-    current_days = settings.get("days", {})
+    current_days = get_days_schedule()
     days = {}
 
     for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']:
@@ -329,10 +653,8 @@ def save_schedule():
             "end": end_time
         }
 
-    settings["days"] = days
-    save_settings(settings)
-    flash("Schedule saved successfully!", "success")
-    return redirect(url_for('index'))
+    update_days_schedule(days)
+    return respond("Schedule saved successfully!", "success")
 
 
 
@@ -342,43 +664,36 @@ def update_status():
     filename = request.form.get('filename')
     active = request.form.get('active') == 'true'
 
-    settings = load_settings()
-    order = settings.get('playlist', {}).get('order', [])
-
-    # Count active videos before updating
-    active_count = sum(1 for v in order if v.get('active', True))
+    with settings_transaction() as settings:
+        order = settings.get('playlist', {}).get('order', [])
 
-    # Find target video
-    target_video = next((v for v in order if v['filename'] == filename), None)
+        # Count active videos before updating
+        active_count = sum(1 for v in order if v.get('active', True))
 
-    # If trying to deactivate and it's the only active video
-    if target_video and not active and active_count <= 1:
-        flash("At least one video must remain active.", "danger")
-        return redirect(url_for('index'))
+        # Find target video
+        target_video = next((v for v in order if v['filename'] == filename), None)
 
-    # If not found, optionally add it
-    if not target_video:
-        order.append({'filename': filename, 'active': active})
-    else:
-        target_video['active'] = active
+        # If trying to deactivate and it's the only active video
+        if target_video and not active and active_count <= 1:
+            return respond("At least one video must remain active.", "danger")
 
-    settings['playlist']['order'] = order
-    save_settings(settings)
+        # If not found, optionally add it
+        if not target_video:
+            order.append({'filename': filename, 'active': active})
+        else:
+            target_video['active'] = active
 
-    # After updating, check how many are now active
-    updated_active = [v for v in order if v.get('active', True)]
+        settings['playlist']['order'] = order
 
-    if len(updated_active) == 1:
-        only_video = updated_active[0]['filename']
-        update_playlist_settings(mode="single", interval=0, last_updated="")
-        settings = load_settings()
-        settings["selected_video"] = only_video
-        save_settings(settings)
-        flash(f"Only one active video remains. Switched to single mode with video: {only_video}", "info")
-    else:
-        flash(f"Updated status for {filename}: {'Active' if active else 'Inactive'}", "success")
+        # After updating, check how many are now active
+        updated_active = [v for v in order if v.get('active', True)]
+        only_video = updated_active[0]['filename'] if len(updated_active) == 1 else None
+        if only_video:
+            apply_playlist_settings(settings, mode="single", interval=0, last_updated="", selected_video=only_video)
 
-    return redirect(url_for('index'))
+    if only_video:
+        return respond(f"Only one active video remains. Switched to single mode with video: {only_video}", "info")
+    return respond(f"Updated status for {filename}: {'Active' if active else 'Inactive'}", "success")
 
 
 @app.route('/delete/<filename>', methods=['POST'])
@@ -386,62 +701,119 @@ def delete(filename):
     filepath = VIDEO_FOLDER / filename
     if filepath.exists():
         filepath.unlink()
+        LIBRARY.refresh()
+        # Every channel's order, and its selection if it was this video
+        drop_videos_from_channels({filename}, "deleted")
 
-        # Remove from playlist order
-        settings = load_settings()
-        order = settings.get("playlist", {}).get("order", [])
-        order = [item for item in order if item["filename"] != filename]
-        settings["playlist"]["order"] = order
-        save_settings(settings)
+        return respond(f'Deleted {filename}', 'success')
+    return respond('File not found', "danger", 404)
 
-        flash(f'Deleted {filename}', 'success')
-    else:
-        flash('File not found', 'danger')
-    return redirect(url_for('index'))
+def log_file_path(filename):
+    filepath = LOG_FOLDER / os.path.basename(filename)
+    return filepath if filepath.is_file() else None
+
+def read_log_tail(filepath):
+    # ?lines=N for the last N lines, ?before=<offset> for the page before that offset
+    return tail_lines(filepath, request.args.get("lines", LOG_TAIL_DEFAULT_LINES, type=int),
+                      request.args.get("before", type=int))
 
 @app.route('/logs/view/<filename>')
 def view_log(filename):
-    safe_filename = os.path.basename(filename)
-    filepath = LOG_FOLDER / safe_filename
-    if not filepath.exists() or not filepath.is_file():
-        flash("Log file not found", "danger")
-        return redirect(url_for('index'))
+    filepath = log_file_path(filename)
+    if not filepath:
+        return respond("Log file not found", "danger")
     try:
-        with open(filepath, 'r') as f:
-            content = f.read(10000)
+        tail = read_log_tail(filepath)
     except Exception as e:
-        flash(f"Error reading file: {e}", "danger")
-        return redirect(url_for('index'))
-    return render_template("view_log.html", filename=safe_filename, content=content)
+        return respond(f"Error reading file: {e}", "danger")
+    return render_template("view_log.html", filename=filepath.name, tail=tail)
 
 @app.route('/logs/raw/<filename>')
 def get_log_content(filename):
-    safe_filename = os.path.basename(filename)
-    filepath = LOG_FOLDER / safe_filename
-    if not filepath.exists() or not filepath.is_file():
+    filepath = log_file_path(filename)
+    if not filepath:
         return "File not found", 404
 
     try:
-        with open(filepath, 'r') as f:
-            content = f.read(10000)
-        return content, 200, {'Content-Type': 'text/plain'}
+        tail = read_log_tail(filepath)
     except Exception as e:
         return f"Error reading file: {e}", 500
+    content = "".join(line + "\n" for line in tail["lines"])
+    # Offsets for paging back (?before=X-Log-Start) and for /logs/stream (?offset=X-Log-End)
+    return content, 200, {
+        'Content-Type': 'text/plain; charset=utf-8',
+        'X-Log-Start': str(tail["start"]),
+        'X-Log-End': str(tail["end"]),
+        'X-Log-Size': str(tail["size"])
+    }
+
+@app.route('/logs/tail/<filename>')
+def get_log_tail(filename):
+    filepath = log_file_path(filename)
+    if not filepath:
+        return jsonify(error="File not found"), 404
+    try:
+        return jsonify(read_log_tail(filepath))
+    except Exception as e:
+        return jsonify(error=f"Error reading file: {e}"), 500
 
+@app.route('/logs/stream/<filename>')
+def stream_log(filename):
+    filepath = log_file_path(filename)
+    if not filepath:
+        return "File not found", 404
 
-
+    # EventSource sends the id of the last event it saw when it reconnects
+    offset = request.headers.get("Last-Event-ID") or request.args.get("offset")
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        offset = filepath.stat().st_size
+
+    def events():
+        yield "retry: 2000\n\n"
+        last_sent = time.monotonic()
+        for position, lines in follow_lines(filepath, offset, duration=EVENT_STREAM_MAX_SECONDS):
+            if lines:
+                yield f"id: {position}\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > EVENT_STREAM_KEEPALIVE_SECONDS:
+                # Comment line: keeps proxies from timing out and surfaces closed connections
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+    return event_stream(events())
+
+@app.route('/logs/search')
+def search_logs():
+    query = request.args.get("q", "").strip()
+    limit = max(1, min(request.args.get("limit", LOG_SEARCH_LIMIT, type=int), 1000))
+    started = time.monotonic()
+    results = LOG_SEARCH.search(query, limit) if query else []
+    return jsonify(
+        query=query,
+        available=LOG_SEARCH.available,
+        results=results,
+        took_ms=round((time.monotonic() - started) * 1000, 1)
+    )
 
 @app.route('/logs/delete/<filename>', methods=['POST'])
 def delete_log(filename):
     safe_filename = os.path.basename(filename)
-    filepath = LOG_FOLDER / safe_filename
-
-    if filepath.exists():
-        filepath.unlink()
-        flash(f"Deleted log {safe_filename}", "success")
-    else:
-        flash("Log file not found", "danger")
-    return redirect(url_for('index'))
+    day = log_day(safe_filename)
+    if day is None:
+        return respond("Log file not found", "danger", 404)
+
+    # Both the plain and the gzipped file, so a day caught mid-compression doesn't come back
+    deleted = False
+    for suffix in LOG_SUFFIXES:
+        filepath = LOG_FOLDER / f"{day}{suffix}"
+        if filepath.exists():
+            filepath.unlink()
+            deleted = True
+    if deleted:
+        return respond(f"Deleted log {safe_filename}", "success")
+    return respond("Log file not found", "danger", 404)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    serve(app)
@@ -4,20 +4,31 @@ import sys
 import atexit
 import threading
 import os
-from time import sleep
+import time
+import traceback
 from gpiozero import MotionSensor
 from pathlib import Path
+from shared.video_library import VideoLibrary
+from shared import analytics, metrics
+from shared.playback import (
+    PlaybackController,
+    RealClock,
+    SettingsInputs,
+    IDLE, OPENING, PLAYING, PAUSED, STOPPED, ENDED, ERROR
+)
 from shared.vlc_helper import (
     log,
     playlist_updater,
     stop_playlist_thread,
+    wake_playlist_updater,
     update_playlist_timestamp_on_startup,
-    get_selected_video,
-    read_pause_flag,
-    get_triggered_flag,
-    get_trigger_delay_seconds,
-    is_schedule_enabled_now
-    
+    get_settings_snapshot,
+    channel_names,
+    channel_view,
+    write_trigger_stats,
+    SETTINGS,
+    MAIN_CHANNEL,
+    ControlChannel
 )
 
 HOME = Path(os.path.expanduser("~"))
@@ -25,206 +36,235 @@ HOME = Path(os.path.expanduser("~"))
 LOG_FOLDER = HOME / "logs"
 VIDEO_FOLDER = HOME / "videos"
 PAUSE_VIDEO = HOME / "pause_video" / "paused_rotated.mp4"
-last_played_path = None
 
 # Make sure the log folder exists
 LOG_FOLDER.mkdir(parents=True, exist_ok=True)
 
-# Global player object
-player = None
+# Hardware of each channel (see vlc_helper.channel_view). The main channel can
+# be adjusted under settings["main_channel"]; entries under settings["channels"]
+# need at least a "name" and a "pin", and usually vlc_args picking their display,
+# e.g. ["--drm-vout-display=HDMI-A-2"]. Changes take effect on restart.
+MAIN_CHANNEL_DEFAULTS = {"pin": 4, "vlc_args": [], "pause_video": str(PAUSE_VIDEO)}
+CHANNEL_DEFAULTS = {"vlc_args": [], "pause_video": str(PAUSE_VIDEO)}
+
+# Running channels, main first
+channels = []
+
+# Settings changes from the web UI arrive here and are fanned out to every
+# channel's own queue; motion and VLC events stay on the channel they belong to
+control = ControlChannel()
+exporter = metrics.MetricsExporter(on_error=log)
+# Playback events are recorded from every channel; failed writes go to the player log
+analytics.RECORDER.on_error = log
+# Set when a channel thread stops, which only happens when it crashed
+channel_stopped = threading.Event()
+
+CHANNEL_CPU = metrics.gauge("channel_cpu_seconds", "CPU time used by each channel's playback thread", ["channel"])
+
+# vlc.State / vlc.EventType <-> the playback module's names
+VLC_STATES = {
+    vlc.State.NothingSpecial: IDLE,
+    vlc.State.Opening: OPENING,
+    vlc.State.Buffering: OPENING,
+    vlc.State.Playing: PLAYING,
+    vlc.State.Paused: PAUSED,
+    vlc.State.Stopped: STOPPED,
+    vlc.State.Ended: ENDED,
+    vlc.State.Error: ERROR
+}
+VLC_EVENT_TYPES = {
+    "playing": vlc.EventType.MediaPlayerPlaying,
+    "paused": vlc.EventType.MediaPlayerPaused,
+    "stopped": vlc.EventType.MediaPlayerStopped,
+    "end_reached": vlc.EventType.MediaPlayerEndReached,
+    "error": vlc.EventType.MediaPlayerEncounteredError
+}
+
+class VlcPlayer:
+    # One media player, shared by single files and the endless-mode media list
+    def __init__(self, vlc_args=()):
+        self.instance = vlc.Instance(*vlc_args)
+        self.player = self.instance.media_player_new()
+        self.list_player = self.instance.media_list_player_new()
+        self.list_player.set_media_player(self.player)
+        self.media_list = None
+
+    def attach(self, event_name, callback):
+        self.player.event_manager().event_attach(VLC_EVENT_TYPES[event_name], lambda event: callback())
+
+    def load(self, path):
+        self.player.set_media(self.instance.media_new(str(path)))
+
+    def play(self):
+        self.player.play()
+
+    def set_pause(self, paused):
+        self.player.set_pause(paused)
+
+    def set_time(self, ms):
+        self.player.set_time(ms)
+
+    def stop(self):
+        self.player.stop()
+
+    def get_state(self):
+        return VLC_STATES.get(self.player.get_state(), IDLE)
+
+    def is_playing(self):
+        return self.player.is_playing()
+
+    def get_length(self):
+        return self.player.get_length()
+
+    def get_time(self):
+        return self.player.get_time()
+
+    def start_list(self, path):
+        self.media_list = self.instance.media_list_new()
+        self.media_list.add_media(self.instance.media_new(str(path)))
+        self.list_player.set_media_list(self.media_list)
+        self.list_player.play()
+
+    def queue(self, path):
+        self.media_list.add_media(self.instance.media_new(str(path)))
+
+    def list_count(self):
+        return self.media_list.count() if self.media_list else 0
+
+    def stop_list(self):
+        self.list_player.stop()
+
+class Channel:
+    # One portrait: a display, a PIR sensor and a playback state machine in its own thread
+    def __init__(self, name, config):
+        self.name = name
+        self.sensor = MotionSensor(config["pin"])
+        self.player = VlcPlayer(config["vlc_args"])
+        self.inputs = SettingsInputs(name)
+        self.control = ControlChannel(None, channel=name)
+        prefix = "" if name == MAIN_CHANNEL else f"[{name}] "
+        self.controller = PlaybackController(
+            RealClock(self.control), self.player, self.sensor, settings=self.inputs,
+            pause_video=Path(config["pause_video"]),
+            # trigger_stats.json describes the main channel
+            on_trigger_stats=write_trigger_stats if name == MAIN_CHANNEL else None,
+            log=lambda message: log(prefix + message),
+            on_event=lambda kind, **fields: analytics.record(kind, channel=name, **fields))
+        self.cpu = CHANNEL_CPU.labels(channel=name)
+        self.thread = None
+
+    def start(self, fallback_video):
+        media_path = self.inputs.selected_video()
+        if not media_path:
+            media_path = fallback_video
+            log(f"[{self.name}] Falling back to {media_path}")
+        self.thread = threading.Thread(target=self._run, args=(media_path,), name=f"channel-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self, media_path):
+        try:
+            self.controller.run(media_path)
+        except Exception:
+            log(f"[CRASH] Channel {self.name}:")
+            log(traceback.format_exc())
+            analytics.record("crash", detail=traceback.format_exc(limit=-1).strip(), channel=self.name)
+        finally:
+            channel_stopped.set()
+
+    def sample_cpu(self):
+        try:
+            self.cpu.set(round(time.clock_gettime(time.pthread_getcpuclockid(self.thread.ident)), 6))
+        except (AttributeError, OSError, TypeError):
+            pass
+
+    def stop(self):
+        try:
+            self.player.stop()
+        except Exception:
+            pass
+
+def channel_configs(settings):
+    configs = [(MAIN_CHANNEL, {**MAIN_CHANNEL_DEFAULTS, **settings.get("main_channel", {})})]
+    for name in channel_names(settings)[1:]:
+        config = {**CHANNEL_DEFAULTS, **channel_view(settings, name)}
+        if config.get("pin") is None:
+            log(f"[{name}] No PIR pin configured, channel skipped")
+            continue
+        configs.append((name, config))
+    return configs
+
+def sample_channel_cpu():
+    for channel in channels:
+        channel.sample_cpu()
 
 def on_exit():
-    try:
-        player.stop()
-    except Exception:
-        pass
+    for channel in channels:
+        channel.stop()
+    control.close()
+    exporter.stop()
+    # The last play_end and crash events, before the interpreter stops the writer thread
+    analytics.RECORDER.flush()
+    log(f"[EXIT] Settings cache counters: {SETTINGS.counters()}")
     log("[EXIT] Script is exiting.")
 
 atexit.register(on_exit)
 
-# Helper: load and pause a media file
-def load_and_pause(media_path):
-    media = vlc.Media(media_path)
-    player.set_media(media)
-    player.play()
-    sleep(0.5)
-    player.set_pause(1)
-    player.set_time(0)
-
-# Helper: play video endlessly until paused
-def play_endless():
-    global last_played_path
-    log("Triggered mode OFF — playing video endlessly.")
-
-    while True:
-        # Hole das aktuell gewünschte Video aus den Settings
-        media_path = get_selected_video()
-        
-        # Wenn das Setting anders als das zuletzt gespielte Video ist, logge für den nächsten Durchlauf
-        if media_path != last_played_path:
-            log(f"Videoänderung erkannt (Settings -> {Path(media_path).name}). Wechsle nach aktuellem Video.")
-
-        # Das aktuelle Video abspielen
-        media = vlc.Media(last_played_path)
-        player.set_media(media)
-        player.play()
-        sleep(0.5)  # Startzeit
-
-        # Warten, bis Video endet, Pause gedrückt wird oder Schedule off
-        while player.get_state() not in (vlc.State.Ended, vlc.State.Stopped):
-            if read_pause_flag() or not is_schedule_enabled_now():
-                log("Pause detected mid-playback. Stopping video.")
-                player.stop()
-                return
-            if get_triggered_flag():
-                log("Triggered flag changed to ON during endless loop. Switching mode.")
-                player.stop()
-                return
-            sleep(0.1)
-
-        log("Video beendet. Prüfe auf neues Video für nächsten Durchlauf.")
-
-        # Nach Video-Ende: Aktualisiere last_played_path
-        last_played_path = get_selected_video()
-        sleep(0.5)
-
-# Helper: play video once with motion trigger and delay after
-def play_triggered(delay_seconds):
-    log("Waiting for motion...")
-    pir.wait_for_motion()
-    log("Motion detected! Playing video")
-
-    media_path = get_selected_video()
-    if media_path:
-        media = vlc.Media(media_path)
-        player.set_media(media)
-        player.play()
-        sleep(0.5)
-
-        # Play until video ends or paused mid-playback
-        while player.get_state() not in (vlc.State.Ended, vlc.State.Stopped):
-            if read_pause_flag() or not is_schedule_enabled_now():
-                log("Pause detected mid-playback. Stopping video.")
-                player.stop()
-                break
-            if not get_triggered_flag():
-               log("Triggered flag turned OFF during playback. Stopping video.")
-               player.stop()
-               break
-            
-            sleep(0.1)
-
-        log("Video ended or paused. Waiting delay before next motion...")
-        player.pause()
-        player.set_time(0)
-
-        # Delay before next motion detection
-        if delay_seconds > 0:
-            log(f"Waiting {delay_seconds} seconds before listening for motion again.")
-            sleep(delay_seconds)
-
 def main():
-    global player, pir
-
     log("SYSTEM HAS STARTED")
 
     if not VIDEO_FOLDER.exists():
         print(f"Folder {VIDEO_FOLDER} not found")
         sys.exit(1)
 
-    video_files = sorted(VIDEO_FOLDER.glob("*.mp4"))
+    # Read-only view of the index the web UI maintains
+    video_files = VideoLibrary(VIDEO_FOLDER, writable=False).paths()
     if not video_files:
         print("No videos found!")
         sys.exit(1)
 
     log(f"Found {len(video_files)} video(s)")
 
-    # Initialize PIR sensor
-    pir = MotionSensor(4)
-
-    # Start playlist updater thread
+    # Start playlist updater thread, woken by every control event
+    control.add_listener(wake_playlist_updater)
     update_playlist_timestamp_on_startup()
     global playlist_thread
     playlist_thread = threading.Thread(target=playlist_updater, daemon=True)
     playlist_thread.start()
     log("Started playlist updater thread")
 
-    # Start with selected or fallback video
-    media_path = get_selected_video()
-    if not media_path:
-        media_path = str(video_files[0])
-        log(f"Falling back to {media_path}")
-        
-    global last_played_path    
-    last_played_path = media_path      # Neue Variable für Vergleich
-
-    # VLC setup using proper instance
-    instance = vlc.Instance()
-    player = instance.media_player_new()
-    pause_media = instance.media_new(str(PAUSE_VIDEO))
-
-    # Preload pause video
-    paused_mode = False
-    load_and_pause(media_path)
-    log(f"Loaded video {Path(media_path).name} in paused state")
+    # One display, PIR sensor and playback thread per channel, sharing the
+    # settings cache, the control socket, the playlist updater and the exporter
+    for name, config in channel_configs(get_settings_snapshot()):
+        channel = Channel(name, config)
+        control.add_listener(channel.control.notify)
+        channels.append(channel)
+    log(f"Channels: {', '.join(channel.name for channel in channels)}")
 
-    try:
-        while True:
-            pause_flag = read_pause_flag()
-            triggered_flag = get_triggered_flag()
-            delay_seconds = get_trigger_delay_seconds()
-            schedule_enabled = is_schedule_enabled_now()
-            
-
-            # Handle pause ON
-            if (pause_flag or not schedule_enabled)and not paused_mode:
-                log("Pause flag detected ON. Switching to pause screen.")
-                if player.is_playing():
-                    player.stop()
-                player.set_media(pause_media)
-                player.play()
-                sleep(0.5)
-                player.set_pause(1)
-                player.set_time(0)
-                log(f"[PAUSED] Loaded pause screen: {PAUSE_VIDEO.name}")
-                paused_mode = True
-
-            # Handle pause OFF
-            elif (not pause_flag and schedule_enabled) and paused_mode:
-                log("[UNPAUSED] Pause flag cleared, returning to playback mode")
-                if player.is_playing():
-                    player.stop()
-                new_path = get_selected_video()
-                if new_path and new_path != media_path:
-                    media_path = new_path
-                    log(f"Updated video selection to {Path(media_path).name}")
-                load_and_pause(media_path)
-                last_played_path = get_selected_video()
-                paused_mode = False
-
-            
-
-            # Playback if not paused
-            if not paused_mode:
-                if not triggered_flag:
-                    play_endless()
-                else:
-                    play_triggered(delay_seconds)
-            else:
-                sleep(1)  # When paused, just wait
+    exporter.before_export.append(sample_channel_cpu)
+    control.start()
+    exporter.start()
+    for channel in channels:
+        channel.start(str(video_files[0]))
 
+    try:
+        channel_stopped.wait()
     except KeyboardInterrupt:
         log("Exiting")
-        player.stop()
+        for channel in channels:
+            channel.stop()
+        control.close()
         stop_playlist_thread.set()
+        wake_playlist_updater()
         playlist_thread.join()
         sys.exit(0)
+    # Playback threads only return by crashing; exit so systemd restarts every channel
+    raise RuntimeError("A playback channel stopped")
 
 if __name__ == "__main__":
     try:
         main()
     except Exception as e:
-        import traceback
         log("[CRASH] Uncaught exception:")
         log(traceback.format_exc())
+        analytics.record("crash", detail=traceback.format_exc(limit=-1).strip())
         raise
@@ -0,0 +1,276 @@
+# analytics.py
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+from shared import metrics
+
+# Structured playback history in ~/analytics.db (SQLite). The player records
+# trigger, play start/end, pause/resume, rotation and crash events into an
+# in-memory queue; a background thread writes them every few seconds, or as
+# soon as a batch is full, in one transaction, so the SD card sees one fsync
+# per batch rather than one per event. The same transaction adds each batch
+# to two rollups (count and value sum): per kind, channel and hour, and per
+# kind, channel, video and day. The aggregate queries of the web UI only read
+# those, so their cost follows the length of the range and the number of
+# videos, not the number of raw events.
+# Raw events are kept for ANALYTICS_RETENTION_DAYS for the recent events list.
+HOME = Path(os.path.expanduser("~"))
+ANALYTICS_DB = HOME / "analytics.db"
+ANALYTICS_FLUSH_SECONDS = 10
+ANALYTICS_BATCH_SIZE = 500
+ANALYTICS_QUEUE_SIZE = 20000
+ANALYTICS_RETENTION_DAYS = 365
+ANALYTICS_PAGE_LIMIT = 1000
+# trigger: value = PIR -> Playing seconds; play_end: value = seconds watched,
+# detail = completed/interrupted; rotation: detail = playlist mode
+EVENT_KINDS = ("trigger", "play_start", "play_end", "pause", "resume", "rotation", "crash")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    video TEXT,
+    value REAL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_kind ON events (kind);
+CREATE TABLE IF NOT EXISTS hourly (
+    kind TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_count INTEGER NOT NULL,
+    PRIMARY KEY (kind, hour, channel)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS daily_videos (
+    kind TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    video TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    value_sum REAL NOT NULL,
+    value_count INTEGER NOT NULL,
+    PRIMARY KEY (kind, day, channel, video)
+) WITHOUT ROWID;
+"""
+
+ANALYTICS_EVENTS = metrics.counter("analytics_events_total", "Playback events by outcome", ["result"])
+ANALYTICS_WRITE_SECONDS = metrics.histogram("analytics_write_seconds", "Time to write one batch of events")
+
+class EventRecorder:
+    def __init__(self, path=ANALYTICS_DB, flush_interval=ANALYTICS_FLUSH_SECONDS,
+                 batch_size=ANALYTICS_BATCH_SIZE, queue_size=ANALYTICS_QUEUE_SIZE,
+                 retention_days=ANALYTICS_RETENTION_DAYS, on_error=None):
+        self.path = Path(path)
+        # Called with a message when a batch cannot be written
+        self.on_error = on_error
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+        self._last_prune_day = None
+        self.dropped = 0
+
+    def record(self, kind, video=None, value=None, detail=None, channel=None):
+        # Cheap enough for VLC and GPIO callbacks: a tuple on a queue
+        if self._thread is None:
+            self._start()
+        event = (time.time(), kind, channel or "main", os.path.basename(str(video)) if video else None, value, detail)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            ANALYTICS_EVENTS.labels(result="dropped").inc()
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            # WAL lets the web UI read while we write; NORMAL syncs once per checkpoint instead of per commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def flush(self):
+        with self._write_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                with ANALYTICS_WRITE_SECONDS.time():
+                    self._write_batch(batch)
+                ANALYTICS_EVENTS.labels(result="written").inc(len(batch))
+            except sqlite3.Error as e:
+                ANALYTICS_EVENTS.labels(result="failed").inc(len(batch))
+                self._conn = None
+                if self.on_error:
+                    self.on_error(f"[Analytics] Failed to write {len(batch)} event(s) to {self.path}: {e}")
+
+    @staticmethod
+    def _add(rollup, key, value):
+        count, value_sum, value_count = rollup.get(key, (0, 0.0, 0))
+        if value is not None:
+            value_sum += value
+            value_count += 1
+        rollup[key] = (count + 1, value_sum, value_count)
+
+    def _write_batch(self, batch):
+        # Sum the batch per rollup row first: one upsert per row, not per event
+        hourly = {}
+        daily_videos = {}
+        for ts, kind, channel, video, value, _ in batch:
+            self._add(hourly, (kind, int(ts // 3600), channel), value)
+            if video:
+                self._add(daily_videos, (kind, int(ts // 86400), channel, video), value)
+
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT INTO events (ts, kind, channel, video, value, detail) VALUES (?, ?, ?, ?, ?, ?)", batch)
+            conn.executemany(
+                "INSERT INTO hourly (kind, hour, channel, count, value_sum, value_count) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, hour, channel) DO UPDATE SET count = count + excluded.count, "
+                "value_sum = value_sum + excluded.value_sum, value_count = value_count + excluded.value_count",
+                [key + values for key, values in hourly.items()])
+            conn.executemany(
+                "INSERT INTO daily_videos (kind, day, channel, video, count, value_sum, value_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (kind, day, channel, video) DO UPDATE SET count = count + excluded.count, "
+                "value_sum = value_sum + excluded.value_sum, value_count = value_count + excluded.value_count",
+                [key + values for key, values in daily_videos.items()])
+            self._prune(conn)
+
+    def _prune(self, conn):
+        # Raw events only; the rollups keep the totals
+        today = datetime.now().date()
+        if self._last_prune_day == today:
+            return
+        self._last_prune_day = today
+        conn.execute("DELETE FROM events WHERE ts < ?", (time.time() - self.retention_days * 86400,))
+
+RECORDER = EventRecorder()
+record = RECORDER.record
+
+class AnalyticsQueries:
+    # Read side for the web UI; every query but recent() reads the rollups
+    def __init__(self, path=ANALYTICS_DB):
+        self.path = Path(path)
+
+    def _query(self, sql, params=()):
+        # No database yet (the player has not recorded anything) reads as no rows
+        if not self.path.exists():
+            return []
+        try:
+            with closing(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)) as conn:
+                return conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            return []
+
+    @staticmethod
+    def _range(column, size, since, until, channel):
+        where = f"{column} >= ? AND {column} < ?"
+        params = [int(since // size), int(until // size) + 1]
+        if channel:
+            where += " AND channel = ?"
+            params.append(channel)
+        return where, params
+
+    def totals(self, since, until, channel=None):
+        where, params = self._range("hour", 3600, since, until, channel)
+        rows = self._query(
+            f"SELECT kind, SUM(count), SUM(value_sum), SUM(value_count) FROM hourly "
+            f"WHERE kind IN ({','.join('?' * len(EVENT_KINDS))}) AND {where} GROUP BY kind",
+            list(EVENT_KINDS) + params)
+        result = {kind: {"count": 0, "average": None} for kind in EVENT_KINDS}
+        for kind, count, value_sum, value_count in rows:
+            result[kind] = {"count": count, "average": round(value_sum / value_count, 3) if value_count else None}
+        return result
+
+    def per_hour(self, kind, since, until, channel=None):
+        # [{"hour": unix time of the hour start, "count": n}], oldest first, hours without events left out
+        where, params = self._range("hour", 3600, since, until, channel)
+        rows = self._query(f"SELECT hour, SUM(count) FROM hourly WHERE kind = ? AND {where} GROUP BY hour ORDER BY hour",
+                           [kind] + params)
+        return [{"hour": hour * 3600, "count": count} for hour, count in rows]
+
+    def by_hour_of_day(self, kind, since, until, channel=None):
+        # 24 counts by local hour of day, DST included
+        counts = [0] * 24
+        for row in self.per_hour(kind, since, until, channel):
+            counts[datetime.fromtimestamp(row["hour"]).hour] += row["count"]
+        return counts
+
+    def videos(self, since, until, channel=None, limit=20):
+        # Most started videos first, with their average watch time from play_end; whole UTC days
+        limit = max(1, min(limit, ANALYTICS_PAGE_LIMIT))
+        where, params = self._range("day", 86400, since, until, channel)
+        starts = self._query(
+            f"SELECT video, SUM(count) FROM daily_videos WHERE kind = ? AND {where} "
+            "GROUP BY video ORDER BY SUM(count) DESC LIMIT ?", ["play_start"] + params + [limit])
+        if not starts:
+            return []
+        names = [video for video, _ in starts]
+        watched = {video: (value_sum, value_count) for video, value_sum, value_count in self._query(
+            f"SELECT video, SUM(value_sum), SUM(value_count) FROM daily_videos WHERE kind = ? AND {where} "
+            f"AND video IN ({','.join('?' * len(names))}) GROUP BY video", ["play_end"] + params + names)}
+        result = []
+        for video, plays in starts:
+            value_sum, value_count = watched.get(video, (0, 0))
+            result.append({"video": video, "plays": plays,
+                           "average_watch_seconds": round(value_sum / value_count, 1) if value_count else None,
+                           "total_watch_seconds": round(value_sum or 0, 1)})
+        return result
+
+    def recent(self, limit=100, before=None, kind=None):
+        # Newest first; page back with before=<smallest id seen>
+        # SQLite reads a negative LIMIT as "no limit", so clamp from below too
+        limit = max(1, min(limit, ANALYTICS_PAGE_LIMIT))
+        where, params = [], []
+        if before is not None:
+            where.append("id < ?")
+            params.append(before)
+        if kind:
+            where.append("kind = ?")
+            params.append(kind)
+        sql = "SELECT id, ts, kind, channel, video, value, detail FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self._query(sql + " ORDER BY id DESC LIMIT ?", params + [limit])
+        return [dict(zip(("id", "ts", "kind", "channel", "video", "value", "detail"), row)) for row in rows]
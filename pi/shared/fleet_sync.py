@@ -0,0 +1,342 @@
+# fleet_sync.py
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from shared import metrics
+from shared.vlc_helper import VIDEO_FOLDER, log, get_settings_snapshot, settings_transaction
+from shared.video_library import VIDEO_EXTENSIONS, hash_file
+from shared.uploads import free_disk_bytes, UPLOAD_FREE_SPACE_MARGIN, UPLOAD_STALE_SECONDS
+
+# Fleet sync: a portrait pulls the videos and playback settings of another one
+# (a peer, or a controller Pi holding the master copy). Each side publishes a
+# manifest of content hashes; only videos whose hash differs are downloaded,
+# through the peer's ordinary /videos/<name> route with Range requests. Partial
+# downloads live in ~/videos/.fleet/<sha256>.part, so an interrupted pull, even
+# across a restart, continues where it stopped. Every file is verified and
+# renamed into ~/videos on its own; settings are applied in one transaction
+# only once all the videos they reference are in place, and videos the peer no
+# longer has are deleted only after that.
+FLEET_FOLDER = VIDEO_FOLDER / ".fleet"
+# Playback keys copied between portraits; hardware, server and sync settings stay per device
+FLEET_SETTINGS_KEYS = ("selected_video", "pause_flag", "playlist", "days", "motion")
+FLEET_TOKEN_HEADER = "X-Fleet-Token"
+FLEET_BLOCK_SIZE = 64 * 1024
+FLEET_HTTP_TIMEOUT = 30
+
+# Overridable per key under "fleet" in settings.json
+DEFAULT_FLEET_SETTINGS = {
+    # Shared secret for the /api/fleet routes; empty leaves them open like the rest of the UI
+    "token": "",
+    # Download limit per pull in KiB/s, 0 for unlimited
+    "bandwidth_kbps": 0,
+    # Delete local videos the peer does not have
+    "delete_missing": False,
+    # Attempts per file before the pull gives up; each one resumes from the bytes on disk
+    "retries": 5
+}
+
+FLEET_BYTES = metrics.counter("fleet_sync_bytes_total", "Video bytes downloaded by fleet sync")
+FLEET_FILES = metrics.counter("fleet_sync_files_total", "Videos handled by fleet sync", ["result"])
+FLEET_PULL_SECONDS = metrics.histogram("fleet_sync_pull_seconds", "Duration of a fleet sync pull",
+                                       buckets=(1, 5, 15, 60, 300, 900, 3600))
+
+class FleetSyncError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def get_fleet_settings():
+    config = dict(DEFAULT_FLEET_SETTINGS)
+    config.update(get_settings_snapshot().get("fleet", {}))
+    # At least one attempt, or a pull would never download anything
+    try:
+        config["retries"] = max(1, int(config["retries"]))
+    except (TypeError, ValueError):
+        config["retries"] = DEFAULT_FLEET_SETTINGS["retries"]
+    return config
+
+def fleet_settings_subset(settings):
+    return {key: settings[key] for key in FLEET_SETTINGS_KEYS if key in settings}
+
+def settings_digest(settings):
+    # Canonical JSON, so key order and whitespace in settings.json do not count as changes
+    subset = fleet_settings_subset(settings)
+    return hashlib.sha256(json.dumps(subset, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def is_video_name(name):
+    return isinstance(name, str) and os.path.basename(name) == name and name.lower().endswith(VIDEO_EXTENSIONS)
+
+def build_manifest(entries, settings):
+    # entries: VideoLibrary.entries(); videos still being hashed are listed as pending
+    videos = {}
+    pending = []
+    for name, entry in sorted(entries.items()):
+        if entry.get("sha256"):
+            videos[name] = {"size": entry["size"], "sha256": entry["sha256"]}
+        else:
+            pending.append(name)
+    return {"videos": videos, "pending": pending, "settings": settings_digest(settings)}
+
+def manifest_etag(manifest):
+    body = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+class RateLimiter:
+    # Token bucket over bytes; rate 0 means unlimited
+    def __init__(self, bytes_per_second, burst_seconds=0.5):
+        self.rate = bytes_per_second
+        self.burst = max(FLEET_BLOCK_SIZE, bytes_per_second * burst_seconds)
+        # Start empty so short transfers are held to the rate too
+        self._allowance = 0
+        self._last = time.monotonic()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._allowance = min(self.burst, self._allowance + (now - self._last) * self.rate)
+        self._last = now
+        self._allowance -= amount
+        if self._allowance < 0:
+            time.sleep(-self._allowance / self.rate)
+
+class FleetSync:
+    # Runs in the web UI; one pull at a time, in a background thread
+    def __init__(self, video_folder=VIDEO_FOLDER, fleet_folder=FLEET_FOLDER, on_changed=None, store=None):
+        self.video_folder = Path(video_folder)
+        self.fleet_folder = Path(fleet_folder)
+        self.fleet_folder.mkdir(parents=True, exist_ok=True)
+        # Called after videos were added, replaced or deleted
+        self.on_changed = on_changed
+        # VideoStore: content we already hold under another name is linked, not downloaded
+        self.store = store
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {"state": "idle"}
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def start(self, source, entries, bandwidth_kbps=None, delete_missing=None):
+        # entries: the local VideoLibrary.entries(), to skip videos we already have
+        parsed = urllib.parse.urlparse(source or "")
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise FleetSyncError("source must be an http(s) URL of another portrait")
+        config = get_fleet_settings()
+        if bandwidth_kbps is None:
+            bandwidth_kbps = config["bandwidth_kbps"]
+        if delete_missing is None:
+            delete_missing = config["delete_missing"]
+        try:
+            bandwidth_kbps = max(0, int(bandwidth_kbps))
+        except (TypeError, ValueError):
+            raise FleetSyncError("Invalid bandwidth_kbps")
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise FleetSyncError("A sync is already running", 409)
+            self._status = {"state": "running", "source": source.rstrip("/"), "started": time.time(),
+                            "bandwidth_kbps": bandwidth_kbps, "files_total": 0, "files_done": 0,
+                            "bytes_total": 0, "bytes_done": 0, "current": None}
+            self._thread = threading.Thread(target=self._run, daemon=True, args=(
+                source.rstrip("/"), entries, bandwidth_kbps, bool(delete_missing), config))
+            self._thread.start()
+        return self.status()
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.status()
+
+    def _run(self, source, entries, bandwidth_kbps, delete_missing, config):
+        started = time.monotonic()
+        try:
+            with FLEET_PULL_SECONDS.time():
+                result = self._pull(source, entries, RateLimiter(bandwidth_kbps * 1024), delete_missing, config)
+            self._update(state="done", finished=time.time(), current=None, **result)
+            log(f"[Fleet] Synced from {source} in {time.monotonic() - started:.1f}s: "
+                f"{len(result['downloaded'])} downloaded, {len(result['deleted'])} deleted, "
+                f"settings {'updated' if result['settings_updated'] else 'unchanged'}")
+        except Exception as e:
+            # Anything a bad peer can cause (a non-dict manifest, a broken status line, ...):
+            # the thread ends here, so the state must not stay "running"
+            self._update(state="failed", finished=time.time(), error=str(e) or type(e).__name__)
+            log(f"[Fleet] Sync from {source} failed: {e}")
+
+    def _request(self, url, config, headers=None):
+        headers = dict(headers or {})
+        if config["token"]:
+            headers[FLEET_TOKEN_HEADER] = config["token"]
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=FLEET_HTTP_TIMEOUT)
+
+    def _get_json(self, url, config):
+        try:
+            with self._request(url, config) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            raise FleetSyncError(f"{url} returned {e.code}", 502)
+        except urllib.error.URLError as e:
+            raise FleetSyncError(f"{url} unreachable: {e.reason}", 502)
+
+    def _local_hash(self, name, entry, size):
+        # Library hashes arrive in the background; hash an unindexed candidate here instead of downloading it
+        if entry and entry.get("sha256"):
+            return entry["sha256"]
+        path = self.video_folder / name
+        try:
+            if path.stat().st_size != size:
+                return None
+            return hash_file(path)
+        except OSError:
+            return None
+
+    def _pull(self, source, entries, limiter, delete_missing, config):
+        manifest = self._get_json(f"{source}/api/fleet/manifest", config)
+        remote = {name: info for name, info in manifest.get("videos", {}).items() if is_video_name(name)}
+
+        missing = [name for name, info in sorted(remote.items())
+                   if self._local_hash(name, entries.get(name), info["size"]) != info["sha256"]]
+        FLEET_FILES.labels(result="unchanged").inc(len(remote) - len(missing))
+        bytes_total = sum(remote[name]["size"] for name in missing)
+        self._update(files_total=len(missing), bytes_total=bytes_total, pending_remote=manifest.get("pending", []))
+
+        # Parts already on disk only need their remaining bytes, stored content none
+        needed = sum(remote[name]["size"] - self._part_size(remote[name]["sha256"]) for name in missing
+                     if not (self.store and self.store.has(remote[name]["sha256"])))
+        free = free_disk_bytes(self.video_folder)
+        if free < needed + UPLOAD_FREE_SPACE_MARGIN:
+            raise FleetSyncError(f"Not enough disk space: {free // (1024 * 1024)} MB free, "
+                                 f"{(needed + UPLOAD_FREE_SPACE_MARGIN) // (1024 * 1024)} MB needed", 507)
+
+        downloaded = []
+        for name in missing:
+            self._update(current=name)
+            self._download(source, name, remote[name], limiter, config)
+            downloaded.append(name)
+            self._update(files_done=len(downloaded))
+        if downloaded and self.on_changed:
+            self.on_changed()
+
+        # The videos the peer's settings refer to are all here now
+        settings_updated = False
+        if manifest.get("settings") != settings_digest(get_settings_snapshot()):
+            remote_settings = self._get_json(f"{source}/api/fleet/settings", config)
+            with settings_transaction() as settings:
+                for key in FLEET_SETTINGS_KEYS:
+                    if key in remote_settings:
+                        settings[key] = copy.deepcopy(remote_settings[key])
+                    else:
+                        settings.pop(key, None)
+            settings_updated = True
+
+        deleted = []
+        if delete_missing:
+            keep = set(remote) | set(manifest.get("pending", []))
+            for name in sorted(set(entries) - keep):
+                try:
+                    (self.video_folder / name).unlink()
+                    deleted.append(name)
+                except FileNotFoundError:
+                    pass
+            FLEET_FILES.labels(result="deleted").inc(len(deleted))
+            if deleted and self.on_changed:
+                self.on_changed()
+
+        self.cleanup_parts(keep={info["sha256"] for info in remote.values()})
+        return {"downloaded": downloaded, "deleted": deleted, "settings_updated": settings_updated}
+
+    def _part_path(self, sha256):
+        if not all(c in "0123456789abcdef" for c in sha256) or len(sha256) != 64:
+            raise FleetSyncError(f"Invalid content hash {sha256!r}", 502)
+        return self.fleet_folder / f"{sha256}.part"
+
+    def _part_size(self, sha256):
+        try:
+            return self._part_path(sha256).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _download(self, source, name, info, limiter, config):
+        part_path = self._part_path(info["sha256"])
+        if self.store and self.store.link(info["sha256"], self.video_folder / name):
+            FLEET_FILES.labels(result="linked").inc()
+            log(f"[Fleet] {name} is already stored under another name, linked it")
+            return
+        url = f"{source}/videos/{urllib.parse.quote(name)}"
+        if info["size"] == 0:
+            # Nothing to fetch, but the empty file still gets hashed and moved into place
+            part_path.touch()
+        for attempt in range(1, config["retries"] + 1):
+            offset = self._part_size(info["sha256"])
+            try:
+                if offset < info["size"]:
+                    self._fetch_range(url, part_path, offset, info["size"], limiter, config)
+                break
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    raise FleetSyncError(f"Download of {name} failed: {url} returned {e.code}", 502)
+                error = e
+            except (urllib.error.URLError, OSError) as e:
+                error = e
+            FLEET_FILES.labels(result="retried").inc()
+            log(f"[Fleet] {name}: attempt {attempt} stopped at {self._part_size(info['sha256'])}/{info['size']} bytes: {error}")
+            if attempt == config["retries"]:
+                raise FleetSyncError(f"Download of {name} failed after {attempt} attempts: {error}", 502)
+            time.sleep(min(30, 2 ** attempt))
+
+        if hash_file(part_path) != info["sha256"]:
+            part_path.unlink()
+            FLEET_FILES.labels(result="corrupt").inc()
+            raise FleetSyncError(f"{name} does not match its manifest hash, discarded", 502)
+        with open(part_path, 'rb') as f:
+            os.fsync(f.fileno())
+        # Same filesystem as ~/videos: the player sees the old file or the new one, never a partial one
+        os.replace(part_path, self.video_folder / name)
+        FLEET_FILES.labels(result="downloaded").inc()
+        log(f"[Fleet] Received {name} ({info['size']} bytes)")
+
+    def _fetch_range(self, url, part_path, offset, size, limiter, config):
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self._request(url, config, headers) as response:
+            if offset and response.status != 206:
+                # The peer ignored the range; start over
+                offset = 0
+            elif offset and not response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                raise OSError(f"unexpected Content-Range {response.headers.get('Content-Range')!r}")
+            with open(part_path, 'r+b' if offset else 'wb') as f:
+                f.seek(offset)
+                f.truncate()
+                while offset < size:
+                    data = response.read(min(FLEET_BLOCK_SIZE, size - offset))
+                    if not data:
+                        raise OSError("connection closed early")
+                    f.write(data)
+                    offset += len(data)
+                    FLEET_BYTES.inc(len(data))
+                    self._update(bytes_done=self._status.get("bytes_done", 0) + len(data))
+                    limiter.consume(len(data))
+
+    def cleanup_parts(self, keep=None, max_age=UPLOAD_STALE_SECONDS):
+        # Parts abandoned for longer than an upload may be, and with keep (content
+        # hashes) also those of videos the peer no longer has
+        cutoff = time.time() - max_age
+        for part_path in self.fleet_folder.glob("*.part"):
+            try:
+                if (keep is not None and part_path.stem not in keep) or part_path.stat().st_mtime < cutoff:
+                    part_path.unlink()
+            except OSError:
+                continue
@@ -0,0 +1,207 @@
+# log_index.py
+import gzip
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from shared.vlc_helper import HOME, LOG_FOLDER, log
+
+# Catalog of ~/logs for the dashboard and a full-text index for searching
+# across days. The catalog only rescans the folder when its mtime changes
+# (new day, deleted or compressed log); otherwise it re-stats the newest files,
+# which are the only ones still being appended to. The search index is an
+# SQLite FTS5 table filled incrementally: each day remembers how many bytes
+# have been indexed, so a refresh only reads what was appended since, and a
+# day that gets gzipped after a week is not indexed a second time.
+LOG_INDEX_FILE = HOME / "log_index.db"
+LOG_SUFFIXES = (".txt", ".txt.gz")
+LOG_ACTIVE_FILES = 2
+LOG_SEARCH_LIMIT = 100
+LOG_INDEX_BATCH_LINES = 5000
+
+def log_day(name):
+    # "2026-10-17.txt" and "2026-10-17.txt.gz" are the same day
+    for suffix in LOG_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+class LogCatalog:
+    def __init__(self, folder=LOG_FOLDER):
+        self.folder = Path(folder)
+        self._lock = threading.Lock()
+        self._folder_mtime = None
+        self._files = []
+
+    def refresh(self):
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            folder_mtime = None
+
+        with self._lock:
+            if folder_mtime != self._folder_mtime:
+                files = []
+                if folder_mtime is not None:
+                    with os.scandir(self.folder) as it:
+                        for entry in it:
+                            if log_day(entry.name) is None or not entry.is_file():
+                                continue
+                            st = entry.stat()
+                            files.append({"name": entry.name, "size": st.st_size, "mtime": st.st_mtime})
+                self._folder_mtime = folder_mtime
+            else:
+                files = self._files
+                for item in files[:LOG_ACTIVE_FILES]:
+                    try:
+                        st = os.stat(self.folder / item["name"])
+                    except FileNotFoundError:
+                        continue
+                    item["size"], item["mtime"] = st.st_size, st.st_mtime
+            files.sort(key=lambda item: item["mtime"], reverse=True)
+            self._files = files
+
+    def files(self, suffix=None):
+        # Newest first; copies, so callers may add display fields
+        self.refresh()
+        with self._lock:
+            return [dict(item) for item in self._files if suffix is None or item["name"].endswith(suffix)]
+
+    def days(self):
+        # One entry per day, newest first; while both exist (mid-compression) the plain file wins
+        files = sorted(self.files(), key=lambda item: not item["name"].endswith(".gz"))
+        by_day = {log_day(item["name"]): item for item in files}
+        return sorted(by_day.values(), key=lambda item: item["mtime"], reverse=True)
+
+def _fts_query(text):
+    # Every word becomes a quoted term, so user input can't trip the FTS5 syntax
+    terms = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+class LogSearchIndex:
+    def __init__(self, catalog, db_file=LOG_INDEX_FILE):
+        self.catalog = catalog
+        self.db_file = Path(db_file)
+        self._lock = threading.Lock()
+        self._db = None
+        self.available = True
+        try:
+            self._db = self._open()
+        except sqlite3.Error as e:
+            # Older SQLite builds without FTS5: the dashboard works, search doesn't
+            self.available = False
+            log(f"[LogIndex] Search disabled: {e}")
+
+    def _open(self):
+        db = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""CREATE TABLE IF NOT EXISTS days (
+            day TEXT PRIMARY KEY, source TEXT, size INTEGER, mtime REAL, indexed_bytes INTEGER)""")
+        db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(text, day UNINDEXED, offset UNINDEXED)")
+        db.commit()
+        return db
+
+    def update(self, blocking=True):
+        # Returns the number of newly indexed lines, or None when another update is running
+        if not self.available:
+            return 0
+        if not self._lock.acquire(blocking=blocking):
+            return None
+        try:
+            return self._update()
+        finally:
+            self._lock.release()
+
+    def _update(self):
+        known = {row[0]: row[1:] for row in self._db.execute(
+            "SELECT day, source, size, mtime, indexed_bytes FROM days")}
+        present = set()
+        added = 0
+        # Oldest first, so rowids (and search results) follow time order
+        for item in reversed(self.catalog.files()):
+            day = log_day(item["name"])
+            # While both exist (mid-compression), the plain file is authoritative
+            if day in present:
+                continue
+            present.add(day)
+            source, size, mtime, indexed_bytes = known.get(day, (None, None, None, 0))
+            if (source, size, mtime) == (item["name"], item["size"], item["mtime"]):
+                continue
+            if source != item["name"] and item["name"].endswith(".gz") and size is not None \
+                    and not source.endswith(".gz") and indexed_bytes >= size:
+                # The day was fully indexed before it was gzipped; just note the new source
+                self._set_day(day, item, indexed_bytes)
+                continue
+            if not item["name"].endswith(".gz") and item["size"] < indexed_bytes:
+                # Truncated or replaced: index the day again from the top
+                self._db.execute("DELETE FROM lines WHERE day = ?", (day,))
+                indexed_bytes = 0
+            added += self._index_file(day, item, indexed_bytes)
+
+        for day in set(known) - present:
+            self._db.execute("DELETE FROM lines WHERE day = ?", (day,))
+            self._db.execute("DELETE FROM days WHERE day = ?", (day,))
+        self._db.commit()
+        return added
+
+    def _set_day(self, day, item, indexed_bytes):
+        self._db.execute("INSERT OR REPLACE INTO days (day, source, size, mtime, indexed_bytes) VALUES (?, ?, ?, ?, ?)",
+                         (day, item["name"], item["size"], item["mtime"], indexed_bytes))
+
+    def _index_file(self, day, item, offset):
+        path = self.catalog.folder / item["name"]
+        opener = gzip.open if item["name"].endswith(".gz") else open
+        added = 0
+        try:
+            with opener(path, 'rb') as f:
+                # Plain files seek; gzip streams decompress up to the offset
+                f.seek(offset)
+                batch = []
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        # Still being written; picked up by the next update
+                        break
+                    batch.append((raw.decode('utf-8', errors='replace').rstrip("\n"), day, offset))
+                    offset += len(raw)
+                    if len(batch) >= LOG_INDEX_BATCH_LINES:
+                        self._db.executemany("INSERT INTO lines (text, day, offset) VALUES (?, ?, ?)", batch)
+                        added += len(batch)
+                        batch = []
+                if batch:
+                    self._db.executemany("INSERT INTO lines (text, day, offset) VALUES (?, ?, ?)", batch)
+                    added += len(batch)
+        except (OSError, EOFError) as e:
+            # Drop the partial batch so the next update retries from the recorded offset
+            self._db.rollback()
+            log(f"[LogIndex] Failed to index {item['name']}: {e}")
+            return 0
+        self._set_day(day, item, offset)
+        self._db.commit()
+        return added
+
+    def search(self, text, limit=LOG_SEARCH_LIMIT):
+        # Newest matches first; only lines indexed so far are searched
+        query = _fts_query(text)
+        if not self.available or not query:
+            return []
+        # A running background update holds the lock; don't wait for it
+        self.update(blocking=False)
+        # Own connection: in WAL mode readers never wait for the indexing writer
+        with closing(sqlite3.connect(str(self.db_file))) as db:
+            rows = db.execute(
+                "SELECT day, offset, text FROM lines WHERE lines MATCH ? ORDER BY rowid DESC LIMIT ?",
+                (query, limit)).fetchall()
+        return [{"day": day, "offset": offset, "line": line} for day, offset, line in rows]
+
+    def start_background_update(self):
+        # The first run over months of gzipped logs can take a while; keep it off the request path
+        def run():
+            started = time.monotonic()
+            added = self.update()
+            if added:
+                log(f"[LogIndex] Indexed {added} log line(s) in {time.monotonic() - started:.1f}s")
+        threading.Thread(target=run, daemon=True).start()
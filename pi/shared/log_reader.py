@@ -0,0 +1,90 @@
+# log_reader.py
+import gzip
+import io
+import os
+import time
+
+# Reads the daily logs from the end. tail_lines() walks backwards in blocks
+# until it has enough newlines, so the cost depends on how much is shown, not
+# on how big the file is. Offsets are byte positions at line starts; passing
+# a result's "start" back as `before` pages further into the past, and its
+# "end" is where follow_lines() picks up new lines. Days gzipped after a week
+# are decompressed in memory (at most the daily cap) and use the same
+# offsets into the uncompressed text; they never grow, so there is nothing
+# to follow.
+LOG_TAIL_BLOCK_SIZE = 8192
+LOG_TAIL_DEFAULT_LINES = 200
+LOG_TAIL_MAX_LINES = 2000
+LOG_FOLLOW_POLL_SECONDS = 1.0
+LOG_FOLLOW_MAX_READ = 256 * 1024
+
+def _decode(raw_lines):
+    return [line.decode('utf-8', errors='replace') for line in raw_lines]
+
+def _is_compressed(path):
+    return str(path).endswith(".gz")
+
+def _open_log(path):
+    if _is_compressed(path):
+        with gzip.open(path, 'rb') as f:
+            return io.BytesIO(f.read())
+    return open(path, 'rb')
+
+def tail_lines(path, count=LOG_TAIL_DEFAULT_LINES, before=None):
+    count = max(1, min(int(count), LOG_TAIL_MAX_LINES))
+    with _open_log(path) as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size if before is None else max(0, min(int(before), size))
+
+        pos = end
+        data = b""
+        # One newline more than needed, so the first line we keep is complete
+        while pos > 0 and data.count(b"\n") <= count:
+            step = min(LOG_TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    # A line still being written has no newline yet; it will come through follow_lines()
+    if not data.endswith(b"\n"):
+        cut = data.rfind(b"\n") + 1
+        end -= len(data) - cut
+        data = data[:cut]
+
+    lines = data.split(b"\n")[:-1][-count:]
+    start = end - sum(len(line) + 1 for line in lines)
+    return {"lines": _decode(lines), "start": start, "end": end, "size": size}
+
+def follow_lines(path, offset, duration=None, poll_interval=LOG_FOLLOW_POLL_SECONDS):
+    # Yields (offset, lines) every poll; lines is empty when nothing was appended.
+    # Only complete lines are returned and the offset always points past the last one.
+    deadline = time.monotonic() + duration if duration else None
+    while deadline is None or time.monotonic() < deadline:
+        if _is_compressed(path):
+            yield offset, []
+            time.sleep(poll_interval)
+            continue
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return
+        if size < offset:
+            # Truncated or deleted and recreated: start over from the top
+            offset = 0
+
+        lines = []
+        if size > offset:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(min(size - offset, LOG_FOLLOW_MAX_READ))
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                lines = _decode(data[:cut].split(b"\n")[:-1])
+                offset += cut
+            elif len(data) == LOG_FOLLOW_MAX_READ:
+                # A single enormous line; skip it rather than buffer it
+                offset += len(data)
+
+        yield offset, lines
+        if not lines:
+            time.sleep(poll_interval)
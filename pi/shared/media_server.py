@@ -0,0 +1,128 @@
+# media_server.py
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+
+from flask import Response, request
+
+# Serves files from ~/videos and ~/images with conditional GET and single
+# byte-range support. The ETag is built from size + mtime so revalidating a
+# file costs one fstat. When the WSGI server offers a file_wrapper (waitress)
+# the body goes out through it, so the server's I/O thread streams it after
+# the view has returned. That is still a read() copy per block, not zero-copy:
+# waitress has no sendfile path. benchmarks/bench_media_serving.py measures
+# server CPU per MB against a socket.sendfile() server to size the gap.
+MEDIA_BLOCK_SIZE = 256 * 1024
+VIDEO_CACHE_CONTROL = "no-cache"
+IMAGE_CACHE_CONTROL = "public, max-age=3600"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def make_etag(st):
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def parse_range(header, size):
+    # Returns (start, end) for a single satisfiable range, "invalid" for an
+    # unsatisfiable one and None when the header should be ignored
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_str, _, end_str = header[6:].strip().partition("-")
+    try:
+        if start_str == "":
+            suffix = int(end_str)
+            if suffix <= 0:
+                return "invalid"
+            start, end = max(0, size - suffix), size - 1
+        else:
+            start = int(start_str)
+            end = min(int(end_str), size - 1) if end_str else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return "invalid"
+    return start, end
+
+def _not_modified(etag, mtime):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _read_range(f, length):
+    try:
+        while length > 0:
+            data = f.read(min(MEDIA_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+def send_media(folder, filename, cache_control=VIDEO_CACHE_CONTROL):
+    filename = os.path.basename(filename)
+    try:
+        f = open(os.path.join(folder, filename), 'rb')
+    except (FileNotFoundError, IsADirectoryError, PermissionError):
+        return Response("File not found", 404)
+
+    st = os.fstat(f.fileno())
+    if not stat.S_ISREG(st.st_mode):
+        f.close()
+        return Response("File not found", 404)
+
+    etag = make_etag(st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes"
+    }
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    if _not_modified(etag, st.st_mtime):
+        f.close()
+        return Response(status=304, headers=headers)
+
+    size = st.st_size
+    start, end, status = 0, size - 1, 200
+    byte_range = parse_range(request.headers.get("Range"), size)
+
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    if_range = request.headers.get("If-Range")
+    if byte_range is not None and if_range and if_range not in (etag, last_modified):
+        byte_range = None
+
+    if byte_range == "invalid":
+        f.close()
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status=416, headers=headers)
+    if byte_range:
+        start, end = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = max(0, end - start + 1)
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        f.close()
+        return Response(status=status, headers=headers, mimetype=mimetype)
+
+    f.seek(start)
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    # Werkzeug's generic wrapper reads to EOF, so only trust a server-provided one;
+    # waitress's wrapper stops at Content-Length (it copies through read(), not sendfile)
+    if file_wrapper is not None and not getattr(file_wrapper, "__module__", "").startswith("werkzeug"):
+        body = file_wrapper(f, MEDIA_BLOCK_SIZE)
+    else:
+        body = _read_range(f, length)
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
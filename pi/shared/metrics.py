@@ -0,0 +1,224 @@
+# metrics.py
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# In-process counters and histograms, rendered in the Prometheus text format by
+# the web UI at /metrics. Each process has its own REGISTRY; the player writes
+# a JSON snapshot of its registry to /dev/shm (RAM, no SD card wear) every few
+# seconds and the web process merges it in with a process="player" label.
+# Recording is a dict lookup done once at import plus a locked add, so it is
+# cheap enough for the playback loops.
+METRICS_PREFIX = "livingportrait_"
+SHM_FOLDER = Path("/dev/shm")
+PLAYER_METRICS_FILE = (SHM_FOLDER if SHM_FOLDER.is_dir() else Path(os.path.expanduser("~"))) / \
+    f"livingportrait_player_metrics_{os.getuid()}.json"
+METRICS_EXPORT_INTERVAL = 5.0
+# A snapshot older than this means the player is not running
+METRICS_STALE_SECONDS = 30.0
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Child:
+    # One labelled series; for histograms value is [bucket counts..., sum, count]
+    __slots__ = ("_lock", "_buckets", "value")
+
+    def __init__(self, buckets=None):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self.value = [0] * (len(buckets) + 1) + [0.0, 0] if buckets else 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def observe(self, value):
+        # Counts per bucket here; render() makes them cumulative
+        idx = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self.value[idx] += 1
+            self.value[-2] += value
+            self.value[-1] += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+class Metric:
+    def __init__(self, kind, name, help_text, labelnames=(), buckets=None):
+        self.kind = kind
+        self.name = METRICS_PREFIX + name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if kind == "histogram" else None
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, **labels):
+        # Bind the labels once and keep the child around on hot paths
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, _Child(self.buckets))
+        return child
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def snapshot(self):
+        with self._lock:
+            children = list(self._children.items())
+        values = [[list(key), list(child.value) if self.buckets else child.value] for key, child in children]
+        return {"kind": self.kind, "help": self.help, "labelnames": list(self.labelnames),
+                "buckets": list(self.buckets) if self.buckets else None, "values": values}
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labelnames, buckets=None):
+        with self._lock:
+            metric = self._metrics.get(METRICS_PREFIX + name)
+            if metric is None:
+                metric = Metric(kind, name, help_text, labelnames, buckets)
+                self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get("counter", name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get("gauge", name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get("histogram", name, help_text, labelnames, buckets)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+def render(sources):
+    # sources: [(extra labels, snapshot)]; series of the same metric from all
+    # processes are grouped under one HELP/TYPE header
+    families = {}
+    for extra, snapshot in sources:
+        for name, family in snapshot.items():
+            families.setdefault(name, (family, []))[1].append((extra, family))
+
+    lines = []
+    for name in sorted(families):
+        first, parts = families[name]
+        lines.append(f"# HELP {name} {first['help']}")
+        lines.append(f"# TYPE {name} {first['kind']}")
+        for extra, family in parts:
+            for key, value in family["values"]:
+                labels = list(extra.items()) + list(zip(family["labelnames"], key))
+                if family["kind"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(family["buckets"]) + [float("inf")], value[:-2]):
+                    cumulative += count
+                    bucket_labels = labels + [("le", _format_value(float(bound)))]
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+def write_snapshot(path=PLAYER_METRICS_FILE, registry=REGISTRY):
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.stem}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"time": time.time(), "metrics": registry.snapshot()}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def read_snapshot(path=PLAYER_METRICS_FILE, max_age=METRICS_STALE_SECONDS):
+    # Returns (age in seconds, metrics) or (None, {}) when missing or stale
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, {}
+    age = time.time() - data.get("time", 0)
+    if age > max_age:
+        return age, {}
+    return age, data.get("metrics", {})
+
+class MetricsExporter:
+    # Runs in the player: publishes the registry for the web UI's /metrics
+    def __init__(self, path=PLAYER_METRICS_FILE, interval=METRICS_EXPORT_INTERVAL, on_error=None):
+        self.path = path
+        self.interval = interval
+        self.on_error = on_error
+        # Called before each snapshot, for gauges that are sampled rather than recorded
+        self.before_export = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        for callback in self.before_export:
+            callback()
+        try:
+            write_snapshot(self.path)
+        except OSError as e:
+            if self.on_error:
+                self.on_error(f"[Metrics] Failed to write {self.path}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self.export()
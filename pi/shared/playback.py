@@ -0,0 +1,487 @@
+# playback.py
+import threading
+from collections import deque
+from pathlib import Path
+from time import monotonic, sleep
+
+from shared import analytics, metrics
+from shared.vlc_helper import (
+    log,
+    get_settings_snapshot,
+    channel_view,
+    get_selected_video,
+    read_pause_flag,
+    get_triggered_flag,
+    get_trigger_delay_seconds,
+    is_schedule_enabled_now,
+    next_control_timeout,
+    write_trigger_stats
+)
+
+# The player's state machine: pause screen, endless loop with gapless preroll
+# and triggered playback. Everything it touches in the outside world is passed
+# in: a clock (time, sleeping and waiting for control events), a player (VLC),
+# a motion sensor (gpiozero) and the settings it reads on every pass.
+# motion_vlc.py wires in the real ones; benchmarks/replay_playback.py runs the
+# same code against simulated ones in virtual time.
+
+# Player states; motion_vlc.py maps vlc.State onto these
+IDLE, OPENING, PLAYING, PAUSED, STOPPED, ENDED, ERROR = (
+    "idle", "opening", "playing", "paused", "stopped", "ended", "error")
+
+# Gapless endless mode: the next video is appended to a VLC media list this many
+# seconds before the current one ends, so VLC switches in-engine without the
+# set_media/play/sleep round trip. The list is rebuilt once it grows this long.
+PREROLL_SECONDS = 3.0
+PREROLL_MAX_LIST_ITEMS = 50
+PREROLL_SWITCH_TIMEOUT = 2.0
+
+# Hot standby for triggered mode: the selected video sits decoded at frame 0 and
+# paused while armed, so a motion edge only has to resume it.
+TRIGGER_PLAYING_TIMEOUT = 2.0
+# Time given to VLC to show the first frame before pausing a freshly loaded file
+LOAD_SETTLE_SECONDS = 0.5
+
+# PIR edges arrive through the sensor's callback and are queued with their
+# timestamp, so the triggered loop can wait for motion, control events and its
+# cooldown timer in one ControlChannel wait. Edges closer together than the
+# debounce window count as one; edges during playback or the post-play delay
+# are coalesced and dropped, and the delay runs from the end-of-video event.
+# Overridable under "motion" in settings.json.
+DEFAULT_MOTION_SETTINGS = {
+    "debounce_seconds": 0.3
+}
+MOTION_QUEUE_SIZE = 32
+# listen_from while a triggered video plays or the player is elsewhere
+NOT_LISTENING = float("inf")
+
+# Published to the web UI's /metrics through the player's snapshot in /dev/shm
+MOTION_TRIGGERS = metrics.counter("motion_triggers_total", "PIR motion edges")
+TRIGGER_LATENCY = metrics.histogram("trigger_latency_seconds", "PIR edge to resume call / VLC Playing", ["stage"])
+TRIGGER_RESUME_LATENCY = TRIGGER_LATENCY.labels(stage="resume")
+TRIGGER_PLAYING_LATENCY = TRIGGER_LATENCY.labels(stage="playing")
+VIDEOS_PLAYED = metrics.counter("videos_played_total", "Videos started", ["mode"])
+PLAYBACK_RESTARTS = metrics.counter("playback_restarts_total", "Endless mode restarts with a gap (nothing pre-rolled)")
+PREROLL_SWITCH_LATENCY = metrics.histogram("preroll_switch_seconds", "End of video to next Playing in endless mode")
+VLC_EVENTS = metrics.counter("vlc_events_total", "VLC media player state transitions", ["event"])
+MOTION_DEBOUNCED = metrics.counter("motion_debounced_total", "PIR edges dropped inside the debounce window")
+MOTION_COALESCED = metrics.counter("motion_coalesced_total", "PIR edges during playback or cooldown that started nothing")
+
+class MotionEvents:
+    # Timestamped PIR edges; written from the GPIO thread, read by the playback loop
+    def __init__(self, maxlen=MOTION_QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=maxlen)
+        self._last_edge_at = None
+
+    def add(self, at, debounce_seconds):
+        # Returns False for an edge inside the debounce window of the previous one
+        with self._lock:
+            if self._last_edge_at is not None and at - self._last_edge_at < debounce_seconds:
+                MOTION_DEBOUNCED.inc()
+                return False
+            self._last_edge_at = at
+            self._events.append(at)
+            return True
+
+    def take(self, since):
+        # Earliest edge at or after `since`; everything else queued is coalesced into it
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        if not events:
+            return None
+        fresh = [at for at in events if at >= since]
+        MOTION_COALESCED.inc(len(events) - min(1, len(fresh)))
+        return fresh[0] if fresh else None
+
+class RealClock:
+    # Wall-clock time; waits block on the player's ControlChannel
+    def __init__(self, control):
+        self.control = control
+
+    def now(self):
+        return monotonic()
+
+    def sleep(self, seconds):
+        sleep(seconds)
+
+    def wait(self, timeout=None):
+        # None: until the next schedule edge or the fallback poll
+        return self.control.wait(timeout)
+
+    def wait_event(self, event, timeout):
+        return event.wait(timeout)
+
+    def notify(self, event):
+        self.control.notify(event)
+
+class SettingsInputs:
+    # What the state machine reads, backed by the cached settings.json snapshot;
+    # channel selects one portrait's keys (see vlc_helper.channel_view)
+    def __init__(self, channel=None):
+        self.channel = channel
+
+    def paused(self):
+        return read_pause_flag(self.channel)
+
+    def triggered(self):
+        return get_triggered_flag(self.channel)
+
+    def trigger_delay(self):
+        return get_trigger_delay_seconds(self.channel)
+
+    def selected_video(self):
+        return get_selected_video(self.channel)
+
+    def schedule_active(self):
+        return is_schedule_enabled_now(self.channel)
+
+    def next_timeout(self):
+        return next_control_timeout(self.channel)
+
+    def motion_debounce(self):
+        # A channel inherits the main motion settings and may override them
+        settings = get_settings_snapshot()
+        motion = dict(DEFAULT_MOTION_SETTINGS)
+        motion.update(settings.get("motion", {}))
+        motion.update(channel_view(settings, self.channel).get("motion", {}))
+        return motion["debounce_seconds"]
+
+class PlaybackController:
+    # player: load(path), play(), set_pause(flag), set_time(ms), stop(), get_state(),
+    #   is_playing(), get_length(), get_time(), start_list(path), queue(path),
+    #   list_count(), stop_list() and attach(event_name, callback)
+    # sensor: when_motion and motion_detected, as gpiozero's MotionSensor
+    # on_event(kind, video=None, value=None, detail=None): playback history (see analytics.py)
+    def __init__(self, clock, player, sensor, settings=None, pause_video=None,
+                 on_trigger_stats=write_trigger_stats, log=log, on_event=analytics.record):
+        self.clock = clock
+        self.player = player
+        self.sensor = sensor
+        self.settings = settings or SettingsInputs()
+        self.pause_video = pause_video
+        self.on_trigger_stats = on_trigger_stats
+        self.log = log
+        self.on_event = on_event
+        # (path, clock time) of the video on screen, for play_end's watch time
+        self._now_playing = None
+
+        self.last_played_path = None
+        self.armed_path = None
+        self.paused_mode = False
+
+        # End-of-stream -> next Playing latency, measured in player callbacks
+        self.switch_latencies = deque(maxlen=100)
+        self.switch_count = 0
+        self.preroll_active = False
+        self._end_reached_at = None
+
+        self.trigger_resume_ms = deque(maxlen=200)
+        self.trigger_playing_ms = deque(maxlen=200)
+        self.motion = MotionEvents()
+        # Motion before this (clock) time is ignored: the post-play delay
+        self.listen_from = NOT_LISTENING
+        # Set when play_triggered returned to the main loop with the cooldown kept
+        self._listen_resumed = False
+        self.waiting_for_motion = False
+        self._ended_at = None
+        self._playing_event = threading.Event()
+
+        player.attach("end_reached", self.on_end_reached)
+        player.attach("playing", self.on_playing)
+        for name in ("paused", "stopped", "error"):
+            player.attach(name, VLC_EVENTS.labels(event=name).inc)
+        sensor.when_motion = self.on_motion
+
+    def on_motion(self):
+        # Runs on the gpiozero thread right at the PIR edge
+        if self.motion.add(self.clock.now(), self.settings.motion_debounce()):
+            MOTION_TRIGGERS.inc()
+            self.clock.notify("motion")
+
+    def on_end_reached(self):
+        self._end_reached_at = self._ended_at = self.clock.now()
+        VLC_EVENTS.labels(event="end_reached").inc()
+        self.clock.notify("ended")
+
+    def on_playing(self):
+        self._playing_event.set()
+        VLC_EVENTS.labels(event="playing").inc()
+        if self.preroll_active and self._end_reached_at is not None:
+            self.switch_latencies.append(self.clock.now() - self._end_reached_at)
+            PREROLL_SWITCH_LATENCY.observe(self.switch_latencies[-1])
+            self.switch_count += 1
+            self._end_reached_at = None
+            self.clock.notify("switched")
+
+    def _event(self, kind, video=None, value=None, detail=None):
+        if self.on_event:
+            self.on_event(kind, video=video, value=value, detail=detail)
+
+    def _play_started(self, path, mode):
+        self._play_ended("completed")
+        self._now_playing = (path, self.clock.now())
+        self._event("play_start", path, detail=mode)
+
+    def _play_ended(self, outcome):
+        if self._now_playing is None:
+            return
+        path, started_at = self._now_playing
+        self._now_playing = None
+        self._event("play_end", path, round(self.clock.now() - started_at, 3), outcome)
+
+    # Helper: load and pause a media file
+    def load_and_pause(self, media_path):
+        self.player.load(media_path)
+        self.player.play()
+        self.clock.sleep(LOAD_SETTLE_SECONDS)
+        self.player.set_pause(1)
+        self.player.set_time(0)
+        self.armed_path = media_path
+
+    def show_pause_screen(self):
+        self._play_ended("interrupted")
+        self._event("pause")
+        if self.player.is_playing():
+            self.player.stop()
+        self.armed_path = None
+        self.player.load(self.pause_video)
+        self.player.play()
+        self.clock.sleep(LOAD_SETTLE_SECONDS)
+        self.player.set_pause(1)
+        self.player.set_time(0)
+
+    # Helper: play video endlessly until paused
+    def play_endless(self):
+        self.log("Triggered mode OFF — playing video endlessly.")
+        self.armed_path = None
+
+        # Hole das aktuell gewünschte Video aus den Settings
+        media_path = self.settings.selected_video()
+        if media_path and media_path != self.last_played_path:
+            self.log(f"Videoänderung erkannt (Settings -> {Path(media_path).name}). Wechsle nach aktuellem Video.")
+            self.last_played_path = media_path
+
+        def start_fresh_list(path):
+            self.player.start_list(path)
+            VIDEOS_PLAYED.labels(mode="endless").inc()
+            self._play_started(path, "endless")
+            return self.clock.now()
+
+        seen_switches = self.switch_count
+        self._end_reached_at = None
+        self.preroll_active = True
+        queued_path = None
+        started_at = start_fresh_list(self.last_played_path)
+
+        try:
+            while True:
+                if self.settings.paused() or not self.settings.schedule_active():
+                    self.log("Pause detected mid-playback. Stopping video.")
+                    self.player.stop_list()
+                    return
+                if self.settings.triggered():
+                    self.log("Triggered flag changed to ON during endless loop. Switching mode.")
+                    self.player.stop_list()
+                    return
+
+                if self.switch_count != seen_switches:
+                    seen_switches = self.switch_count
+                    VIDEOS_PLAYED.labels(mode="endless").inc()
+                    if queued_path:
+                        self.log(f"[Preroll] Switched to {Path(queued_path).name} in {self.switch_latencies[-1] * 1000:.0f} ms")
+                        self.last_played_path = queued_path
+                        queued_path = None
+                    else:
+                        self.log(f"[Preroll] Restarted {Path(self.last_played_path).name} in {self.switch_latencies[-1] * 1000:.0f} ms (not pre-buffered)")
+                    self._play_started(self.last_played_path, "endless")
+
+                state = self.player.get_state()
+                if state in (ENDED, STOPPED):
+                    if self.clock.now() - started_at < PREROLL_SWITCH_TIMEOUT:
+                        # play() is asynchronous, the player may still report the previous stop
+                        self.clock.wait(0.1)
+                        continue
+                    if queued_path and self._end_reached_at is not None and \
+                            self.clock.now() - self._end_reached_at < PREROLL_SWITCH_TIMEOUT:
+                        # VLC is already moving on to the queued item
+                        self.clock.wait(PREROLL_SWITCH_TIMEOUT)
+                        continue
+
+                    # Nothing (or too much) queued: restart with a fresh list, this transition has a gap
+                    self.log("Video beendet. Prüfe auf neues Video für nächsten Durchlauf.")
+                    PLAYBACK_RESTARTS.inc()
+                    self.last_played_path = self.settings.selected_video() or self.last_played_path
+                    queued_path = None
+                    started_at = start_fresh_list(self.last_played_path)
+                    continue
+
+                length = self.player.get_length()
+                remaining = (length - self.player.get_time()) / 1000.0
+                if queued_path is None and length > 0 and self.player.list_count() < PREROLL_MAX_LIST_ITEMS:
+                    if remaining <= PREROLL_SECONDS:
+                        queued_path = self.settings.selected_video() or self.last_played_path
+                        self.player.queue(queued_path)
+                        self.log(f"[Preroll] Queued {Path(queued_path).name} for gapless switch")
+
+                timeout = None
+                if length <= 0:
+                    # Length is unknown until the demuxer has opened the file
+                    timeout = 0.25
+                elif queued_path is None and remaining > PREROLL_SECONDS:
+                    timeout = min(self.settings.next_timeout(), remaining - PREROLL_SECONDS)
+                self.clock.wait(timeout)
+        finally:
+            self.preroll_active = False
+            self._play_ended("interrupted")
+
+    # Helper: play video once with motion trigger and delay after
+    def play_triggered(self, delay_seconds):
+        if self.listen_from == NOT_LISTENING:
+            # Coming from endless mode or an interrupted video: only new edges count
+            self.listen_from = self.clock.now()
+        elif self._listen_resumed:
+            # Back from a pause or a new selection: a running cooldown still counts, edges from meanwhile don't
+            self.listen_from = max(self.listen_from, self.clock.now())
+        self._listen_resumed = False
+        # Keep the current selection loaded and paused on frame 0 while we wait
+        media_path = self.settings.selected_video()
+        if media_path and (media_path != self.armed_path or self.player.get_state() != PAUSED):
+            self.load_and_pause(media_path)
+            self.log(f"[Trigger] Armed {Path(media_path).name} at frame 0")
+
+        self.log("Waiting for motion...")
+        motion_at = self.wait_for_motion(media_path)
+        if motion_at is None:
+            # Paused, schedule off, endless mode or a new selection: back to the main loop.
+            # The cooldown after the last video survives everything but leaving triggered mode
+            if self.settings.triggered():
+                self._listen_resumed = True
+            else:
+                self.listen_from = NOT_LISTENING
+            return
+        self.listen_from = NOT_LISTENING
+        self.log("Motion detected! Playing video")
+
+        if self.armed_path:
+            self._playing_event.clear()
+            resume_at = self.clock.now()
+            self.player.set_pause(0)
+            VIDEOS_PLAYED.labels(mode="triggered").inc()
+            self._ended_at = None
+            self._play_started(self.armed_path, "triggered")
+            if self.clock.wait_event(self._playing_event, TRIGGER_PLAYING_TIMEOUT):
+                playing_at = self.clock.now()
+                self._event("trigger", self.armed_path, round(playing_at - motion_at, 4))
+                self.trigger_resume_ms.append((resume_at - motion_at) * 1000)
+                self.trigger_playing_ms.append((playing_at - motion_at) * 1000)
+                TRIGGER_RESUME_LATENCY.observe(resume_at - motion_at)
+                TRIGGER_PLAYING_LATENCY.observe(playing_at - motion_at)
+                self.log(f"[Trigger] PIR -> resume {self.trigger_resume_ms[-1]:.0f} ms, PIR -> Playing {self.trigger_playing_ms[-1]:.0f} ms")
+                if self.on_trigger_stats:
+                    self.on_trigger_stats(list(self.trigger_resume_ms), list(self.trigger_playing_ms))
+            else:
+                self._event("trigger", self.armed_path, detail="no_playing")
+                self.log(f"[Trigger] VLC did not report Playing within {TRIGGER_PLAYING_TIMEOUT}s of resume")
+
+            interrupted = False
+
+            # Play until video ends or paused mid-playback
+            while self.player.get_state() not in (ENDED, STOPPED):
+                if self.settings.paused() or not self.settings.schedule_active():
+                    self.log("Pause detected mid-playback. Stopping video.")
+                    self.player.stop()
+                    interrupted = True
+                    break
+                if not self.settings.triggered():
+                    self.log("Triggered flag turned OFF during playback. Stopping video.")
+                    self.player.stop()
+                    interrupted = True
+                    break
+
+                self.clock.wait()
+
+            if interrupted:
+                self._play_ended("interrupted")
+                self.armed_path = None
+                return
+            self._play_ended("completed")
+
+            # Delay before next motion detection, counted from the end of the video
+            ended_at = self._ended_at if self._ended_at is not None else self.clock.now()
+            self.listen_from = ended_at + delay_seconds
+            if delay_seconds > 0:
+                self.log(f"Waiting {delay_seconds} seconds before listening for motion again.")
+
+            # Re-arm right away so the next visitor doesn't wait for a reload
+            self.log("Video ended. Re-arming before next motion...")
+            self.load_and_pause(self.settings.selected_video() or self.armed_path)
+
+    def wait_for_motion(self, media_path):
+        # Returns the clock time of the motion edge, or None when playback should change instead
+        self.waiting_for_motion = True
+        try:
+            while True:
+                now = self.clock.now()
+                motion_at = self.motion.take(self.listen_from)
+                if motion_at is not None:
+                    return motion_at
+                if now >= self.listen_from and getattr(self.sensor, "motion_detected", False):
+                    # Still high from an edge during the delay: no new edge will come
+                    return now
+                if self.settings.paused() or not self.settings.schedule_active() or not self.settings.triggered():
+                    return None
+                if self.settings.selected_video() != media_path:
+                    return None
+                timeout = None
+                if now < self.listen_from:
+                    timeout = min(self.settings.next_timeout(), self.listen_from - now)
+                self.clock.wait(timeout)
+        finally:
+            self.waiting_for_motion = False
+
+    def run(self, media_path):
+        # Start with the given video loaded and paused, then loop until interrupted
+        self.last_played_path = media_path
+        self.paused_mode = False
+        self.load_and_pause(media_path)
+        self.log(f"Loaded video {Path(media_path).name} in paused state")
+
+        while True:
+            pause_flag = self.settings.paused()
+            triggered_flag = self.settings.triggered()
+            delay_seconds = self.settings.trigger_delay()
+            schedule_enabled = self.settings.schedule_active()
+
+            # Handle pause ON
+            if (pause_flag or not schedule_enabled) and not self.paused_mode:
+                self.log("Pause flag detected ON. Switching to pause screen.")
+                self.show_pause_screen()
+                self.log(f"[PAUSED] Loaded pause screen: {Path(self.pause_video).name}")
+                self.paused_mode = True
+                self._listen_resumed = True
+
+            # Handle pause OFF
+            elif (not pause_flag and schedule_enabled) and self.paused_mode:
+                self.log("[UNPAUSED] Pause flag cleared, returning to playback mode")
+                self._event("resume")
+                if self.player.is_playing():
+                    self.player.stop()
+                new_path = self.settings.selected_video()
+                if new_path and new_path != media_path:
+                    media_path = new_path
+                    self.log(f"Updated video selection to {Path(media_path).name}")
+                self.load_and_pause(media_path)
+                self.last_played_path = self.settings.selected_video()
+                self.paused_mode = False
+
+            # Playback if not paused
+            if not self.paused_mode:
+                if not triggered_flag:
+                    self.listen_from = NOT_LISTENING
+                    self.play_endless()
+                else:
+                    self.play_triggered(delay_seconds)
+            else:
+                self.clock.wait()  # When paused, sleep until something changes
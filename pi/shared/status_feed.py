@@ -0,0 +1,115 @@
+# status_feed.py
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from shared.vlc_helper import get_settings_snapshot, get_compiled_schedule, log
+
+# Compact playback status for the dashboard. One poller thread per web process
+# rebuilds it from the cached settings snapshot (a single stat of settings.json
+# when nothing changed) and bumps a version number whenever it differs, so any
+# number of /api/status and /api/events clients share that one check. Routes
+# that change settings call poke() to publish straight away; rotations done by
+# the player process are seen on the next poll.
+STATUS_POLL_SECONDS = 1.0
+
+def build_status(settings=None):
+    settings = settings if settings is not None else get_settings_snapshot()
+    playlist = settings.get("playlist", {})
+    mode = playlist.get("mode", "single")
+    interval = playlist.get("interval", 0) or 0
+
+    # Epoch seconds rather than a countdown, so the status only changes on real events
+    next_switch_at = None
+    if mode in ("random", "fixed") and interval > 0 and playlist.get("last_updated"):
+        try:
+            last_dt = datetime.strptime(playlist["last_updated"], "%Y-%m-%d %H:%M:%S")
+            next_switch_at = int((last_dt + timedelta(minutes=interval)).timestamp())
+        except ValueError:
+            pass
+
+    schedule = get_compiled_schedule()
+    schedule_active = schedule.is_active()
+    next_start = None
+    if not schedule_active:
+        start = schedule.next_start()
+        next_start = start.strftime("%A %I:%M %p") if start else None
+
+    return {
+        "mode": mode,
+        "interval": interval,
+        "selected_video": settings.get("selected_video", ""),
+        "paused": bool(settings.get("pause_flag", False)),
+        "triggered": bool(playlist.get("triggered_flag", False)),
+        "delay": playlist.get("delay", 0) or 0,
+        "schedule_active": schedule_active,
+        "next_start": next_start,
+        "next_switch_at": next_switch_at,
+        "playlist": [item["filename"] for item in playlist.get("order", [])
+                     if isinstance(item, dict) and item.get("active", True)]
+    }
+
+class StatusFeed:
+    def __init__(self, build=build_status, poll_interval=STATUS_POLL_SECONDS):
+        self.build = build
+        self.poll_interval = poll_interval
+        # Versions restart with the process; the boot id keeps old ETags from matching
+        self.boot_id = f"{int(time.time()):x}"
+        self.version = 0
+        self._status = None
+        self._body = None
+        self._cond = threading.Condition()
+        # Keeps the poller and poke() from publishing builds out of order
+        self._build_lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _update(self):
+        with self._build_lock:
+            try:
+                status = self.build()
+            except Exception as e:
+                log(f"[Status] Failed to build status: {e}")
+                return
+            with self._cond:
+                if status != self._status:
+                    self._status = status
+                    self._body = None
+                    self.version += 1
+                    self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            self._update()
+            time.sleep(self.poll_interval)
+
+    def poke(self):
+        # Settings just changed in this process; publish without waiting for the poll
+        self._update()
+
+    def etag(self, version=None):
+        return f'"{self.boot_id}-{self.version if version is None else version}"'
+
+    def current(self):
+        # (version, status, json body); the body is serialised once per version
+        if self._thread is None:
+            self._start()
+            self._update()
+        with self._cond:
+            if self._body is None:
+                self._body = json.dumps({"version": self.version, "status": self._status}, separators=(",", ":"))
+            return self.version, self._status, self._body
+
+    def wait_for_change(self, version, timeout):
+        # Blocks until the version moves past `version`; returns current() either way
+        if self._thread is None:
+            self._start()
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout=timeout)
+        return self.current()
@@ -0,0 +1,191 @@
+# thumbnails.py
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from shared.vlc_helper import HOME, log
+from shared.transcoder import low_priority_prefix
+
+# Poster frames (JPEG) and short animated previews (WebP) for the web UI, made
+# once per video by a niced ffmpeg in a background thread. Files are named
+# after the video's sha256 from the library index, so a renamed video reuses
+# its thumbnails and the URLs can be cached by the browser forever. The cache
+# is capped by total size; the least recently served files go first.
+THUMBS_FOLDER = HOME / "images" / "thumbs"
+THUMB_CACHE_MAX_BYTES = 64 * 1024 * 1024
+THUMB_KEY_LENGTH = 16
+POSTER_WIDTH = 320
+PREVIEW_WIDTH = 160
+PREVIEW_SECONDS = 3
+PREVIEW_FPS = 8
+THUMB_TIMEOUT_SECONDS = 120
+# Served files get their mtime bumped at most this often, so LRU order survives restarts
+THUMB_TOUCH_INTERVAL = 3600
+
+def thumb_key(entry):
+    sha256 = (entry or {}).get("sha256")
+    return sha256[:THUMB_KEY_LENGTH] if sha256 else None
+
+def _seek_offset(duration):
+    # Skip fade-ins and black first frames without running past short clips
+    if not duration:
+        return 0
+    return round(min(1.0, duration / 10), 2)
+
+def build_poster_command(source, target, duration=None):
+    return low_priority_prefix() + [
+        shutil.which("ffmpeg") or "ffmpeg", "-hide_banner", "-nostdin", "-y", "-v", "error",
+        "-ss", str(_seek_offset(duration)), "-i", str(source),
+        "-frames:v", "1", "-vf", f"scale={POSTER_WIDTH}:-2", "-q:v", "5",
+        "-f", "image2", str(target)
+    ]
+
+def build_preview_command(source, target, duration=None):
+    return low_priority_prefix() + [
+        shutil.which("ffmpeg") or "ffmpeg", "-hide_banner", "-nostdin", "-y", "-v", "error",
+        "-ss", str(_seek_offset(duration)), "-t", str(PREVIEW_SECONDS), "-i", str(source),
+        "-an", "-vf", f"fps={PREVIEW_FPS},scale={PREVIEW_WIDTH}:-2",
+        "-c:v", "libwebp", "-quality", "50", "-loop", "0",
+        "-f", "webp", str(target)
+    ]
+
+class ThumbnailCache:
+    def __init__(self, folder=THUMBS_FOLDER, max_bytes=THUMB_CACHE_MAX_BYTES):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # filename -> [size, last touched], oldest first
+        self._files = OrderedDict()
+        self._total = 0
+        self._queued = set()
+        self._pending = queue.Queue()
+        self._worker = None
+        self._load()
+
+    def _load(self):
+        found = []
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, st.st_size))
+        for mtime, name, size in sorted(found):
+            self._files[name] = [size, mtime]
+            self._total += size
+        self._evict()
+
+    def poster_name(self, key):
+        return f"{key}.jpg"
+
+    def preview_name(self, key):
+        return f"{key}.webp"
+
+    def lookup(self, entry):
+        # Filenames of the cached poster/preview for a library entry, None when missing
+        key = thumb_key(entry)
+        if not key:
+            return None
+        poster, preview = self.poster_name(key), self.preview_name(key)
+        with self._lock:
+            if poster not in self._files:
+                return None
+            return {"poster": poster, "preview": preview if preview in self._files else None}
+
+    def touch(self, filename):
+        # Called when a thumbnail is served; moves it to the young end of the LRU
+        with self._lock:
+            item = self._files.get(filename)
+            if item is None:
+                return
+            self._files.move_to_end(filename)
+            now = time.time()
+            if now - item[1] < THUMB_TOUCH_INTERVAL:
+                return
+            item[1] = now
+        try:
+            os.utime(self.folder / filename)
+        except OSError:
+            pass
+
+    def request(self, path, entry):
+        # Queue thumbnails for a probed video unless they already exist
+        key = thumb_key(entry)
+        if not key or not shutil.which("ffmpeg"):
+            return
+        with self._lock:
+            if self.poster_name(key) in self._files or key in self._queued:
+                return
+            self._queued.add(key)
+        self._pending.put((Path(path), key, entry.get("duration")))
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            path, key, duration = self._pending.get()
+            try:
+                self._generate(path, key, duration)
+            finally:
+                with self._lock:
+                    self._queued.discard(key)
+
+    def _generate(self, path, key, duration):
+        if not path.exists():
+            return
+        started = time.monotonic()
+        # The preview first: the poster is what marks a key as done
+        made = []
+        for name, build in ((self.preview_name(key), build_preview_command),
+                            (self.poster_name(key), build_poster_command)):
+            target = self.folder / name
+            tmp_path = self.folder / f".{name}.tmp"
+            cmd = build(path, tmp_path, duration)
+            try:
+                subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               timeout=THUMB_TIMEOUT_SECONDS, check=True)
+                os.replace(tmp_path, target)
+                made.append(name)
+            except (OSError, subprocess.SubprocessError) as e:
+                tmp_path.unlink(missing_ok=True)
+                # Some ffmpeg builds lack libwebp; a poster alone is still worth having
+                log(f"[Thumbs] Could not create {name} for {path.name}: {e}")
+                continue
+            self._add(name, target.stat().st_size)
+
+        if made:
+            log(f"[Thumbs] Created {', '.join(made)} for {path.name} in {time.monotonic() - started:.1f}s")
+        self._evict()
+
+    def _add(self, name, size):
+        with self._lock:
+            old = self._files.pop(name, None)
+            if old:
+                self._total -= old[0]
+            self._files[name] = [size, time.time()]
+            self._total += size
+
+    def _evict(self):
+        removed = []
+        with self._lock:
+            while self._total > self.max_bytes and len(self._files) > 1:
+                name, (size, _) = self._files.popitem(last=False)
+                self._total -= size
+                removed.append(name)
+        for name in removed:
+            try:
+                (self.folder / name).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log(f"[Thumbs] Failed to remove {name}: {e}")
+        if removed:
+            log(f"[Thumbs] Evicted {len(removed)} file(s), cache at {self._total // 1024} KB")
+
@@ -0,0 +1,261 @@
+# transcoder.py
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from shared.vlc_helper import HOME, VIDEO_FOLDER, log, get_settings_snapshot, write_json_atomic
+from shared.video_library import probe_video
+
+# New uploads land in ~/videos/.incoming first. Files the Pi can decode are
+# moved into ~/videos straight away; anything over the decode budget of the
+# target model is re-encoded to H.264 by a niced ffmpeg process and only the
+# finished result is renamed into ~/videos, so the player never sees a
+# half-written or undecodable file. The original is deleted only after success.
+INCOMING_FOLDER = VIDEO_FOLDER / ".incoming"
+TRANSCODE_JOBS_FILE = HOME / "transcode_jobs.json"
+TRANSCODE_NICE = 19
+TRANSCODE_KEEP_FINISHED = 20
+
+# What each model's hardware decoder handles without dropping frames
+DECODE_BUDGETS = {
+    "zero": {"codecs": ["h264"], "max_pixels": 1920 * 1080, "max_bit_rate": 8000000},
+    "pi3": {"codecs": ["h264"], "max_pixels": 1920 * 1080, "max_bit_rate": 10000000},
+    "pi4": {"codecs": ["h264", "hevc"], "max_pixels": 3840 * 2160, "max_bit_rate": 40000000},
+    "pi5": {"codecs": ["h264", "hevc"], "max_pixels": 3840 * 2160, "max_bit_rate": 40000000}
+}
+
+# Default H.264 output profile, overridable per key under "transcode" -> "profile" in settings.json
+DEFAULT_PROFILE = {
+    "encoder": "libx264",
+    "preset": "veryfast",
+    "crf": 23,
+    "max_width": 1920,
+    "max_height": 1920,
+    "max_bit_rate": "8M",
+    "audio_bit_rate": "128k"
+}
+
+def detect_pi_model():
+    try:
+        with open("/proc/device-tree/model", "r") as f:
+            model = f.read().lower()
+    except OSError:
+        return "pi3"
+    if "zero" in model:
+        return "zero"
+    for name in ("pi5", "pi4"):
+        if f"pi {name[-1]}" in model:
+            return name
+    return "pi3"
+
+def get_transcode_settings():
+    settings = get_settings_snapshot().get("transcode", {})
+    model = settings.get("model") or detect_pi_model()
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(settings.get("profile", {}))
+    return {
+        "enabled": settings.get("enabled", True),
+        "model": model,
+        "budget": DECODE_BUDGETS.get(model, DECODE_BUDGETS["pi3"]),
+        "profile": profile
+    }
+
+def exceeds_budget(info, budget):
+    # Returns the reason a file needs transcoding, or None when it plays as-is
+    codec = info.get("codec")
+    if codec and codec not in budget["codecs"]:
+        return f"codec {codec}"
+    width, height = info.get("width") or 0, info.get("height") or 0
+    if width * height > budget["max_pixels"]:
+        return f"resolution {width}x{height}"
+    bit_rate = info.get("bit_rate") or 0
+    if bit_rate > budget["max_bit_rate"]:
+        return f"bit rate {bit_rate // 1000} kbit/s"
+    return None
+
+def low_priority_prefix():
+    # Lowest CPU priority so playback always wins, and the idle I/O class so the
+    # SD card stays free for the player. Set by the command rather than a
+    # preexec_fn, which can deadlock the fork in the threaded web UI
+    prefix = ["nice", "-n", str(TRANSCODE_NICE)] if shutil.which("nice") else []
+    if shutil.which("ionice"):
+        prefix += ["ionice", "-c", "3"]
+    return prefix
+
+def build_ffmpeg_command(source, target, profile):
+    scale = (f"scale='min({profile['max_width']},iw)':'min({profile['max_height']},ih)'"
+             ":force_original_aspect_ratio=decrease:force_divisible_by=2")
+    return low_priority_prefix() + [
+        shutil.which("ffmpeg") or "ffmpeg", "-hide_banner", "-nostdin", "-y",
+        "-i", str(source),
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", scale,
+        "-c:v", profile["encoder"], "-preset", profile["preset"], "-crf", str(profile["crf"]),
+        "-profile:v", "high", "-pix_fmt", "yuv420p",
+        "-maxrate", profile["max_bit_rate"], "-bufsize", profile["max_bit_rate"],
+        "-c:a", "aac", "-b:a", profile["audio_bit_rate"],
+        "-movflags", "+faststart",
+        "-progress", "pipe:1", "-nostats",
+        str(target)
+    ]
+
+class Transcoder:
+    def __init__(self, video_folder=VIDEO_FOLDER, incoming_folder=INCOMING_FOLDER,
+                 jobs_file=TRANSCODE_JOBS_FILE, on_ready=None):
+        self.video_folder = Path(video_folder)
+        self.incoming_folder = Path(incoming_folder)
+        self.incoming_folder.mkdir(parents=True, exist_ok=True)
+        self.jobs_file = Path(jobs_file)
+        # Called with the filename once a video is in ~/videos
+        self.on_ready = on_ready
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._worker = None
+        self._load_jobs()
+
+    def _load_jobs(self):
+        try:
+            with open(self.jobs_file, 'r') as f:
+                self._jobs = {job["id"]: job for job in json.load(f)}
+        except (OSError, ValueError):
+            self._jobs = {}
+
+        # Jobs interrupted by a restart start over
+        for job in self._jobs.values():
+            if job["status"] in ("queued", "running"):
+                job["status"] = "queued"
+                job["progress"] = 0
+                self._enqueue(job["id"])
+
+    def _save_jobs(self):
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j["created"])
+            active = [j for j in jobs if j["status"] in ("queued", "running")]
+            finished = [j for j in jobs if j["status"] not in ("queued", "running")][-TRANSCODE_KEEP_FINISHED:]
+            self._jobs = {j["id"]: j for j in finished + active}
+            data = finished + active
+        try:
+            write_json_atomic(self.jobs_file, data)
+        except OSError as e:
+            log(f"[Transcode] Failed to save job list: {e}")
+
+    def _enqueue(self, job_id):
+        self._queue.put(job_id)
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def incoming_path(self, filename):
+        # A staging name of its own per upload: a second upload under the same name
+        # must not overwrite the source of a job that is still queued or running
+        return self.incoming_folder / f"{uuid.uuid4().hex[:12]}_{os.path.basename(filename)}"
+
+    def submit(self, staged_path, filename):
+        # staged_path is a complete file in INCOMING_FOLDER; returns "ready" or "queued"
+        config = get_transcode_settings()
+        info = probe_video(staged_path) if config["enabled"] else {}
+        reason = exceeds_budget(info, config["budget"]) if info else None
+        if not reason or not shutil.which("ffmpeg"):
+            self._publish(staged_path, filename)
+            return "ready"
+
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "filename": filename,
+            "source": str(staged_path),
+            "reason": reason,
+            "model": config["model"],
+            "duration": info.get("duration"),
+            "status": "queued",
+            "progress": 0,
+            "error": None,
+            "created": time.time(),
+            "finished": None
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+        self._save_jobs()
+        log(f"[Transcode] Queued {filename} for {config['model']}: {reason}")
+        self._enqueue(job["id"])
+        return "queued"
+
+    def _publish(self, path, filename):
+        os.replace(path, self.video_folder / filename)
+        if self.on_ready:
+            self.on_ready(filename)
+
+    def jobs(self):
+        with self._lock:
+            return sorted((dict(j) for j in self._jobs.values()), key=lambda j: j["created"], reverse=True)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue
+            self._transcode(job)
+
+    def _transcode(self, job):
+        source = Path(job["source"])
+        target = self.incoming_folder / f".{job['id']}.transcode.mp4"
+        if not source.exists():
+            self._finish(job, "failed", "Source file is missing")
+            return
+
+        config = get_transcode_settings()
+        cmd = build_ffmpeg_command(source, target, config["profile"])
+        job["status"] = "running"
+        self._save_jobs()
+        log(f"[Transcode] Starting {job['filename']}")
+
+        started = time.monotonic()
+        last_saved = 0
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            for line in proc.stdout:
+                key, _, value = line.strip().partition("=")
+                if key == "out_time_us" and job.get("duration"):
+                    try:
+                        job["progress"] = min(99, int(int(value) / 1e6 * 100 / job["duration"]))
+                    except ValueError:
+                        continue
+                    # Don't rewrite the job file more than every few seconds
+                    if time.monotonic() - last_saved > 5:
+                        last_saved = time.monotonic()
+                        self._save_jobs()
+            returncode = proc.wait()
+        except OSError as e:
+            returncode = None
+            log(f"[Transcode] Could not run ffmpeg: {e}")
+
+        if returncode != 0:
+            target.unlink(missing_ok=True)
+            # Keep the video usable: publish the original rather than lose the upload
+            self._publish(source, job["filename"])
+            self._finish(job, "failed", f"ffmpeg exited with {returncode}, kept original")
+            return
+
+        with open(target, 'rb') as f:
+            os.fsync(f.fileno())
+        self._publish(target, job["filename"])
+        source.unlink(missing_ok=True)
+        log(f"[Transcode] Finished {job['filename']} in {time.monotonic() - started:.0f}s")
+        self._finish(job, "done", None)
+
+    def _finish(self, job, status, error):
+        job["status"] = status
+        job["error"] = error
+        job["progress"] = 100 if status == "done" else job["progress"]
+        job["finished"] = time.time()
+        if error:
+            log(f"[Transcode] {job['filename']}: {error}")
+        self._save_jobs()
@@ -0,0 +1,161 @@
+# uploads.py
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from shared.vlc_helper import VIDEO_FOLDER, log, write_json_atomic
+
+# Resumable chunked uploads. Each upload streams into ~/videos/.uploads/<id>.part
+# (same filesystem as ~/videos, so finishing is a single rename). The id is
+# derived from filename + size + a client fingerprint (the browser sends the
+# file's lastModified), so a client that lost its connection can ask again and
+# continue from the bytes already on disk, while a different clip that only
+# shares the name and size starts its own upload instead of splicing into it.
+UPLOAD_FOLDER = VIDEO_FOLDER / ".uploads"
+UPLOAD_COPY_BUFFER = 256 * 1024
+UPLOAD_FREE_SPACE_MARGIN = 200 * 1024 * 1024
+UPLOAD_STALE_SECONDS = 2 * 24 * 3600
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{20}$")
+UPLOAD_FINGERPRINT_MAX_LENGTH = 128
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+def upload_id_for(filename, size, fingerprint=""):
+    return hashlib.sha1(f"{filename}:{size}:{fingerprint}".encode()).hexdigest()[:20]
+
+def free_disk_bytes(path):
+    return shutil.disk_usage(path).free
+
+class ChunkedUploads:
+    def __init__(self, video_folder=VIDEO_FOLDER, upload_folder=UPLOAD_FOLDER):
+        self.video_folder = Path(video_folder)
+        self.upload_folder = Path(upload_folder)
+        self.upload_folder.mkdir(parents=True, exist_ok=True)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, upload_id):
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _paths(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise UploadError("Invalid upload id", 404)
+        return self.upload_folder / f"{upload_id}.part", self.upload_folder / f"{upload_id}.json"
+
+    def _load_meta(self, upload_id):
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Unknown upload", 404)
+        try:
+            meta["offset"] = part_path.stat().st_size
+        except FileNotFoundError:
+            meta["offset"] = 0
+        return meta
+
+    def start(self, filename, size, fingerprint=None):
+        filename = os.path.basename(filename or "")
+        if not filename.lower().endswith(".mp4"):
+            raise UploadError("Only .mp4 files are allowed")
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadError("Invalid file size")
+        if size <= 0:
+            raise UploadError("Invalid file size")
+        fingerprint = str(fingerprint or "")
+        if len(fingerprint) > UPLOAD_FINGERPRINT_MAX_LENGTH:
+            raise UploadError("Invalid fingerprint")
+
+        upload_id = upload_id_for(filename, size, fingerprint)
+        part_path, meta_path = self._paths(upload_id)
+        with self._lock_for(upload_id):
+            offset = part_path.stat().st_size if part_path.exists() else 0
+
+            # Only the bytes still missing need room, plus a margin for logs and settings
+            needed = size - offset + UPLOAD_FREE_SPACE_MARGIN
+            free = free_disk_bytes(self.video_folder)
+            if free < needed:
+                raise UploadError(f"Not enough disk space: {free // (1024 * 1024)} MB free, "
+                                  f"{needed // (1024 * 1024)} MB needed", 507)
+
+            if not meta_path.exists():
+                write_json_atomic(meta_path, {"filename": filename, "size": size, "fingerprint": fingerprint,
+                                              "started": time.time()})
+                log(f"[Upload] Started {filename} ({size} bytes)")
+            elif offset:
+                log(f"[Upload] Resuming {filename} at {offset}/{size} bytes")
+
+        return {"upload_id": upload_id, "filename": filename, "size": size, "offset": offset}
+
+    def status(self, upload_id):
+        meta = self._load_meta(upload_id)
+        return {"upload_id": upload_id, "filename": meta["filename"], "size": meta["size"], "offset": meta["offset"]}
+
+    def write_chunk(self, upload_id, offset, stream, length):
+        # Streams straight from the request body to disk in UPLOAD_COPY_BUFFER pieces
+        part_path, _ = self._paths(upload_id)
+        with self._lock_for(upload_id):
+            meta = self._load_meta(upload_id)
+            if offset != meta["offset"]:
+                raise UploadError("Offset mismatch", 409, offset=meta["offset"])
+            if length is None or length < 0:
+                raise UploadError("Content-Length required", 411, offset=meta["offset"])
+            if offset + length > meta["size"]:
+                raise UploadError("Chunk exceeds declared file size", 413, offset=meta["offset"])
+
+            remaining = length
+            with open(part_path, 'ab') as f:
+                while remaining > 0:
+                    data = stream.read(min(UPLOAD_COPY_BUFFER, remaining))
+                    if not data:
+                        break
+                    f.write(data)
+                    remaining -= len(data)
+            return offset + length - remaining
+
+    def finish(self, upload_id, staging_path_for=None):
+        # staging_path_for(filename) picks where the finished file goes; ~/videos/<filename> by default
+        part_path, meta_path = self._paths(upload_id)
+        with self._lock_for(upload_id):
+            meta = self._load_meta(upload_id)
+            if meta["offset"] != meta["size"]:
+                raise UploadError("Upload incomplete", 409, offset=meta["offset"])
+
+            with open(part_path, 'rb') as f:
+                os.fsync(f.fileno())
+            if staging_path_for:
+                final_path = Path(staging_path_for(meta["filename"]))
+            else:
+                final_path = self.video_folder / meta["filename"]
+            os.replace(part_path, final_path)
+            meta_path.unlink()
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+        log(f"[Upload] Finished {meta['filename']} ({meta['size']} bytes)")
+        return meta["filename"], final_path
+
+    def cleanup_stale(self, max_age=UPLOAD_STALE_SECONDS):
+        cutoff = time.time() - max_age
+        for meta_path in self.upload_folder.glob("*.json"):
+            part_path = meta_path.with_suffix(".part")
+            try:
+                last_write = max(p.stat().st_mtime for p in (meta_path, part_path) if p.exists())
+                if last_write < cutoff:
+                    part_path.unlink(missing_ok=True)
+                    meta_path.unlink()
+                    log(f"[Upload] Removed stale upload {meta_path.stem}")
+            except OSError:
+                continue
@@ -0,0 +1,316 @@
+# video_library.py
+import hashlib
+import json
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from shared.vlc_helper import HOME, VIDEO_FOLDER, log, write_json_atomic
+
+# Index of ~/videos kept next to settings.json. The folder is only rescanned when
+# its mtime changes, and only new or changed files are probed and hashed, in a
+# background thread, so routes never touch the filesystem per request.
+LIBRARY_FILE = HOME / "video_library.json"
+VIDEO_EXTENSIONS = (".mp4",)
+HASH_CHUNK_SIZE = 1024 * 1024
+PROBE_TIMEOUT_SECONDS = 30
+
+def hash_file(path, bytes_per_second=0):
+    # bytes_per_second > 0 spreads the reads out, for background checks that must not starve playback
+    digest = hashlib.sha256()
+    started = time.monotonic()
+    done = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            done += len(chunk)
+            if bytes_per_second:
+                ahead = done / bytes_per_second - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+    return digest.hexdigest()
+
+def probe_video(path):
+    # ffprobe ships with the ffmpeg package; without it we just skip the media fields
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return {}
+    cmd = [
+        ffprobe, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,width,height,bit_rate:format=duration,bit_rate",
+        "-of", "json", str(path)
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT_SECONDS, check=True)
+        data = json.loads(result.stdout or "{}")
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        log(f"[Library] ffprobe failed for {Path(path).name}: {e}")
+        return {}
+
+    stream = (data.get("streams") or [{}])[0]
+    fmt = data.get("format", {})
+    info = {
+        "codec": stream.get("codec_name"),
+        "width": stream.get("width"),
+        "height": stream.get("height")
+    }
+    try:
+        info["duration"] = round(float(fmt.get("duration")), 2)
+    except (TypeError, ValueError):
+        info["duration"] = None
+    try:
+        info["bit_rate"] = int(stream.get("bit_rate") or fmt.get("bit_rate"))
+    except (TypeError, ValueError):
+        info["bit_rate"] = None
+    return info
+
+def format_duration(seconds):
+    if seconds is None:
+        return ""
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+class VideoLibrary:
+    def __init__(self, folder=VIDEO_FOLDER, index_file=LIBRARY_FILE, writable=True, on_indexed=None, store=None):
+        self.folder = Path(folder)
+        self.index_file = Path(index_file)
+        # Only the web UI persists the index and probes files; the player reads it
+        self.writable = writable
+        # Called with (path, entry) once a file has been probed and hashed
+        self.on_indexed = on_indexed
+        # VideoStore that hashed files are linked into (see video_store.py)
+        self.store = store
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._folder_mtime = None
+        self._names = []
+        self._name_set = frozenset()
+        self._pending = queue.Queue()
+        self._worker = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._entries = data.get("videos", {})
+        self._folder_mtime = data.get("folder_mtime")
+        self._rebuild_names()
+
+    def _save(self):
+        if not self.writable:
+            return
+        with self._lock:
+            data = {"folder_mtime": self._folder_mtime, "videos": self._entries}
+            try:
+                write_json_atomic(self.index_file, data, indent=None)
+            except OSError as e:
+                log(f"[Library] Failed to save {self.index_file.name}: {e}")
+
+    def _rebuild_names(self):
+        self._names = sorted(self._entries)
+        self._name_set = frozenset(self._names)
+
+    def refresh(self, force=False):
+        # One stat of the folder when nothing changed; a scandir + one stat per file otherwise
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            folder_mtime = None
+
+        with self._lock:
+            if not force and folder_mtime == self._folder_mtime:
+                return False
+
+            seen = {}
+            if folder_mtime is not None:
+                with os.scandir(self.folder) as it:
+                    for entry in it:
+                        if not entry.name.lower().endswith(VIDEO_EXTENSIONS) or not entry.is_file():
+                            continue
+                        st = entry.stat()
+                        seen[entry.name] = (st.st_size, st.st_mtime_ns)
+
+            changed = False
+            # A name removed or replaced with new content may have been the last link to a stored blob
+            released = False
+            for name in list(self._entries):
+                if name not in seen:
+                    del self._entries[name]
+                    changed = released = True
+
+            for name, (size, mtime) in seen.items():
+                current = self._entries.get(name)
+                if current and current.get("size") == size and current.get("mtime") == mtime:
+                    continue
+                if current:
+                    released = True
+                self._entries[name] = {"size": size, "mtime": mtime, "sha256": None, "duration": None,
+                                       "width": None, "height": None, "codec": None, "bit_rate": None,
+                                       "verified": None}
+                self._queue_probe(name)
+                changed = True
+
+            self._folder_mtime = folder_mtime
+            self._rebuild_names()
+
+        if changed:
+            log(f"[Library] Indexed {len(self._names)} video(s)")
+        if released and self.store and self.writable:
+            self.store.collect()
+        self._save()
+        return changed
+
+    def _queue_probe(self, name):
+        if not self.writable:
+            return
+        self._pending.put(name)
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._probe_worker, daemon=True)
+            self._worker.start()
+
+    def _probe_worker(self):
+        while True:
+            name = self._pending.get()
+            path = self.folder / name
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None:
+                    continue
+                expected = (entry["size"], entry["mtime"])
+            try:
+                info = probe_video(path)
+                info["sha256"] = hash_file(path)
+                info["verified"] = time.time()
+            except OSError as e:
+                log(f"[Library] Failed to index {name}: {e}")
+                continue
+
+            with self._lock:
+                entry = self._entries.get(name)
+                # The file may have been replaced while we were hashing it
+                if entry is None or (entry["size"], entry["mtime"]) != expected:
+                    continue
+                entry.update(info)
+                adopted = self._adopt(name, entry)
+                indexed = dict(entry)
+            if adopted == "deduplicated":
+                # The link replaced whatever the name pointed to before
+                self.store.collect()
+            if self.on_indexed:
+                self.on_indexed(path, indexed)
+            if self._pending.empty():
+                self._save()
+
+    def _adopt(self, name, entry):
+        # Caller holds the lock. A duplicate is replaced by a link to the stored copy,
+        # which brings the copy's mtime along, so the entry follows to avoid a re-probe.
+        # Returns VideoStore.adopt()'s result, None when nothing was linked
+        if not self.store or not self.writable:
+            return None
+        path = self.folder / name
+        try:
+            result = self.store.adopt(path, entry["sha256"])
+            st = os.stat(path)
+        except OSError as e:
+            log(f"[Library] Could not link {name} into the store: {e}")
+            return None
+        entry["size"], entry["mtime"] = st.st_size, st.st_mtime_ns
+        return result
+
+    def adopt_all(self):
+        # Videos indexed before the store existed
+        self.refresh()
+        with self._lock:
+            for name, entry in self._entries.items():
+                if entry.get("sha256"):
+                    self._adopt(name, entry)
+        if self.store and self.writable:
+            self.store.collect()
+        self._save()
+
+    def next_verification(self, interval):
+        # (name, seconds until due) of the video checked longest ago, or (None, None)
+        self.refresh()
+        with self._lock:
+            hashed = [(entry.get("verified") or 0, name) for name, entry in self._entries.items() if entry.get("sha256")]
+        if not hashed:
+            return None, None
+        verified, name = min(hashed)
+        return name, verified + interval - time.time()
+
+    def verify(self, name, bytes_per_second=0):
+        # Re-hash one video; returns (result, names holding the same bytes) where
+        # result is "ok", "corrupt", "changed" (replaced meanwhile, re-indexed anyway) or "missing"
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or not entry.get("sha256"):
+                return "missing", []
+            expected = (entry["size"], entry["mtime"])
+            sha256 = entry["sha256"]
+        path = self.folder / name
+        try:
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) != expected:
+                return "changed", []
+            digest = hash_file(path, bytes_per_second)
+        except OSError:
+            return "missing", []
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or (entry["size"], entry["mtime"]) != expected:
+                return "changed", []
+            if digest == sha256:
+                entry["verified"] = time.time()
+                aliases = []
+            else:
+                # Hard-linked aliases share the damaged bytes; separate copies are checked on their own
+                aliases = []
+                for other, other_entry in self._entries.items():
+                    if other_entry.get("sha256") != sha256:
+                        continue
+                    try:
+                        if os.path.samefile(self.folder / other, path):
+                            aliases.append(other)
+                    except OSError:
+                        continue
+        self._save()
+        return ("ok" if digest == sha256 else "corrupt"), aliases
+
+    def sha256_of(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry.get("sha256") if entry else None
+
+    def names(self):
+        self.refresh()
+        return list(self._names)
+
+    def contains(self, name):
+        self.refresh()
+        return name in self._name_set
+
+    def get(self, name):
+        self.refresh()
+        with self._lock:
+            entry = self._entries.get(name)
+            return dict(entry) if entry else None
+
+    def entries(self):
+        self.refresh()
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._entries.items()}
+
+    def paths(self):
+        return [self.folder / name for name in self.names()]
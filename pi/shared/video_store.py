@@ -0,0 +1,216 @@
+# video_store.py
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from shared import metrics
+from shared.vlc_helper import VIDEO_FOLDER, log, get_settings_snapshot
+
+# Content-addressed copies of the videos. Every indexed file in ~/videos is
+# hard-linked to ~/videos/.store/<sha256>.mp4, and the name in ~/videos stays an
+# alias of that blob, so VLC, the web UI and ffprobe keep opening plain paths.
+# A second upload of the same clip under another name is replaced by a link to
+# the existing blob and takes no extra space; a blob goes once no name links to
+# it any more. Filesystems without hard links keep working, just without dedup.
+#
+# The IntegrityVerifier re-hashes every video on a rotation, throttled and at
+# idle CPU priority. A file whose bytes no longer match its hash is moved to
+# ~/videos/.quarantine together with its aliases, so get_selected_video() no
+# longer finds it and the player never gets to open it.
+STORE_FOLDER = VIDEO_FOLDER / ".store"
+QUARANTINE_FOLDER = VIDEO_FOLDER / ".quarantine"
+VERIFY_NICE = 19
+# Longest idle wait of the verifier, so settings changes are picked up
+VERIFY_MAX_SLEEP_SECONDS = 3600
+# First wait after a failed round (a full disk, say), doubled up to VERIFY_MAX_SLEEP_SECONDS
+VERIFY_ERROR_BACKOFF_SECONDS = 60
+
+# Overridable per key under "store" in settings.json
+DEFAULT_STORE_SETTINGS = {
+    # Replace duplicate uploads by links to the copy already stored
+    "dedup": True,
+    # Re-hash every video this often
+    "verify_interval_hours": 168,
+    # Read rate of the verifier, 0 to turn verification off
+    "verify_mb_per_second": 2
+}
+
+STORE_DEDUP_BYTES = metrics.counter("store_dedup_bytes_total", "Bytes freed by linking duplicate videos to a stored copy")
+STORE_BLOBS = metrics.gauge("store_blobs", "Distinct videos in the content store")
+VERIFY_FILES = metrics.counter("store_verified_files_total", "Videos re-hashed by the integrity verifier", ["result"])
+VERIFY_BYTES = metrics.counter("store_verified_bytes_total", "Bytes re-hashed by the integrity verifier")
+
+def get_store_settings():
+    config = dict(DEFAULT_STORE_SETTINGS)
+    config.update(get_settings_snapshot().get("store", {}))
+    return config
+
+def same_file(path, other):
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+class VideoStore:
+    def __init__(self, store_folder=STORE_FOLDER, quarantine_folder=QUARANTINE_FOLDER):
+        self.store_folder = Path(store_folder)
+        self.quarantine_folder = Path(quarantine_folder)
+        self.store_folder.mkdir(parents=True, exist_ok=True)
+        self.quarantine_folder.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha256):
+        return self.store_folder / f"{sha256}.mp4"
+
+    def has(self, sha256):
+        return self.blob_path(sha256).exists()
+
+    def _replace_with_link(self, blob, path):
+        # Link next to the target and rename over it: the name never disappears
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.link")
+        os.link(blob, tmp_path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink()
+            raise
+
+    def adopt(self, path, sha256):
+        # Make path an alias of the blob for sha256. Returns "stored" for new content,
+        # "deduplicated" when path was a separate copy of a stored one, None when already linked
+        path = Path(path)
+        blob = self.blob_path(sha256)
+        if same_file(path, blob):
+            return None
+        try:
+            os.link(path, blob)
+            STORE_BLOBS.inc()
+            return "stored"
+        except FileExistsError:
+            pass
+        if not get_store_settings()["dedup"]:
+            return None
+        size = path.stat().st_size
+        self._replace_with_link(blob, path)
+        STORE_DEDUP_BYTES.inc(size)
+        log(f"[Store] {path.name} is a copy of a stored video, linked it and freed {size // (1024 * 1024)} MB")
+        return "deduplicated"
+
+    def link(self, sha256, path):
+        # Create (or replace) path as an alias of a stored blob; False when the store lacks it
+        blob = self.blob_path(sha256)
+        if not blob.exists():
+            return False
+        self._replace_with_link(blob, Path(path))
+        return True
+
+    def collect(self):
+        # Drop blobs no name in ~/videos links to any more
+        removed = 0
+        blobs = 0
+        for blob in self.store_folder.glob("*.mp4"):
+            try:
+                if blob.stat().st_nlink <= 1:
+                    blob.unlink()
+                    removed += 1
+                else:
+                    blobs += 1
+            except OSError:
+                continue
+        STORE_BLOBS.set(blobs)
+        if removed:
+            log(f"[Store] Removed {removed} video(s) no longer in use")
+        return removed
+
+    def quarantine(self, path, sha256):
+        # Move a corrupt file out of ~/videos; its blob too when it holds the same bytes
+        path = Path(path)
+        blob = self.blob_path(sha256)
+        if same_file(path, blob):
+            blob.unlink()
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        destination = self.quarantine_folder / f"{stamp}_{path.name}"
+        os.replace(path, destination)
+        return destination
+
+class IntegrityVerifier:
+    # Runs in the web UI next to the library it checks
+    def __init__(self, library, store, on_quarantine=None):
+        self.library = library
+        self.store = store
+        # Called with the names that were moved to quarantine
+        self.on_quarantine = on_quarantine
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        try:
+            # Idle priority for this thread only; the web UI keeps its own
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), VERIFY_NICE)
+        except (AttributeError, OSError):
+            pass
+        adopted = False
+        backoff = VERIFY_ERROR_BACKOFF_SECONDS
+        while True:
+            # One failure must not end the thread: nothing would be checked again until a restart
+            try:
+                if not adopted:
+                    self.library.adopt_all()
+                    adopted = True
+                timeout = self._step()
+                backoff = VERIFY_ERROR_BACKOFF_SECONDS
+            except Exception as e:
+                VERIFY_FILES.labels(result="error").inc()
+                log(f"[Store] Integrity verifier failed, retrying in {backoff}s: {e}")
+                timeout = backoff
+                backoff = min(backoff * 2, VERIFY_MAX_SLEEP_SECONDS)
+            if timeout is None:
+                continue
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _step(self):
+        # Verifies the next due video and returns None, or returns how long to wait
+        config = get_store_settings()
+        rate = config["verify_mb_per_second"] * 1024 * 1024
+        timeout = VERIFY_MAX_SLEEP_SECONDS
+        if rate > 0:
+            name, due_in = self.library.next_verification(config["verify_interval_hours"] * 3600)
+            if name is not None and due_in <= 0:
+                self.verify(name, rate)
+                return None
+            if name is not None:
+                timeout = min(timeout, due_in)
+        return timeout
+
+    def verify(self, name, bytes_per_second=0):
+        entry = self.library.get(name)
+        result, aliases = self.library.verify(name, bytes_per_second)
+        VERIFY_FILES.labels(result=result).inc()
+        if entry and result in ("ok", "corrupt"):
+            VERIFY_BYTES.inc(entry["size"])
+        if result in ("changed", "missing"):
+            # Replaced or deleted behind the library's back (same folder mtime): re-index it
+            self.library.refresh(force=True)
+        if result != "corrupt":
+            return result
+        moved = []
+        for alias in aliases:
+            try:
+                destination = self.store.quarantine(self.library.folder / alias, self.library.sha256_of(alias) or "")
+                moved.append(alias)
+                log(f"[Store] {alias} failed its integrity check, moved to {destination}")
+            except OSError as e:
+                log(f"[Store] Failed to quarantine {alias}: {e}")
+        self.library.refresh(force=True)
+        if moved and self.on_quarantine:
+            self.on_quarantine(moved)
+        return result
@@ -1,16 +1,32 @@
 # vlc_helper.py
+import atexit
+import bisect
+import copy
+import fcntl
+import gzip
 import json
+import queue
 import random
+import socket
+import tempfile
 import threading
 import time
 import os
+import shutil
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from shared import analytics, metrics
+
 # Paths
 HOME = Path(os.path.expanduser("~"))
 
 SETTINGS_FILE = HOME / "settings.json"
+SETTINGS_LOCK_FILE = HOME / "settings.json.lock"
+CONTROL_SOCKET = HOME / "control.sock"
+TRIGGER_STATS_FILE = HOME / "trigger_stats.json"
 VIDEO_FOLDER = HOME / "videos"
 LOG_FOLDER = HOME / "logs"
 LOG_FOLDER.mkdir(exist_ok=True)
@@ -28,48 +44,421 @@ def get_version():
 
 VERSION = get_version()
 
+# --- Logging ---
+# log() formats the line in the caller and hands it to one background writer
+# thread, which appends to ~/logs/YYYY-MM-DD.txt in batches. The queue is
+# bounded so a stalled SD card never blocks playback; lines are dropped and
+# counted instead.
+LOG_FLUSH_INTERVAL_SECONDS = 2.0
+LOG_QUEUE_SIZE = 2000
+LOG_MAX_BYTES_PER_DAY = 20 * 1024 * 1024
+LOG_COMPRESS_AFTER_DAYS = 7
+
+class BufferedLogger:
+    def __init__(self, folder, flush_interval=LOG_FLUSH_INTERVAL_SECONDS, queue_size=LOG_QUEUE_SIZE,
+                 max_bytes_per_day=LOG_MAX_BYTES_PER_DAY, compress_after_days=LOG_COMPRESS_AFTER_DAYS):
+        self.folder = Path(folder)
+        self.flush_interval = flush_interval
+        self.max_bytes_per_day = max_bytes_per_day
+        self.compress_after_days = compress_after_days
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._last_compress_day = None
+        self.dropped = 0
+        self.capped = 0
+
+    def write(self, date_str, line):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait((date_str, line))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self.dropped:
+                date_str = datetime.now().strftime("%Y-%m-%d")
+                batch.append((date_str, f"[{datetime.now().isoformat()}] [LOG] Dropped {self.dropped} line(s), log queue full"))
+                self.dropped = 0
+            if batch:
+                self._write_batch(batch)
+            self._compress_old_logs()
+
+    def _write_batch(self, batch):
+        by_day = {}
+        for date_str, line in batch:
+            by_day.setdefault(date_str, []).append(line)
+
+        for date_str, lines in by_day.items():
+            log_file = self.folder / f"{date_str}.txt"
+            # Bytes, so the cap holds for non-ASCII lines too
+            data = "".join(f"{line}\n" for line in lines).encode()
+            try:
+                with log_file.open("ab") as f:
+                    # Both the player and the UI append to the same file, so ask the file for its size
+                    size = f.tell()
+                    if size >= self.max_bytes_per_day:
+                        self.capped += len(lines)
+                        continue
+                    if size + len(data) > self.max_bytes_per_day:
+                        data = data[:self.max_bytes_per_day - size]
+                        data = data[:data.rfind(b"\n") + 1] + b"[LOG] Daily size cap reached, further lines for today are discarded\n"
+                    f.write(data)
+            except OSError as e:
+                print(f"[LOG] Failed to write {log_file}: {e}")
+
+    def _compress_old_logs(self):
+        today = datetime.now().date()
+        if self._last_compress_day == today:
+            return
+        self._last_compress_day = today
+        cutoff = today - timedelta(days=self.compress_after_days)
+
+        for log_file in self.folder.glob("*.txt"):
+            try:
+                file_day = datetime.strptime(log_file.stem, "%Y-%m-%d").date()
+            except ValueError:
+                continue
+            if file_day >= cutoff:
+                continue
+            gz_file = log_file.with_name(f"{log_file.name}.gz")
+            if gz_file.exists():
+                # The player and the UI both compress; the other one got here first
+                continue
+            # Written under a name of our own and renamed into place, so the two never share a .gz
+            tmp_file = log_file.with_name(f".{log_file.name}.{os.getpid()}.gz.tmp")
+            try:
+                with log_file.open("rb") as src, gzip.open(tmp_file, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(tmp_file, gz_file)
+                log_file.unlink()
+            except FileNotFoundError:
+                # Compressed and removed by the other process meanwhile
+                tmp_file.unlink(missing_ok=True)
+            except OSError as e:
+                tmp_file.unlink(missing_ok=True)
+                print(f"[LOG] Failed to compress {log_file}: {e}")
+
+LOGGER = BufferedLogger(LOG_FOLDER)
+atexit.register(LOGGER.flush)
+
 def log(msg):
-    timestamp = f"[{datetime.now().isoformat()}]"
-    log_line = f"{timestamp} {msg}"
+    now = datetime.now()
+    log_line = f"[{now.isoformat()}] {msg}"
     print(log_line)
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    log_file = LOG_FOLDER / f"{date_str}.txt"
-    with log_file.open("a") as f:
-        f.write(f"{log_line}\n")
+    LOGGER.write(now.strftime("%Y-%m-%d"), log_line)
+
+DEFAULT_SETTINGS = {
+    "selected_video": "",
+    "pause_flag": False,
+    "playlist": {
+        "mode": "single",
+        "interval": 0,
+        "last_updated": "",
+        "order": [],
+        "triggered_flag": True,
+        "delay": 0
+    }
+}
+
+SETTINGS_READS = metrics.counter("settings_reads_total", "Settings snapshot requests by outcome", ["result"])
+SETTINGS_READ_HIT = SETTINGS_READS.labels(result="hit")
+SETTINGS_READ_RELOAD = SETTINGS_READS.labels(result="reload")
+SETTINGS_READ_ERROR = SETTINGS_READS.labels(result="error")
+SETTINGS_RELOAD_SECONDS = metrics.histogram("settings_reload_seconds", "Time to re-parse settings.json")
+SETTINGS_WRITES = metrics.counter("settings_writes_total", "Committed settings.json writes")
+SETTINGS_WRITE_SECONDS = metrics.histogram("settings_write_seconds", "Atomic settings.json write incl. fsync")
+SETTINGS_LOCK_WAIT_SECONDS = metrics.histogram("settings_lock_wait_seconds", "Wait for the settings transaction lock")
+PLAYLIST_ROTATIONS = metrics.counter("playlist_rotations_total", "Timed playlist rotations", ["channel", "mode"])
+
+# Process-wide cache of settings.json. The file is only re-parsed when its
+# inode/mtime/size changes (or someone calls invalidate()), so the playback
+# loops can read flags every tick without hitting the SD card.
+class SettingsStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._settings = None
+        self._signature = None
+        self.hits = 0
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def snapshot(self):
+        # Shared, read-only view. Callers that want to modify settings must use load_settings().
+        signature = self._file_signature()
+        with self._lock:
+            if self._settings is not None and signature == self._signature:
+                self.hits += 1
+                SETTINGS_READ_HIT.inc()
+                return self._settings
+
+            if signature is None:
+                self._settings = copy.deepcopy(DEFAULT_SETTINGS)
+            else:
+                try:
+                    with SETTINGS_RELOAD_SECONDS.time():
+                        with open(self.path, 'r') as f:
+                            self._settings = json.load(f)
+                except (OSError, ValueError) as e:
+                    self.reload_errors += 1
+                    SETTINGS_READ_ERROR.inc()
+                    if self._settings is None:
+                        raise
+                    # Keep serving the last good snapshot and retry on the next call
+                    log(f"[Settings] Failed to reload {self.path.name}, keeping previous snapshot: {e}")
+                    return self._settings
+
+            self._signature = signature
+            self.reloads += 1
+            SETTINGS_READ_RELOAD.inc()
+            return self._settings
+
+    def replace(self, settings):
+        # Called after we wrote the file ourselves so we don't re-parse our own write
+        with self._lock:
+            self._settings = copy.deepcopy(settings)
+            self._signature = self._file_signature()
+
+    def invalidate(self):
+        with self._lock:
+            self._settings = None
+            self._signature = None
+
+    def counters(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "reloads": self.reloads,
+                "reload_errors": self.reload_errors
+            }
+
+SETTINGS = SettingsStore(SETTINGS_FILE)
+
+def get_settings_snapshot():
+    return SETTINGS.snapshot()
 
 def load_settings():
-    if SETTINGS_FILE.exists():
-        with open(SETTINGS_FILE, 'r') as f:
-            return json.load(f)
-    return {
-        "selected_video": "",
-        "pause_flag": False,
-        "playlist": {
-            "mode": "single",
-            "interval": 0,
-            "last_updated": "",
-            "order": [],
-            "triggered_flag": True,
-            "delay": 0
-        }
-    }
+    return copy.deepcopy(SETTINGS.snapshot())
+
+def write_json_atomic(path, data, indent=2):
+    # Write to a temp file in the same folder, fsync, then rename over the target.
+    # Readers either see the old file or the new one, never a half-written one.
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.stem}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file as 0600, keep it readable like before
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    dir_fd = os.open(str(path.parent), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def _write_settings_atomic(settings):
+    with SETTINGS_WRITE_SECONDS.time():
+        write_json_atomic(SETTINGS_FILE, settings)
+    SETTINGS_WRITES.inc()
+    SETTINGS.replace(settings)
+    publish_control_event("settings")
+
+_transaction_state = threading.local()
+
+# Read-modify-write settings.json under an exclusive fcntl lock shared by the
+# Flask UI and the player. All mutations made inside the block are committed
+# with a single atomic write; nothing is written if the block raises or leaves
+# the settings unchanged. Nested transactions in the same thread join the outer one.
+@contextmanager
+def settings_transaction():
+    current = getattr(_transaction_state, "settings", None)
+    if current is not None:
+        yield current
+        return
+
+    with open(SETTINGS_LOCK_FILE, 'a') as lock_file:
+        with SETTINGS_LOCK_WAIT_SECONDS.time():
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            original = load_settings()
+            settings = copy.deepcopy(original)
+            _transaction_state.settings = settings
+            try:
+                yield settings
+            finally:
+                _transaction_state.settings = None
+            if settings != original:
+                _write_settings_atomic(settings)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 def save_settings(settings):
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=2)
+    with settings_transaction() as current:
+        current.clear()
+        current.update(copy.deepcopy(settings))
+
+# --- Channels ---
+# One player process can drive several portraits. The top-level settings are
+# channel "main", the one the web UI edits; more are listed under "channels",
+# each with a "name", its own selected_video, pause_flag, playlist and days,
+# and the hardware it runs on (see motion_vlc.py).
+MAIN_CHANNEL = "main"
+
+def channel_view(settings, channel=None):
+    # The dict holding one channel's keys; part of `settings`, so edits in a transaction stick
+    if channel in (None, MAIN_CHANNEL):
+        return settings
+    for entry in settings.get("channels", []):
+        if isinstance(entry, dict) and entry.get("name") == channel:
+            return entry
+    return {}
+
+def channel_names(settings):
+    names = [MAIN_CHANNEL]
+    for entry in settings.get("channels", []):
+        if isinstance(entry, dict) and entry.get("name") and entry["name"] not in names:
+            names.append(entry["name"])
+    return names
+
+# --- Control channel ---
+# The player binds a Unix datagram socket and blocks on it instead of polling
+# settings.json. Every committed settings write publishes a one-word event;
+# if nobody is listening the datagram is simply dropped.
+CONTROL_FALLBACK_POLL_SECONDS = 30
+
+def publish_control_event(event):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(event.encode(), str(CONTROL_SOCKET))
+    except OSError:
+        pass
+
+class ControlChannel:
+    def __init__(self, path=CONTROL_SOCKET, channel=None):
+        # path=None: an in-process queue only, fed by another ControlChannel's listeners;
+        # channel picks the schedule whose edges bound wait(None)
+        self.path = Path(path) if path else None
+        self.channel = channel
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=64)
+        self._sock = None
+        self._thread = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        # Called with the event name on every notify, e.g. to wake the playlist updater
+        self._listeners.append(callback)
+
+    def start(self):
+        if self.path is None:
+            return
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(str(self.path))
+        self._thread = threading.Thread(target=self._listen, daemon=True)
+        self._thread.start()
+        log(f"[Control] Listening on {self.path}")
+
+    def _listen(self):
+        while True:
+            try:
+                data = self._sock.recv(256)
+            except OSError:
+                return
+            self.notify(data.decode(errors="replace") or "settings")
+
+    def notify(self, event):
+        # Safe to call from any thread, including VLC and GPIO callbacks
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+        for callback in self._listeners:
+            callback(event)
+
+    def wait(self, timeout=None):
+        # Block until an event arrives or the timeout expires, returns the drained events
+        if timeout is None:
+            timeout = next_control_timeout(self.channel)
+        with self._cond:
+            if not self._events:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.path is None:
+            return
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+def next_control_timeout(channel=None):
+    # Wake exactly at the next schedule edge; the fallback poll covers edits that bypass the channel
+    timeout = CONTROL_FALLBACK_POLL_SECONDS
+    next_edge = get_compiled_schedule(channel=channel).next_transition()
+    if next_edge is not None:
+        timeout = min(timeout, (next_edge - datetime.now()).total_seconds() + 0.05)
+    return max(0.05, timeout)
 
 def get_days_schedule():
-    settings = load_settings()
-    return settings.get("days", {})
+    settings = get_settings_snapshot()
+    return copy.deepcopy(settings.get("days", {}))
 
 def update_days_schedule(days_schedule):
-    settings = load_settings()
-    settings["days"] = days_schedule
-    save_settings(settings)
+    with settings_transaction() as settings:
+        settings["days"] = days_schedule
 
 
-def get_triggered_flag():
-    settings = load_settings()
+def get_triggered_flag(channel=None):
+    settings = channel_view(get_settings_snapshot(), channel)
     playlist = settings.get("playlist", {})
 
     # Default to False if not set
@@ -77,8 +466,8 @@ def get_triggered_flag():
 
     return bool(flag)
 
-def get_trigger_delay_seconds():
-    settings = load_settings()
+def get_trigger_delay_seconds(channel=None):
+    settings = channel_view(get_settings_snapshot(), channel)
     playlist = settings.get("playlist", {})
 
     delay = playlist.get("delay", 0)
@@ -87,49 +476,129 @@ def get_trigger_delay_seconds():
     except (ValueError, TypeError):
         return 0
 
-def is_schedule_enabled_now():
-    settings = load_settings()
-    days = settings.get("days", {})
-    
-    now = datetime.now()
-    current_day = now.strftime("%A")  # e.g., "Monday"
-    current_time = now.strftime("%H:%M")  # e.g., "14:30" in 24-hour format
+# --- Schedule ---
+# The "days" dict is compiled once per settings snapshot into a sorted list of
+# on/off transitions over one week (minutes since Monday 00:00). A day that is
+# not enabled counts as active all day. A window whose end is before its start
+# (e.g. 19:00-02:00) runs past midnight into the next day.
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+def _parse_hhmm(value, default):
+    try:
+        hours, minutes = str(value).split(":")
+        return int(hours) * 60 + int(minutes)
+    except (ValueError, TypeError):
+        return default
+
+class CompiledSchedule:
+    def __init__(self, days):
+        intervals = []
+        for index, day in enumerate(WEEKDAYS):
+            day_start = index * MINUTES_PER_DAY
+            schedule = days.get(day, {})
+            if not schedule.get("enabled", False):
+                intervals.append((day_start, day_start + MINUTES_PER_DAY))
+                continue
 
-    today_schedule = days.get(current_day, {})
+            start = _parse_hhmm(schedule.get("start", "00:00"), 0)
+            end = _parse_hhmm(schedule.get("end", "23:59"), MINUTES_PER_DAY - 1)
+            if start < end:
+                intervals.append((day_start + start, day_start + end))
+            elif start > end:
+                intervals.append((day_start + start, day_start + MINUTES_PER_DAY + end))
+
+        # Split Sunday night spans at the end of the week, then merge overlaps
+        split = []
+        for start, end in intervals:
+            if end > MINUTES_PER_WEEK:
+                split.append((start, MINUTES_PER_WEEK))
+                split.append((0, end - MINUTES_PER_WEEK))
+            else:
+                split.append((start, end))
+        split.sort()
+
+        merged = []
+        for start, end in split:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        # An interval touching both ends of the week continues across Sunday -> Monday
+        wraps = bool(merged) and merged[0][0] == 0 and merged[-1][1] == MINUTES_PER_WEEK
+        transitions = []
+        for start, end in merged:
+            if not (wraps and start == 0):
+                transitions.append((start, True))
+            if not (wraps and end == MINUTES_PER_WEEK):
+                transitions.append((end % MINUTES_PER_WEEK, False))
+        transitions.sort()
+
+        self.always_active = bool(merged)
+        self.times = [t for t, _ in transitions]
+        self.states = [state for _, state in transitions]
+
+    @staticmethod
+    def _week_position(now):
+        week_start = datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+        return week_start, now.weekday() * MINUTES_PER_DAY + now.hour * 60 + now.minute
+
+    def is_active(self, now=None):
+        if not self.times:
+            return self.always_active
+        _, minute = self._week_position(now or datetime.now())
+        # Index -1 wraps to the last transition of the previous week
+        return self.states[bisect.bisect_right(self.times, minute) - 1]
+
+    def _next_index(self, now, want_state=None):
+        week_start, minute = self._week_position(now)
+        idx = bisect.bisect_right(self.times, minute)
+        for step in range(len(self.times)):
+            weeks, pos = divmod(idx + step, len(self.times))
+            if want_state is None or self.states[pos] == want_state:
+                return week_start + timedelta(weeks=weeks, minutes=self.times[pos])
+        return None
+
+    def next_transition(self, now=None):
+        if not self.times:
+            return None
+        return self._next_index(now or datetime.now())
+
+    def next_start(self, now=None):
+        if not self.times:
+            return None
+        return self._next_index(now or datetime.now(), want_state=True)
 
-     # If not enabled, schedule is considered always active
-    if not today_schedule.get("enabled", False):
-        return True
+# channel name -> (days dict, CompiledSchedule)
+_compiled_schedules = {}
+# Stands in for a missing "days" so the identity check below still matches
+_NO_DAYS = {}
 
-    start = today_schedule.get("start", "00:00")
-    end = today_schedule.get("end", "23:59")
+def get_compiled_schedule(settings=None, channel=None):
+    if settings is not None:
+        return CompiledSchedule(channel_view(settings, channel).get("days", {}))
 
-    return start <= current_time < end
+    days = channel_view(get_settings_snapshot(), channel).get("days", _NO_DAYS)
+    cached_days, compiled = _compiled_schedules.get(channel or MAIN_CHANNEL, (None, None))
+    # Snapshots are replaced, never mutated, so identity tells us when to recompile
+    if cached_days is not days:
+        compiled = CompiledSchedule(days)
+        _compiled_schedules[channel or MAIN_CHANNEL] = (days, compiled)
+    return compiled
+
+def is_schedule_enabled_now(channel=None):
+    return get_compiled_schedule(channel=channel).is_active()
 
 def get_next_start_time(settings):
-    from datetime import datetime, timedelta
-    
-    days = settings.get("days", {})
-    now = datetime.now()
-    
-    # Loop through next 7 days starting today
-    for i in range(7):
-        day_check = (now + timedelta(days=i)).strftime("%A")
-        schedule = days.get(day_check, {})
-        if schedule.get("enabled", False):
-            start_str = schedule.get("start", "00:00")
-            # Parse start time and create a datetime for that day
-            try:
-                start_time = datetime.strptime(start_str, "%H:%M").time()
-                start_dt = datetime.combine(now.date() + timedelta(days=i), start_time)
-                if start_dt > now:
-                    return start_dt.strftime("%A %I:%M %p")
-            except:
-                continue
-    return None
+    next_start = get_compiled_schedule(settings).next_start()
+    if next_start is None:
+        return None
+    return next_start.strftime("%A %I:%M %p")
 
 def get_playlist_settings():
-    settings = load_settings()
+    settings = get_settings_snapshot()
     playlist = settings.get("playlist", {})
     return (
         playlist.get("mode", "single"),
@@ -140,8 +609,12 @@ def get_playlist_settings():
         playlist.get("delay", 0)
     )
 
-def update_playlist_settings(mode=None, interval=None, last_updated=None, order=None, triggered_flag=None, delay=None):
-    settings = load_settings()
+def update_playlist_settings(mode=None, interval=None, last_updated=None, order=None, triggered_flag=None, delay=None, selected_video=None):
+    with settings_transaction() as settings:
+        apply_playlist_settings(settings, mode=mode, interval=interval, last_updated=last_updated,
+                                order=order, triggered_flag=triggered_flag, delay=delay, selected_video=selected_video)
+
+def apply_playlist_settings(settings, mode=None, interval=None, last_updated=None, order=None, triggered_flag=None, delay=None, selected_video=None):
     playlist = settings.get("playlist", {})
 
     if mode is not None:
@@ -155,51 +628,57 @@ def update_playlist_settings(mode=None, interval=None, last_updated=None, order=
     if triggered_flag is not None:
         playlist["triggered_flag"] = triggered_flag
     if delay is not None:
-        playlist["delay"] = delay 
+        playlist["delay"] = delay
 
     settings["playlist"] = playlist
-    save_settings(settings)
+    if selected_video is not None:
+        settings["selected_video"] = selected_video
 
 def update_playlist_timestamp_on_startup():
     try:
-        settings = load_settings()
-        playlist = settings.get("playlist", {})
-        mode = playlist.get("mode", "single").lower()
-        interval = playlist.get("interval", 0)  # interval in minutes
-        last_updated_str = playlist.get("last_updated", "")
-
-        if mode not in ("random", "fixed"):
-            log(f"[Startup] Playlist mode '{mode}' does not require timestamp update.")
-            return
-
-        now = datetime.now()
-        last_updated = None
-        if last_updated_str:
-            try:
-                last_updated = datetime.strptime(last_updated_str, "%Y-%m-%d %H:%M:%S")
-            except Exception as e:
-                log(f"[Startup] Failed to parse last_updated timestamp: {e}")
-
-        # Update only if missing or expired and interval > 0
-        if interval > 0 and (not last_updated or (now - last_updated) >= timedelta(minutes=interval)):
-            new_timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
-            playlist["last_updated"] = new_timestamp
-            settings["playlist"] = playlist
-            save_settings(settings)
-            log(f"[Startup] Playlist mode '{mode}' detected. Updated last_updated to: {new_timestamp}")
-        else:
-            log(f"[Startup] Playlist timestamp still valid or interval is zero, no update needed.")
-
+        with settings_transaction() as settings:
+            for channel in channel_names(settings):
+                _update_playlist_timestamp(channel_view(settings, channel))
     except Exception as e:
         log(f"Failed to update playlist timestamp: {e}")
 
+def _update_playlist_timestamp(settings):
+    playlist = settings.get("playlist", {})
+    mode = playlist.get("mode", "single").lower()
+    interval = playlist.get("interval", 0)  # interval in minutes
+    last_updated_str = playlist.get("last_updated", "")
+
+    if mode not in ("random", "fixed"):
+        log(f"[Startup] Playlist mode '{mode}' does not require timestamp update.")
+        return
+
+    now = datetime.now()
+    last_updated = None
+    if last_updated_str:
+        try:
+            last_updated = datetime.strptime(last_updated_str, "%Y-%m-%d %H:%M:%S")
+        except Exception as e:
+            log(f"[Startup] Failed to parse last_updated timestamp: {e}")
+
+    # Update only if missing or expired and interval > 0
+    if interval > 0 and (not last_updated or (now - last_updated) >= timedelta(minutes=interval)):
+        new_timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        playlist["last_updated"] = new_timestamp
+        settings["playlist"] = playlist
+        log(f"[Startup] Playlist mode '{mode}' detected. Updated last_updated to: {new_timestamp}")
+    else:
+        log(f"[Startup] Playlist timestamp still valid or interval is zero, no update needed.")
+
 
-def get_selected_video():
+def get_selected_video(channel=None):
     try:
-        settings = load_settings()
+        settings = channel_view(get_settings_snapshot(), channel)
         selected_name = settings.get("selected_video", "").strip()
+        if not selected_name:
+            # Nothing selected: VIDEO_FOLDER / "" would be the folder itself
+            return None
         video_path = VIDEO_FOLDER / selected_name
-        if video_path.exists():
+        if video_path.is_file():
             return str(video_path)
         else:
             log(f"Selected video {selected_name} not found in folder")
@@ -208,67 +687,176 @@ def get_selected_video():
         log(f"Failed to read selected_video from settings.json: {e}")
         return None
 
-def read_pause_flag():
+def read_pause_flag(channel=None):
     try:
-        settings = load_settings()
+        settings = channel_view(get_settings_snapshot(), channel)
         return settings.get("pause_flag", False)
     except Exception as e:
         log(f"Failed to read pause_flag from settings.json: {e}")
         return False
 
 def write_pause_flag(is_paused):
-    settings = load_settings()
-    settings["pause_flag"] = is_paused
-    save_settings(settings)
+    with settings_transaction() as settings:
+        settings["pause_flag"] = is_paused
+
+# --- Trigger latency ---
+# The player records PIR edge -> resume call -> VLC Playing timestamps for every
+# trigger and publishes a summary to trigger_stats.json for the web UI.
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+def summarize_latencies(samples_ms):
+    values = sorted(samples_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 1),
+        "p90": round(percentile(values, 90), 1),
+        "p99": round(percentile(values, 99), 1),
+        "max": round(values[-1], 1)
+    }
+
+def write_trigger_stats(resume_ms, playing_ms):
+    stats = {
+        "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "last_resume_ms": round(resume_ms[-1], 1) if resume_ms else None,
+        "last_playing_ms": round(playing_ms[-1], 1) if playing_ms else None,
+        "resume": summarize_latencies(resume_ms),
+        "playing": summarize_latencies(playing_ms)
+    }
+    try:
+        write_json_atomic(TRIGGER_STATS_FILE, stats)
+    except OSError as e:
+        log(f"[Trigger] Failed to write trigger stats: {e}")
+
+def read_trigger_stats():
+    try:
+        with open(TRIGGER_STATS_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# --- Playlist rotation ---
+# The updater sleeps until the exact rotation deadline (last_updated + interval),
+# the next schedule edge, or until something wakes it through wake_playlist_updater().
+_playlist_wake = threading.Condition()
+_playlist_wake_pending = False
+
+def wake_playlist_updater(event=None):
+    global _playlist_wake_pending
+    with _playlist_wake:
+        _playlist_wake_pending = True
+        _playlist_wake.notify_all()
+
+def _wait_for_playlist_wake(timeout):
+    global _playlist_wake_pending
+    with _playlist_wake:
+        if not _playlist_wake_pending and not stop_playlist_thread.is_set():
+            _playlist_wake.wait(timeout)
+        _playlist_wake_pending = False
+
+# Active filenames plus a position lookup, built once per playlist order
+class PlaylistIndex:
+    def __init__(self, order):
+        self.active = [item["filename"] for item in order if item.get("active", True)]
+        self.positions = {name: i for i, name in enumerate(self.active)}
+
+    def next_fixed(self, current_video):
+        idx = self.positions.get(current_video)
+        if idx is None:
+            return self.active[0]
+        return self.active[(idx + 1) % len(self.active)]
+
+    def pick_random(self, current_video):
+        if len(self.active) == 1:
+            return self.active[0]
+        idx = self.positions.get(current_video)
+        if idx is None:
+            return random.choice(self.active)
+        # Pick from every slot except the current one without building a filtered list
+        choice = random.randrange(len(self.active) - 1)
+        if choice >= idx:
+            choice += 1
+        return self.active[choice]
+
+_playlist_indexes = {}
+
+def get_playlist_index(order, channel=None):
+    # One cache slot per channel, so rotating channels don't evict each other
+    cached_order, index = _playlist_indexes.get(channel or MAIN_CHANNEL, (None, None))
+    if cached_order is not order:
+        index = PlaylistIndex(order)
+        _playlist_indexes[channel or MAIN_CHANNEL] = (order, index)
+    return index
+
+def _next_rotation_deadline(last_updated, interval):
+    if not last_updated:
+        return None
+    try:
+        return datetime.strptime(last_updated, "%Y-%m-%d %H:%M:%S") + timedelta(minutes=interval)
+    except Exception as e:
+        log(f"Error parsing last_updated: {e}")
+        return None
 
 def playlist_updater():
     while not stop_playlist_thread.is_set():
-        mode, interval, last_updated, order, triggered_flag, delay = get_playlist_settings()
-        pause_flag = read_pause_flag()
-        schedule_enabled = is_schedule_enabled_now()
-        
-
-        if mode not in ["random", "fixed"] or interval <= 0 or pause_flag or not schedule_enabled:
-            time.sleep(5)
-            continue
-
-        # Extract active filenames
-        active_files = [item["filename"] for item in order if item.get("active", True)]
-        if not active_files:
-            time.sleep(10)
-            continue
-
-        settings = load_settings()
-        current_video = settings.get("selected_video", "")
+        settings = get_settings_snapshot()
+        # With nothing to rotate, sleep until a settings change wakes us
+        timeout = CONTROL_FALLBACK_POLL_SECONDS
+        rotated = False
+        for channel in channel_names(settings):
+            channel_timeout = _playlist_channel_step(settings, channel)
+            if channel_timeout is None:
+                rotated = True
+                break
+            timeout = min(timeout, channel_timeout)
+        if not rotated:
+            _wait_for_playlist_wake(max(0.05, timeout))
+
+def _playlist_channel_step(settings, channel):
+    # Seconds until this channel needs another look, or None after a rotation
+    view = channel_view(settings, channel)
+    playlist = view.get("playlist", {})
+    mode = playlist.get("mode", "single")
+    interval = playlist.get("interval", 0)
+    last_updated = playlist.get("last_updated", "")
+    current_video = view.get("selected_video", "")
+
+    timeout = CONTROL_FALLBACK_POLL_SECONDS
+    if mode in ("random", "fixed") and interval > 0 and not view.get("pause_flag", False):
+        schedule = get_compiled_schedule(channel=channel)
+        index = get_playlist_index(playlist.get("order", []), channel)
         now = datetime.now()
 
-        try:
-            last_dt = datetime.strptime(last_updated, "%Y-%m-%d %H:%M:%S") if last_updated else None
-        except Exception as e:
-            log(f"Error parsing last_updated: {e}")
-            last_dt = None
-
-        if not last_dt or (now - last_dt) >= timedelta(minutes=interval):
-            new_video = current_video
-            
-            if mode == "random":
-                if len(active_files) > 1:
-                    other_choices = [v for v in active_files if v != current_video]
-                    new_video = random.choice(other_choices) if other_choices else current_video  
-                else:
-                    new_video = active_files[0]
-
-            elif mode == "fixed":
-                if current_video in active_files:
-                    idx = active_files.index(current_video)
-                    new_video = active_files[(idx + 1) % len(active_files)]
-                else:
-                    new_video = active_files[0]
-
-            last_updated_str = now.strftime("%Y-%m-%d %H:%M:%S")
-            settings["selected_video"] = new_video
-            settings["playlist"]["last_updated"] = last_updated_str
-            save_settings(settings)
-            log(f"[Playlist updater] Mode: {mode}, New video: {new_video}, Updated at: {last_updated_str}")
-
-        time.sleep(1)
+        if not schedule.is_active():
+            next_edge = schedule.next_transition(now)
+            if next_edge is not None:
+                timeout = min(timeout, (next_edge - now).total_seconds() + 0.05)
+        elif index.active:
+            deadline = _next_rotation_deadline(last_updated, interval)
+            if deadline is not None and now < deadline:
+                timeout = (deadline - now).total_seconds()
+            else:
+                new_video = index.pick_random(current_video) if mode == "random" else index.next_fixed(current_video)
+                _rotate_playlist(mode, new_video, current_video, last_updated, now, channel)
+                return None
+    return timeout
+
+def _rotate_playlist(mode, new_video, current_video, last_updated, now, channel=MAIN_CHANNEL):
+    last_updated_str = now.strftime("%Y-%m-%d %H:%M:%S")
+    with settings_transaction() as settings:
+        view = channel_view(settings, channel)
+        playlist = view.get("playlist", {})
+        # Skip the rotation if the UI changed the playlist while we were deciding
+        if not view or playlist.get("last_updated", "") != last_updated or view.get("selected_video", "") != current_video:
+            log(f"[Playlist updater] Settings changed during rotation of {channel}, re-evaluating.")
+            return
+        view["selected_video"] = new_video
+        playlist["last_updated"] = last_updated_str
+    PLAYLIST_ROTATIONS.labels(channel=channel, mode=mode).inc()
+    analytics.record("rotation", new_video, detail=mode, channel=channel)
+    log(f"[Playlist updater] Channel: {channel}, Mode: {mode}, New video: {new_video}, Updated at: {last_updated_str}")
@@ -0,0 +1,57 @@
+# web_server.py
+from shared.vlc_helper import get_settings_snapshot, log
+
+# Production serving for the Flask UI. waitress keeps a fixed pool of worker
+# threads for application code, while its I/O thread does the slow parts:
+# request bodies are spooled to memory/disk before a worker is picked, and
+# files sent through wsgi.file_wrapper (see media_server.py) are streamed by
+# the I/O thread after the worker has returned (copied through read(); there
+# is no sendfile path). A 500 MB upload or a video download therefore never
+# occupies a worker; only server-sent event streams do, and those are capped
+# by "max_streams" so some workers always stay free for interactive requests. Overridable per key under "server" in settings.json.
+DEFAULT_SERVER_SETTINGS = {
+    "host": "0.0.0.0",
+    "port": 5000,
+    # Worker threads running Flask views
+    "threads": 8,
+    # Concurrent SSE streams (/api/events, /logs/stream); must stay below "threads"
+    "max_streams": 4,
+    # Open connections, including idle keep-alive ones
+    "connection_limit": 64,
+    # Seconds without any traffic before a connection (idle keep-alive or stalled transfer) is closed
+    "channel_timeout": 60,
+    # Bodies above this are spooled to a temp file instead of RAM
+    "inbuf_overflow": 1024 * 1024,
+    "max_request_body_size": 16 * 1024 * 1024 * 1024
+}
+
+def get_server_settings():
+    config = dict(DEFAULT_SERVER_SETTINGS)
+    config.update(get_settings_snapshot().get("server", {}))
+    # Leave at least two workers for page loads and form posts
+    config["max_streams"] = max(1, min(config["max_streams"], config["threads"] - 2))
+    return config
+
+def serve(app, config=None):
+    config = config or get_server_settings()
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        # Installed by the setup scripts; older installs keep working on the dev server
+        log("[Server] waitress not installed, falling back to the Flask development server")
+        app.run(host=config["host"], port=config["port"], threaded=True)
+        return
+
+    log(f"[Server] Serving on {config['host']}:{config['port']} with {config['threads']} worker threads")
+    waitress_serve(
+        app,
+        host=config["host"],
+        port=config["port"],
+        threads=config["threads"],
+        connection_limit=config["connection_limit"],
+        channel_timeout=config["channel_timeout"],
+        cleanup_interval=min(30, config["channel_timeout"]),
+        inbuf_overflow=config["inbuf_overflow"],
+        max_request_body_size=config["max_request_body_size"],
+        ident="LivingPortrait"
+    )
@@ -8,6 +8,10 @@ log_success() { echo -e "\e[32m✅ $1\e[0m"; }
 log_info() { echo -e "\e[34mℹ️  $1\e[0m"; }
 log_fail() { echo -e "\e[31m❌ $1\e[0m"; exit 1; }
 
+# --- Python packages ---
+# Production WSGI server for the web UI; app.py falls back to the Flask dev server without it
+"$USER_HOME/flask_venv/bin/pip" install --quiet waitress || log_info "Could not install waitress, using the development server"
+
 # --- Download app files ---
 log_info "Downloading latest app files..."
 
@@ -20,8 +24,23 @@ curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/h
 
 curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/flask_ui/app.py" -o "$USER_HOME/flask_ui/app.py" || log_fail "Failed to download Flask app.py"
 curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/flask_ui/templates/index.html" -o "$USER_HOME/flask_ui/templates/index.html" || log_fail "Failed to download index.html"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/flask_ui/templates/view_log.html" -o "$USER_HOME/flask_ui/templates/view_log.html" || log_fail "Failed to download view_log.html"
 
 curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/vlc_helper.py" -o "$USER_HOME/shared/vlc_helper.py" || log_fail "Failed to download vlc_helper.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/video_library.py" -o "$USER_HOME/shared/video_library.py" || log_fail "Failed to download video_library.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/uploads.py" -o "$USER_HOME/shared/uploads.py" || log_fail "Failed to download uploads.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/transcoder.py" -o "$USER_HOME/shared/transcoder.py" || log_fail "Failed to download transcoder.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/media_server.py" -o "$USER_HOME/shared/media_server.py" || log_fail "Failed to download media_server.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/thumbnails.py" -o "$USER_HOME/shared/thumbnails.py" || log_fail "Failed to download thumbnails.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/log_reader.py" -o "$USER_HOME/shared/log_reader.py" || log_fail "Failed to download log_reader.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/log_index.py" -o "$USER_HOME/shared/log_index.py" || log_fail "Failed to download log_index.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/status_feed.py" -o "$USER_HOME/shared/status_feed.py" || log_fail "Failed to download status_feed.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/web_server.py" -o "$USER_HOME/shared/web_server.py" || log_fail "Failed to download web_server.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/metrics.py" -o "$USER_HOME/shared/metrics.py" || log_fail "Failed to download metrics.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/playback.py" -o "$USER_HOME/shared/playback.py" || log_fail "Failed to download playback.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/fleet_sync.py" -o "$USER_HOME/shared/fleet_sync.py" || log_fail "Failed to download fleet_sync.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/video_store.py" -o "$USER_HOME/shared/video_store.py" || log_fail "Failed to download video_store.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/analytics.py" -o "$USER_HOME/shared/analytics.py" || log_fail "Failed to download analytics.py"
 
 # --- Update version file ---
 VERSION=$(curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/version.txt") || log_fail "Failed to download version.txt"
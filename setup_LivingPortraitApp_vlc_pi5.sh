@@ -31,7 +31,7 @@ log_success "System update completed"
 
 # --- Required packages ---
 echo -e "\nChecking required packages..."
-REQUIRED_PKGS=(vlc python3-gpiozero python3-vlc python3-venv libvlc-dev libpulse-dev)
+REQUIRED_PKGS=(vlc ffmpeg python3-gpiozero python3-vlc python3-venv libvlc-dev libpulse-dev)
 MISSING_PKGS=()
 for pkg in "${REQUIRED_PKGS[@]}"; do
     dpkg -s "$pkg" &>/dev/null || MISSING_PKGS+=("$pkg")
@@ -54,6 +54,8 @@ if [ ! -d "$VENV_PATH" ]; then
 else
     log_success "Virtual environment already exists"
 fi
+# Production WSGI server for the web UI, also on existing installs
+"$VENV_PATH/bin/pip" install waitress || log_fail "waitress pip install"
 
 # --- Directories ---
 echo -e "\nCreating directories..."
@@ -74,7 +76,22 @@ curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/h
 curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/pause_video/paused_rotated.mp4" -o "$USER_HOME/pause_video/paused_rotated.mp4"
 curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/flask_ui/app.py" -o "$USER_HOME/flask_ui/app.py"
 curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/flask_ui/templates/index.html" -o "$USER_HOME/flask_ui/templates/index.html"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/flask_ui/templates/view_log.html" -o "$USER_HOME/flask_ui/templates/view_log.html"
 curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/vlc_helper.py" -o "$USER_HOME/shared/vlc_helper.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/video_library.py" -o "$USER_HOME/shared/video_library.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/uploads.py" -o "$USER_HOME/shared/uploads.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/transcoder.py" -o "$USER_HOME/shared/transcoder.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/media_server.py" -o "$USER_HOME/shared/media_server.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/thumbnails.py" -o "$USER_HOME/shared/thumbnails.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/log_reader.py" -o "$USER_HOME/shared/log_reader.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/log_index.py" -o "$USER_HOME/shared/log_index.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/status_feed.py" -o "$USER_HOME/shared/status_feed.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/web_server.py" -o "$USER_HOME/shared/web_server.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/metrics.py" -o "$USER_HOME/shared/metrics.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/playback.py" -o "$USER_HOME/shared/playback.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/fleet_sync.py" -o "$USER_HOME/shared/fleet_sync.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/video_store.py" -o "$USER_HOME/shared/video_store.py"
+curl -fsSL "https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/shared/analytics.py" -o "$USER_HOME/shared/analytics.py"
 
 VERSION=$(curl -fsSL https://raw.githubusercontent.com/frosty409/LivingPortraitApp/refs/heads/main/pi/version.txt)
 echo -e "\n📦 Installed LivingPortraitApp version $VERSION"